@@ -12,7 +12,7 @@ from typing import Dict
 from warnings import warn
 
 import qgis
-from QAequilibraE.modules.common_tools import AboutDialog
+from QAequilibraE.modules.common_tools import AboutDialog, FeatureIndex, GraphCache, close_results_database
 from QAequilibraE.modules.matrix_procedures import LoadDatasetDialog
 from QAequilibraE.modules.menu_actions import load_matrices, run_add_connectors, run_stacked_bandwidths
 from QAequilibraE.modules.menu_actions import run_add_zones, display_aequilibrae_formats, run_show_project_data
@@ -20,12 +20,14 @@ from QAequilibraE.modules.menu_actions import run_desire_lines, run_scenario_com
 from QAequilibraE.modules.menu_actions import run_distribution_models, run_tsp, run_change_parameters, prepare_network
 from QAequilibraE.modules.menu_actions import run_load_project, project_from_osm, run_create_transponet, show_log
 from QAequilibraE.modules.paths_procedures import run_shortest_path, run_dist_matrix, run_traffic_assig
+from QAequilibraE.modules.paths_procedures import run_batch_assignment
+from QAequilibraE.modules.project_procedures.layer_metadata_procedure import LayerMetadataProcedure
 from QAequilibraE.modules.public_transport_procedures import GtfsImportDialog
 from qgis.PyQt import QtCore
 from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtWidgets import QVBoxLayout, QApplication
 from qgis.PyQt.QtWidgets import QWidget, QDockWidget, QAction, QMenu, QTabWidget, QCheckBox, QToolBar, QToolButton
-from qgis.core import QgsDataSourceUri, QgsVectorLayer
+from qgis.core import QgsDataSourceUri, QgsVectorLayer, QgsRectangle
 from qgis.core import QgsProject
 
 if hasattr(Qt, "AA_EnableHighDpiScaling"):
@@ -45,6 +47,11 @@ class AequilibraEMenu:
         self.project = None  # type: Project
         self.matrices = {}
         self.layers = {}  # type: Dict[QgsVectorLayer]
+        self.layer_metadata = {}  # type: Dict[dict]
+        self.metadata_worker = None  # type: LayerMetadataProcedure
+        self.opening_worker = None
+        self.feature_indices = {}  # type: Dict[FeatureIndex]
+        self.graph_cache = None  # type: GraphCache
         self.dock = QDockWidget(self.trlt("AequilibraE"))
         self.manager = QWidget()
 
@@ -65,6 +72,11 @@ class AequilibraEMenu:
             "Utils": [],
             "AequilibraE": [],
         }
+        self.menu_buttons = {}
+
+        # Menus disabled while a project opens, and enabled as the data they use becomes available
+        self.project_menus = ["Data", "Trip Distribution", "GIS"]
+        self.network_menus = ["Network Manipulation", "Paths and assignment", "Routing"]
 
         # # #######################   PROJECT SUB-MENU   ############################
         self.add_menu_action("Project", "Open Project", partial(run_load_project, self))
@@ -96,6 +108,7 @@ class AequilibraEMenu:
         self.add_menu_action("Paths and assignment", "Shortest path", partial(run_shortest_path, self))
         self.add_menu_action("Paths and assignment", "Impedance matrix", partial(run_dist_matrix, self))
         self.add_menu_action("Paths and assignment", "Traffic Assignment", partial(run_traffic_assig, self))
+        self.add_menu_action("Paths and assignment", "Batch assignment", partial(run_batch_assignment, self))
 
         # # # ########################################################################
         # # # #######################   ROUTING SUB-MENU   ###########################
@@ -196,6 +209,11 @@ class AequilibraEMenu:
             itemButton.setMenu(itemMenu)
 
             self.toolbar.addWidget(itemButton)
+            self.menu_buttons[menu] = itemButton
+
+    def set_menus_enabled(self, menus: list, enabled: bool):
+        for menu in menus:
+            self.menu_buttons[menu].setEnabled(enabled)
 
     def run_help(self):
         url = "http://aequilibrae.com/qgis"
@@ -228,23 +246,39 @@ class AequilibraEMenu:
                 pass
 
     def run_close_project(self):
+        if self.opening_worker is not None:
+            self.opening_worker.cancel()
         if self.project is None:
             return
+        if self.metadata_worker is not None:
+            # Signals still queued from the worker must not reach the next project, or widgets already deleted
+            worker = self.metadata_worker
+            worker.cancel()
+            signals = [worker.LayerMetadata, worker.ProgressValue, worker.ProgressMaxValue]
+            for signal in signals + [worker.finished_threaded_procedure]:
+                try:
+                    signal.disconnect()
+                except TypeError:
+                    # Nothing was connected to it
+                    pass
+            self.metadata_worker = None
+        self.set_menus_enabled(self.project_menus + self.network_menus, True)
+        close_results_database(self.project.project_base_path)
         self.project.close()
         self.projectManager.clear()
         self.project = None
         self.matrices.clear()
         self.layers.clear()
+        self.layer_metadata.clear()
+        self.feature_indices.clear()
+        self.graph_cache = None
 
     def layerRemoved(self, layer):
-        layers_to_re_create = [key for key, val in self.layers.items() if val[1] == layer]
+        removed = [key for key, val in self.layers.items() if val[1] == layer]
 
-        # Clears the pool of layers
+        # Clears the pool of layers. The layer is created again the next time it is requested
         self.layers = {key: val for key, val in self.layers.items() if val[1] != layer}
-
-        # Re-creates in memory only the layer that was destroyed
-        for layer_name in layers_to_re_create:
-            self.create_layer_by_name(layer_name)
+        self.feature_indices = {k: v for k, v in self.feature_indices.items() if k[0] not in removed}
 
     def load_geo_layer(self):
         sel = self.geo_layers_table.selectedItems()
@@ -254,12 +288,21 @@ class AequilibraEMenu:
     def load_layer_by_name(self, layer_name: str):
         if self.project is None:
             return
+        QgsProject.instance().addMapLayer(self.layer_by_name(layer_name))
+        qgis.utils.iface.mapCanvas().refresh()
+
+    def feature_index(self, layer_name: str, id_field: str) -> FeatureIndex:
+        """Project-wide index of ID field values to feature IDs, shared by all tools"""
+        key = (layer_name.lower(), id_field)
+        if key not in self.feature_indices:
+            self.feature_indices[key] = FeatureIndex(self.layer_by_name(layer_name), id_field)
+        return self.feature_indices[key]
+
+    def layer_by_name(self, layer_name: str) -> QgsVectorLayer:
+        """Project layer, created the first time it is requested"""
         if layer_name.lower() not in self.layers:
-            print("Layer was not found, which is weird")
             self.create_layer_by_name(layer_name)
-        layer = self.layers[layer_name.lower()][0]
-        QgsProject.instance().addMapLayer(layer)
-        qgis.utils.iface.mapCanvas().refresh()
+        return self.layers[layer_name.lower()][0]
 
     def create_layer_by_name(self, layer_name: str):
         layer = self.create_loose_layer(layer_name)
@@ -268,12 +311,52 @@ class AequilibraEMenu:
     def create_loose_layer(self, layer_name: str) -> QgsVectorLayer:
         if self.project is None:
             return
+        # Geometry type, SRID and extent already read from the database spare the provider from probing them
+        meta = self.layer_metadata.get(layer_name.lower(), {})
         uri = QgsDataSourceUri()
         uri.setDatabase(self.project.path_to_file)
-        uri.setDataSource("", layer_name, "geometry")
+        uri.setDataSource("", layer_name, meta.get("geometry_column", "geometry"))
+        if "wkb_type" in meta:
+            uri.setWkbType(meta["wkb_type"])
+            uri.setSrid(str(meta["srid"]))
         layer = QgsVectorLayer(uri.uri(), layer_name, "spatialite")
+        if meta.get("extent") is not None:
+            layer.setExtent(QgsRectangle(*meta["extent"]))
         return layer
 
+    def probe_layers(self, layers: dict, progress_bar=None):
+        """Reads feature counts and extents of the project layers in the background"""
+        self.metadata_worker = LayerMetadataProcedure(self.iface.mainWindow(), self.project.path_to_file, layers)
+        self.metadata_worker.LayerMetadata.connect(partial(self.layer_metadata_read, self.metadata_worker))
+        self.metadata_worker.finished_threaded_procedure.connect(
+            partial(self.layer_metadata_finished, self.metadata_worker)
+        )
+        if progress_bar is not None:
+            self.metadata_worker.ProgressValue.connect(progress_bar.setValue)
+            self.metadata_worker.ProgressMaxValue.connect(progress_bar.setMaximum)
+            self.metadata_worker.finished_threaded_procedure.connect(progress_bar.hide)
+        self.metadata_worker.start()
+
+    def layer_metadata_finished(self, worker: LayerMetadataProcedure, _):
+        # Network tools are enabled even if the metadata of the network layers could not be read
+        if worker is self.metadata_worker and self.project is not None:
+            self.set_menus_enabled(self.network_menus, True)
+
+    def layer_metadata_read(self, worker: LayerMetadataProcedure, val):
+        # Only the worker of the project currently open is listened to
+        if worker is not self.metadata_worker:
+            return
+        layer_name, meta = val
+        if layer_name.lower() not in self.layer_metadata:
+            return
+        self.layer_metadata[layer_name.lower()].update(meta)
+        for item in self.geo_layers_table.findItems(layer_name, Qt.MatchExactly):
+            if item.column() == 0:
+                self.geo_layers_table.item(item.row(), 1).setText(f"{meta['features']:,} features")
+        # Network tools create the network layers, which are created quicker once their metadata is known
+        if all("features" in self.layer_metadata.get(x, {}) for x in ["links", "nodes"]):
+            self.set_menus_enabled(self.network_menus, True)
+
     def run_about(self):
         dlg2 = AboutDialog(self.iface)
         dlg2.show()
@@ -4,13 +4,18 @@ from .get_output_file_name import GetOutputFolderName
 from .link_query_model import LinkQueryModel
 from .load_graph_layer_setting_dialog import LoadGraphLayerSettingDialog
 from .numpy_model import NumpyModel
-from .pandas_model import PandasModel
+from .path_tree_cache import PathTreeCache
 from .database_model import DatabaseModel
+from .dataframe_model import DataFrameModel
+from .feature_index import FeatureIndex
+from .graph_cache import GraphCache
 from .parameters_dialog import ParameterDialog
 from .report_dialog import ReportDialog
+from .results_database import ResultsDatabase, results_database, close_results_database
 from aequilibrae.utils.worker_thread import WorkerThread
 from .about_dialog import AboutDialog
 from .all_layers_from_toc import all_layers_from_toc
 from .log_dialog import LogDialog
-from .data_layer_from_dataframe import layer_from_dataframe
+from .data_layer_from_dataframe import layer_from_dataframe, geo_layer_from_dataframe
 from .table_field_lister import find_table_fields
+from .layer_statistics import field_ranges
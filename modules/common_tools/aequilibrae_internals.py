@@ -0,0 +1,31 @@
+import logging
+
+try:
+    from aequilibrae.paths import release_version
+except Exception:
+    release_version = ""
+
+logger = logging.getLogger("AequilibraEGUI")
+
+# AequilibraE release series whose private members were checked against the procedures that hook into them
+checked_series = ("0.7.",)
+
+
+def internals_available(feature: str, members: list) -> bool:
+    """Tells whether a procedure can rely on private members of aequilibrae objects
+
+    *members* is a list of (object, attribute name) pairs the procedure hooks into. When the installed release was
+    not checked, or any of the members is missing, a warning is logged and callers fall back to the plain procedure
+    """
+    missing = [f"{_owner(obj)}.{attr}" for obj, attr in members if not hasattr(obj, attr)]
+    if missing:
+        logger.warning(f"{feature} is not available. AequilibraE {release_version} lacks {', '.join(missing)}")
+        return False
+    if not str(release_version).startswith(checked_series):
+        logger.warning(f"{feature} is not available. It was not checked against AequilibraE {release_version}")
+        return False
+    return True
+
+
+def _owner(obj) -> str:
+    return obj.__name__ if isinstance(obj, type) else type(obj).__name__
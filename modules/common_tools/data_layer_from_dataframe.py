@@ -1,6 +1,10 @@
 import pandas as pd
 from qgis.PyQt.QtCore import QVariant
-from qgis.core import QgsVectorLayer, QgsField, QgsFeature, QgsProject
+from qgis.core import QgsVectorLayer, QgsField, QgsFeature, QgsProject, QgsFeatureRequest, QgsWkbTypes
+
+
+def qgs_type(ftype):
+    return QVariant.Double if "float" in ftype.name else QVariant.Int if "int" in ftype.name else QVariant.String
 
 
 def layer_from_dataframe(df: pd.DataFrame, layer_name: str) -> QgsVectorLayer:
@@ -9,9 +13,6 @@ def layer_from_dataframe(df: pd.DataFrame, layer_name: str) -> QgsVectorLayer:
     pr = vl.dataProvider()
 
     # add fields
-    def qgs_type(ftype):
-        return QVariant.Double if "float" in ftype.name else QVariant.Int if "int" in ftype.name else QVariant.String
-
     field_names = list(df.dtypes.index)
     types = [qgs_type(df.dtypes[fname]) for fname in field_names]
     attributes = [QgsField(fname, dtype) for fname, dtype in zip(field_names, types)]
@@ -29,3 +30,36 @@ def layer_from_dataframe(df: pd.DataFrame, layer_name: str) -> QgsVectorLayer:
 
     # returns the layer handle
     return vl
+
+
+def geo_layer_from_dataframe(source: QgsVectorLayer, df: pd.DataFrame, layer_name: str, key=None) -> QgsVectorLayer:
+    """Memory layer with the geometries of *source* and the columns of *df* as fields
+
+    Records are matched to features by the *key* field, or by feature ID if no key is given. The layer is not
+    added to the project"""
+    geo_type = QgsWkbTypes.displayString(source.wkbType())
+    vl = QgsVectorLayer(f"{geo_type}?crs={source.crs().authid()}", layer_name, "memory")
+    pr = vl.dataProvider()
+
+    fields = [] if key is None else [QgsField(key, QVariant.Int)]
+    fields.extend(QgsField(name, qgs_type(df.dtypes[name])) for name in df.columns)
+    pr.addAttributes(fields)
+    vl.updateFields()
+
+    request = QgsFeatureRequest().setSubsetOfAttributes([] if key is None else [key], source.fields())
+    keys, geometries = [], []
+    for feat in source.getFeatures(request):
+        keys.append(feat.id() if key is None else feat[key])
+        geometries.append(feat.geometry())
+
+    data = df.reindex(keys)
+    records = data.astype(object).where(data.notna(), None).values.tolist()
+    features = []
+    for key_value, geometry, record in zip(keys, geometries, records):
+        feat = QgsFeature()
+        feat.setGeometry(geometry)
+        feat.setAttributes(record if key is None else [key_value] + record)
+        features.append(feat)
+    pr.addFeatures(features)
+    vl.updateExtents()
+    return vl
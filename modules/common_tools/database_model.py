@@ -19,6 +19,8 @@
  -----------------------------------------------------------------------------------------------------------
  """
 
+from collections import OrderedDict
+
 import numpy as np
 from qgis.PyQt import QtCore
 
@@ -33,81 +35,95 @@ Qt = QtCore.Qt
 
 
 class DatabaseModel(QtCore.QAbstractTableModel):
+    """Table model for an AequilibraE dataset
+
+    Cells are formatted in blocks of rows, all at once, the first time any cell of the block is displayed. The
+    most recently displayed blocks are kept, so scrolling back and forth does not format them again"""
+
+    block_size = 256
+    max_blocks = 64
+
     def __init__(self, aeq_dataset, separator, decimals, parent=None):
         QtCore.QAbstractTableModel.__init__(self, parent)
         self._array = aeq_dataset
-        self.separator = separator
-        self.decimals = decimals
-        if self.separator:
-            self.row_headers_data = ["{:,}".format(x) for x in aeq_dataset.index[:]]
-        else:
-            self.row_headers_data = [str(x) for x in aeq_dataset.index[:]]
+        self._index = aeq_dataset.index
 
         self.empties = []
         self.types = []
         self.header_data = []
-        for i, n in enumerate(aeq_dataset.data.dtype.names):
+        self.columns = []
+        for n in aeq_dataset.data.dtype.names:
             if n in aeq_dataset.fields:
-                t = aeq_dataset.data[aeq_dataset.data.dtype.names[i]].dtype
+                column = aeq_dataset.data[n]
+                t = column.dtype
                 self.header_data.append(n)
+                self.columns.append(column)
                 # noinspection PyUnresolvedReferences
                 if np.issubdtype(t, np.integer):
                     self.types.append(0)
                     self.empties.append(np.iinfo(t).min)
-                elif np.issubdtype(t, np.float):
+                elif np.issubdtype(t, np.floating):
                     self.types.append(1)
                     self.empties.append(np.nan)
                 else:
                     self.types.append(2)
                     self.empties.append("")
 
+        self.__blocks = OrderedDict()
+        self.set_format(separator, decimals)
+
+    def set_format(self, separator, decimals):
+        """Changes how values are displayed. Formatted blocks are discarded"""
+        self.separator = separator
+        self.decimals = decimals
+        sep = "," if separator else ""
+        formats = {0: "{:" + sep + "}", 1: "{:" + sep + "." + str(decimals) + "f}", 2: "{}"}
+        self.formatters = [formats[t].format for t in self.types]
+        self.__header_format = ("{:,}" if separator else "{}").format
+        self.__blocks.clear()
+        self.layoutChanged.emit()
+
     def rowCount(self, parent=None):
         return self._array.data.shape[0]
 
     def columnCount(self, parent=None):
         return len(self.header_data)
 
+    def format_block(self, block: int) -> list:
+        """Formats all cells of a block of rows. Returns one list of strings per column"""
+        start = block * self.block_size
+        formatted = []
+        for column, formatter, kind, empty in zip(self.columns, self.formatters, self.types, self.empties):
+            values = np.array(column[start : start + self.block_size])
+            if kind == 0:
+                missing = values == empty
+            elif kind == 1:
+                missing = np.isnan(values)
+            else:
+                missing = np.zeros(values.shape[0], bool)
+            texts = [formatter(x) for x in values.tolist()]
+            for i in np.where(missing)[0]:
+                texts[i] = ""
+            formatted.append(texts)
+        return formatted
+
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                row = index.row()
-                col = index.column()
-
-                if self.separator:
-                    if self.types[col] == 0:
-                        if self._array.data[self.header_data[col]][row] == self.empties[col]:
-                            return ""
-                        else:
-                            return "{:,}".format(self._array.data[self.header_data[col]][row])
-                    if self.types[col] == 1:
-                        if self._array.data[self.header_data[col]][row] == self.empties[col]:
-                            return ""
-                        else:
-                            return ("{:,." + str(self.decimals) + "f}").format(
-                                self._array.data[self.header_data[col]][row]
-                            )
-                    else:
-                        return str(self._array.data[self.header_data[col]][row])
+                block, row = divmod(index.row(), self.block_size)
+                texts = self.__blocks.get(block)
+                if texts is None:
+                    texts = self.__blocks[block] = self.format_block(block)
+                    if len(self.__blocks) > self.max_blocks:
+                        self.__blocks.popitem(last=False)
                 else:
-                    if self.types[col] == 0:
-                        if self._array.data[self.header_data[col]][row] == self.empties[col]:
-                            return ""
-                        else:
-                            return "{:}".format(self._array.data[self.header_data[col]][row])
-                    if self.types[col] == 1:
-                        if self._array.data[self.header_data[col]][row] == self.empties[col]:
-                            return ""
-                        else:
-                            return ("{:." + str(self.decimals) + "f}").format(
-                                self._array.data[self.header_data[col]][row]
-                            )
-                    else:
-                        return str(self._array.data[self.header_data[col]][row])
+                    self.__blocks.move_to_end(block)
+                return texts[index.column()][row]
 
     def headerData(self, col, orientation, role=Qt.DisplayRole):
         if role == Qt.DisplayRole and orientation == Qt.Horizontal:
             return self.header_data[col]
         if role == Qt.DisplayRole and orientation != Qt.Horizontal:
-            return self.row_headers_data[col]
+            return self.__header_format(self._index[col])
 
         return QtCore.QAbstractTableModel.headerData(self, col, orientation, role)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from qgis.PyQt import QtCore
+
+
+class DataFrameModel(QtCore.QAbstractTableModel):
+    """Table model for a pandas DataFrame, with sorting, filtering and incremental loading
+
+    Cells are read from the column arrays of the DataFrame, and rows are handed to the view in batches as it
+    scrolls. Sorting and filtering only change the order of the rows shown, so use *source_row* to go from a row
+    of the view to the position of that row in the DataFrame. Columns are converted to lowercase text only once,
+    the first time the table is filtered, and typing more characters only searches the rows that already matched"""
+
+    fetch_size = 1000
+
+    def __init__(self, data: pd.DataFrame, parent=None):
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self._data = data
+        self._columns = [data[col].values for col in data.columns]
+        self._filter = ""
+        self._text = None
+        self._matched = None
+        self._sort = None
+        self._rows = np.arange(data.shape[0])
+        self._loaded = min(self.fetch_size, self._rows.shape[0])
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._loaded < self._rows.shape[0]
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        new_total = min(self._loaded + self.fetch_size, self._rows.shape[0])
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, new_total - 1)
+        self._loaded = new_total
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.isValid():
+            if role == QtCore.Qt.DisplayRole:
+                return str(self._columns[index.column()][self._rows[index.row()]])
+        return None
+
+    def headerData(self, col, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return str(self._data.columns[col])
+        return None
+
+    def source_row(self, row: int) -> int:
+        """Position in the DataFrame of a row of the view"""
+        return int(self._rows[row])
+
+    def set_value(self, source_row: int, col: int, value):
+        """Changes a value of the DataFrame and refreshes it in the view"""
+        self._data.iloc[source_row, col] = value
+        self._columns[col] = self._data.iloc[:, col].values
+        if self._text is not None:
+            self._text[col] = self.__as_text(self._columns[col])
+        self._matched = None
+        view_row = np.where(self._rows == source_row)[0]
+        if view_row.shape[0] and view_row[0] < self._loaded:
+            idx = self.index(int(view_row[0]), col)
+            self.dataChanged.emit(idx, idx)
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self._sort = (column, order)
+        self.__update_rows()
+
+    def set_filter(self, text: str):
+        """Shows only rows where any column contains the text, ignoring case"""
+        self._filter = text
+        self.__update_rows()
+
+    def __update_rows(self):
+        self.beginResetModel()
+        rows = self.__matching_rows() if self._filter else np.arange(self._data.shape[0])
+        if self._sort is not None:
+            column, order = self._sort
+            ascending = order == QtCore.Qt.AscendingOrder
+            values = pd.Series(self._columns[column][rows])
+            rows = rows[values.sort_values(ascending=ascending, kind="mergesort").index.values]
+        self._rows = rows
+        self._loaded = min(self.fetch_size, self._rows.shape[0])
+        self.endResetModel()
+
+    def __matching_rows(self) -> np.ndarray:
+        if self._text is None:
+            self._text = [self.__as_text(col) for col in self._columns]
+        text = self._filter.lower()
+        candidates = np.arange(self._data.shape[0])
+        if self._matched is not None and self._matched[0] in text:
+            candidates = self._matched[1]
+        matches = np.zeros(candidates.shape[0], bool)
+        for col in self._text:
+            matches |= col.iloc[candidates].str.contains(text, regex=False).values
+        self._matched = (text, candidates[matches])
+        return self._matched[1]
+
+    @staticmethod
+    def __as_text(values: np.ndarray) -> pd.Series:
+        return pd.Series(values).astype(str).str.lower()
@@ -0,0 +1,66 @@
+from qgis.core import QgsFeatureRequest, QgsSpatialIndex, QgsVectorLayer
+
+
+class FeatureIndex:
+    """Maps the values of an ID field (e.g. link_id) to QGIS feature IDs of a layer
+
+    Maps and spatial index are built the first time they are needed and discarded whenever the
+    layer data changes, so tools can share them across queries without re-scanning the layer"""
+
+    def __init__(self, layer: QgsVectorLayer, id_field: str):
+        self.layer = layer
+        self.id_field = id_field
+        self.__fids = None
+        self.__ids = None
+        self.__spatial_index = None
+        self.layer.dataChanged.connect(self.invalidate)
+
+    def invalidate(self):
+        self.__fids = None
+        self.__ids = None
+        self.__spatial_index = None
+
+    @property
+    def fids(self) -> dict:
+        """Dictionary of ID field value -> feature ID"""
+        if self.__fids is None:
+            idx = self.layer.fields().indexFromName(self.id_field)
+            req = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([idx])
+            self.__fids = {feat.attributes()[idx]: feat.id() for feat in self.layer.getFeatures(req)}
+            self.__ids = {fid: id_value for id_value, fid in self.__fids.items()}
+        return self.__fids
+
+    @property
+    def ids(self) -> dict:
+        """Dictionary of feature ID -> ID field value"""
+        if self.__ids is None:
+            _ = self.fids
+        return self.__ids
+
+    @property
+    def spatial_index(self) -> QgsSpatialIndex:
+        if self.__spatial_index is None:
+            self.__spatial_index = QgsSpatialIndex(self.layer.getFeatures(QgsFeatureRequest().setNoAttributes()))
+        return self.__spatial_index
+
+    def feature_ids(self, id_values) -> list:
+        """Feature IDs for a set of ID field values, e.g. for use with selectByIds"""
+        fids = self.fids
+        return [fids[int(x)] for x in set(id_values)]
+
+    def features(self, id_values) -> dict:
+        """Fetches the features for a set of ID field values in a single request
+
+        :Returns: Dictionary of ID field value -> QgsFeature
+        """
+        fids = self.feature_ids(id_values)
+        idx = self.layer.fields().indexFromName(self.id_field)
+        req = QgsFeatureRequest().setFilterFids(fids)
+        return {feat.attributes()[idx]: feat for feat in self.layer.getFeatures(req)}
+
+    def nearest(self, point):
+        """Returns the ID field value of the feature closest to a point"""
+        nearest = self.spatial_index.nearestNeighbor(point, 1)
+        if not nearest:
+            return None
+        return self.ids[nearest[0]]
@@ -0,0 +1,108 @@
+import glob
+import hashlib
+import logging
+import os
+from copy import deepcopy
+from os.path import join
+
+from aequilibrae.paths import Graph
+from aequilibrae.project import Project
+
+from .auxiliary_functions import tempPath
+
+
+class GraphCache:
+    """Builds each mode's graph once and reuses it across dialogs and QGIS sessions
+
+    Graphs are saved to disk with the network version they were built from, so graphs are only rebuilt when the
+    network changes. The version is a hash of the contents of the links, nodes and modes tables (geometries aside),
+    which is only computed again after the database is written to, as told by SQLite's data_version (writes by
+    other connections, such as QGIS editing sessions) and by the changes made through the project's connection.
+    Nothing is written to the project to track it.
+    Callers receive an independent copy of the cached graph, so they are free to change it. Only callers that do not
+    change the graph in any way may ask for the cached graph itself"""
+
+    network_tables = ["links", "nodes", "modes"]
+
+    def __init__(self, project: Project):
+        self.project = project
+        self.logger = logging.getLogger("AequilibraEGUI")
+        self.__graphs = {}
+        self.__version = None
+        self.__write_stamp = None
+        path_hash = hashlib.md5(project.project_base_path.encode()).hexdigest()
+        self.cache_folder = join(tempPath(), "qaequilibrae_graphs", path_hash)
+        self.__remove_version_tracking()
+
+    def __remove_version_tracking(self):
+        # Earlier versions of the plugin tracked network changes with a table and triggers in the project
+        conn = self.project.conn
+        sql = "SELECT type, name FROM sqlite_master WHERE name LIKE 'qaequilibrae_network_version%'"
+        objects = conn.execute(sql).fetchall()
+        for obj_type, name in sorted(objects, key=lambda x: x[0] != "trigger"):
+            conn.execute(f'DROP {obj_type.upper()} IF EXISTS "{name}"')
+        if objects:
+            conn.commit()
+
+    def network_version(self) -> str:
+        """Hash of the network tables, recomputed only when the project database has been written to"""
+        conn = self.project.conn
+        write_stamp = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        if write_stamp != self.__write_stamp or self.__version is None:
+            self.__version = self.__network_hash()
+            self.__write_stamp = write_stamp
+        return self.__version
+
+    def __network_hash(self) -> str:
+        digest = hashlib.md5()
+        for table in self.network_tables:
+            fields = [x[1] for x in self.project.conn.execute(f"PRAGMA table_info({table})").fetchall()]
+            fields = [f'"{x}"' for x in fields if x.lower() != "geometry"]
+            cursor = self.project.conn.execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY rowid")
+            digest.update(str(fields).encode())
+            rows = cursor.fetchmany(10000)
+            while rows:
+                digest.update(repr(rows).encode())
+                rows = cursor.fetchmany(10000)
+        return digest.hexdigest()[:16]
+
+    def get_graph(self, mode_id: str, read_only=False) -> Graph:
+        """Returns a copy of the graph for a mode, building it only if the network has changed
+
+        With *read_only*, the cached graph itself is returned, so it must not be changed in any way (not even with
+        set_graph or set_skimming)"""
+        version = self.network_version()
+        key = (mode_id, version)
+        if key not in self.__graphs:
+            self.__graphs = {k: v for k, v in self.__graphs.items() if k[0] != mode_id}
+            self.__graphs[key] = self.__load_or_build(mode_id, version)
+        return self.__graphs[key] if read_only else deepcopy(self.__graphs[key])
+
+    def __graph_file(self, mode_id: str, version: str) -> str:
+        return join(self.cache_folder, f"mode_{mode_id}_version_{version}.aeg")
+
+    def __load_or_build(self, mode_id: str, version: str) -> Graph:
+        file_name = self.__graph_file(mode_id, version)
+        if os.path.isfile(file_name):
+            try:
+                graph = Graph()
+                graph.load_from_disk(file_name)
+                return graph
+            except Exception as e:
+                self.logger.warning(f"Could not load cached graph for mode {mode_id}. {e.args}")
+
+        self.project.network.build_graphs(modes=[mode_id])
+        graph = self.project.network.graphs.pop(mode_id)
+
+        # Graphs built for previous versions of the network are no longer useful
+        for old_file in glob.glob(join(self.cache_folder, f"mode_{mode_id}_version_*.aeg")):
+            os.unlink(old_file)
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            graph.save_to_disk(file_name)
+        except Exception as e:
+            self.logger.warning(f"Could not save graph for mode {mode_id} to disk. {e.args}")
+        return graph
+
+    def clear(self):
+        self.__graphs.clear()
@@ -0,0 +1,91 @@
+import sqlite3
+
+import numpy as np
+from qgis.core import QgsDataSourceUri, QgsFeatureRequest, QgsFields, QgsVectorLayer
+
+# Layer ID -> {field name: (minimum, maximum)}
+_ranges = {}
+
+
+def field_ranges(layer: QgsVectorLayer, fields: list) -> dict:
+    """Minimum and maximum of numeric fields of a layer, as {field: (min, max)}. Nulls are ignored
+
+    Fields not yet known are computed together, with a single MIN/MAX query for SpatiaLite and GeoPackage tables,
+    or a single pass over the features otherwise (e.g. filtered layers, layers with uncommitted edits, joined or
+    virtual fields). Values that are not numeric are ignored. Results are kept until the layer's data changes"""
+    layer_id = layer.id()
+    if layer_id not in _ranges:
+        _ranges[layer_id] = {}
+        # Edits in progress change the data without the provider's data changing
+        for signal in [layer.dataChanged, layer.layerModified, layer.afterRollBack]:
+            signal.connect(lambda: _ranges.get(layer_id, {}).clear())
+        layer.willBeDeleted.connect(lambda: _ranges.pop(layer_id, None))
+
+    cache = _ranges[layer_id]
+    missing = [f for f in dict.fromkeys(fields) if f not in cache]
+    if missing:
+        ranges = _ranges_from_sql(layer, missing)
+        if ranges is None:
+            ranges = _ranges_from_features(layer, missing)
+        cache.update(ranges)
+    return {f: cache[f] for f in fields}
+
+
+def _ranges_from_sql(layer: QgsVectorLayer, fields: list):
+    # Subset strings are written in the provider's own dialect, which may not be the SQL of SQLite, and
+    # uncommitted edits only exist in the layer's edit buffer
+    if layer.subsetString() or layer.isModified():
+        return None
+    provider = layer.dataProvider().name()
+    layer_fields = layer.fields()
+    if any(layer_fields.fieldOrigin(layer_fields.indexFromName(f)) != QgsFields.OriginProvider for f in fields):
+        return None
+
+    if provider == "spatialite":
+        uri = QgsDataSourceUri(layer.source())
+        db_path, table = uri.database(), uri.table()
+    elif provider == "ogr" and ".gpkg|layername=" in layer.source().lower():
+        db_path, _, table = layer.source().partition("|layername=")
+        table = table.split("|")[0]
+    else:
+        return None
+
+    columns = ", ".join(f'MIN("{f}"), MAX("{f}")' for f in fields)
+    sql = f'SELECT {columns} FROM "{table}"'
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        values = conn.execute(sql).fetchone()
+        conn.close()
+    except sqlite3.Error:
+        return None
+    ranges = {}
+    for i, f in enumerate(fields):
+        minval, maxval = values[2 * i], values[2 * i + 1]
+        # Text columns give the minimum and maximum strings, which are not of any use here
+        if not all(x is None or isinstance(x, (int, float)) for x in [minval, maxval]):
+            return None
+        ranges[f] = (minval, maxval)
+    return ranges
+
+
+def _ranges_from_features(layer: QgsVectorLayer, fields: list) -> dict:
+    request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes(fields, layer.fields())
+    columns = {f: [] for f in fields}
+    for feat in layer.getFeatures(request):
+        for f in fields:
+            columns[f].append(feat[f])
+
+    ranges = {}
+    for f, values in columns.items():
+        data = np.array([_as_number(v) for v in values], dtype=np.float64)
+        data = data[~np.isnan(data)]
+        ranges[f] = (data.min(), data.max()) if data.shape[0] else (None, None)
+    return ranges
+
+
+def _as_number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import numpy as np
 
 import qgis
@@ -13,64 +15,111 @@ Qt = QtCore.Qt
 # adaptations for headers come from: http://stackoverflow.com/questions/14135543/how-to-set-the-qtableview-header-name-in-pyqt4
 
 
+class MatrixTileCache:
+    """Reads a matrix core in square tiles, on demand, and keeps the most recently used ones in memory
+
+    Works with anything that can be sliced in two dimensions without reading the rest of it, such as the memory map
+    of an AEM core or the HDF5 array of an OMX core"""
+
+    def __init__(self, core, tile_size=128, max_tiles=64):
+        self.core = core
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.__tiles = OrderedDict()
+
+    def value(self, row: int, col: int):
+        key = (row // self.tile_size, col // self.tile_size)
+        tile = self.__tiles.get(key)
+        if tile is None:
+            r, c = key[0] * self.tile_size, key[1] * self.tile_size
+            tile = np.array(self.core[r : r + self.tile_size, c : c + self.tile_size])
+            self.__tiles[key] = tile
+            if len(self.__tiles) > self.max_tiles:
+                self.__tiles.popitem(last=False)
+        else:
+            self.__tiles.move_to_end(key)
+        return tile[row % self.tile_size, col % self.tile_size]
+
+    def clear(self):
+        self.__tiles.clear()
+
+
+class ScaledCore:
+    """Reads an OMX core stored as integers scaled by a factor, returning the original values
+
+    The factor and the value used for missing cells are read from the *scale_factor* and *missing_value* attributes
+    of the core, which are written by the skimming procedure. Missing cells are returned as NaN"""
+
+    def __init__(self, core):
+        self.core = core
+        self.scale = float(core.attrs.scale_factor)
+        self.missing = core.attrs.missing_value if "missing_value" in core.attrs else None
+        self.shape = core.shape
+        self.dtype = np.dtype(np.float64)
+
+    def __getitem__(self, key):
+        raw = np.asarray(self.core[key])
+        data = raw / self.scale
+        if self.missing is not None:
+            data = np.where(raw == self.missing, np.nan, data)
+        return data
+
+
+def omx_core(omx_file, name: str):
+    """Core of an open OMX file, with scaled integer cores converted back to their original values"""
+    core = omx_file[name]
+    return ScaledCore(core) if "scale_factor" in core.attrs else core
+
+
 class NumpyModel(QtCore.QAbstractTableModel):
-    def __init__(self, aeq_matrix, separator, decimals, parent=None):
+    """Table model for a matrix core. Values and headers are only read and formatted for the cells on display
+
+    The core is the matrix_view of aeq_matrix, unless one is given, in which case it can be any two-dimensional array
+    that is sliceable (e.g. an OMX core that has not been read into memory)"""
+
+    def __init__(self, aeq_matrix, separator, decimals, parent=None, core=None):
         QtCore.QAbstractTableModel.__init__(self, parent)
-        self._array = aeq_matrix
-        self.separator = separator
-        self.decimals = decimals
-        if self.separator:
-            self.row_headers_data = ["{:,}".format(x) for x in aeq_matrix.index[:]]
-            self.header_data = ["{:,}".format(x) for x in aeq_matrix.index[:]]
-        else:
-            self.row_headers_data = [str(x) for x in aeq_matrix.index[:]]
-            self.header_data = [str(x) for x in aeq_matrix.index[:]]
+        self._array = aeq_matrix.matrix_view if core is None else core
+        self._index = aeq_matrix.index
+        self.tiles = None if self._array is None else MatrixTileCache(self._array)
+        self.empties = None
+        if self._array is not None and np.issubdtype(self._array.dtype, np.integer):
+            self.empties = np.iinfo(self._array.dtype).min
+        self.set_format(separator, decimals)
 
-        if np.issubdtype(aeq_matrix.dtype, np.integer):
-            self.empties = np.iinfo(aeq_matrix.dtype).min
-            self.decimals = 0
+    def set_format(self, separator, decimals):
+        """Changes how values are displayed, while keeping the tiles already read"""
+        self.separator = separator
+        self.decimals = 0 if self.empties is not None else decimals
+        self.__value_format = "{:" + ("," if separator else "") + "." + str(self.decimals) + "f}"
+        self.__header_format = "{:,}" if separator else "{}"
+        self.layoutChanged.emit()
 
     def rowCount(self, parent=None):
-        if self._array.matrix_view is None:
+        if self._array is None:
             return 0
         else:
-            return self._array.matrix_view.shape[0]
+            return self._array.shape[0]
 
     def columnCount(self, parent=None):
-        if self._array.matrix_view is None:
+        if self._array is None:
             return 0
         else:
-            return self._array.matrix_view.shape[1]
+            return self._array.shape[1]
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                row = index.row()
-                col = index.column()
-
-                separator = ""
-                if self.separator:
-                    separator = ","
-
-                if np.issubdtype(self._array.dtype, np.integer):
-                    if self._array.matrix_view[row, col] == self.empties:
-                        return ""
-                    else:
-                        return ("{:" + separator + "." + str(self.decimals) + "f}").format(
-                            self._array.matrix_view[row, col]
-                        )
-                else:
-                    if np.isnan(self._array.matrix_view[row, col]):
+                value = self.tiles.value(index.row(), index.column())
+                if self.empties is not None:
+                    if value == self.empties:
                         return ""
-                    else:
-                        return ("{:" + separator + "." + str(self.decimals) + "f}").format(
-                            self._array.matrix_view[row, col]
-                        )
+                elif np.isnan(value):
+                    return ""
+                return self.__value_format.format(value)
 
     def headerData(self, col, orientation, role=Qt.DisplayRole):
-        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
-            return self.header_data[col]
-        if role == Qt.DisplayRole and orientation != Qt.Horizontal:
-            return self.row_headers_data[col]
+        if role == Qt.DisplayRole:
+            return self.__header_format.format(self._index[col])
 
         return QtCore.QAbstractTableModel.headerData(self, col, orientation, role)
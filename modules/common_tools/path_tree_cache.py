@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+from aequilibrae.paths.results import PathResults
+
+
+class PathTreeCache:
+    """Keeps the shortest path trees computed for the most recently used origins
+
+    Paths from an origin whose tree is in the cache are only traced, instead of recomputing the whole tree.
+    Trees are keyed by graph, cost field and origin, and the least recently used are evicted first"""
+
+    def __init__(self, graph, max_trees=32):
+        self.graph = graph
+        self.max_trees = max_trees
+        self.res = PathResults()
+        self.res.prepare(graph)
+        self.__trees = OrderedDict()
+        self.__loaded = None
+
+    def compute_path(self, origin: int, destination: int) -> PathResults:
+        """Computes or traces the path between origin and destination
+
+        :Returns: The PathResults object, which is reused across calls
+        """
+        origin, destination = int(origin), int(destination)
+        key = (id(self.graph), self.graph.cost_field, origin)
+        res = self.res
+        if key in self.__trees:
+            self.__trees.move_to_end(key)
+            if self.__loaded != key:
+                predecessors, connectors, skims = self.__trees[key]
+                res.origin = origin
+                res.predecessors[:] = predecessors[:]
+                res.connectors[:] = connectors[:]
+                res.skims[:] = skims[:]
+                self.__loaded = key
+            # update_trace leaves the previous path in place when the destination cannot be reached
+            res.path = res.path_nodes = res.path_link_directions = res.milepost = None
+            res.update_trace(destination)
+            return res
+
+        res.reset()
+        res.compute_path(origin, destination)
+        self.__trees[key] = (res.predecessors.copy(), res.connectors.copy(), res.skims.copy())
+        self.__loaded = key
+        if self.max_trees is not None and len(self.__trees) > self.max_trees:
+            self.__trees.popitem(last=False)
+        return res
+
+    def clear(self):
+        self.__trees.clear()
+        self.__loaded = None
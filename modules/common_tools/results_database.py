@@ -0,0 +1,131 @@
+import os
+import threading
+from contextlib import contextmanager
+from os.path import join, isfile
+
+import pandas as pd
+from qgis.core import QgsProject, QgsVectorLayer, QgsDataSourceUri
+
+import qgis
+
+# Project path -> ResultsDatabase
+_databases = {}
+_registry_lock = threading.Lock()
+
+
+def results_database(project_base_path: str) -> "ResultsDatabase":
+    """The results database service of a project, created on first use"""
+    with _registry_lock:
+        if project_base_path not in _databases:
+            _databases[project_base_path] = ResultsDatabase(project_base_path)
+        return _databases[project_base_path]
+
+
+def close_results_database(project_base_path: str):
+    with _registry_lock:
+        db = _databases.pop(project_base_path, None)
+    if db is not None:
+        db.close()
+
+
+class ResultsDatabase:
+    """Shared access to the results database of a project
+
+    Spatial metadata is initialised only once, connections are returned to a small pool after use, and the layer
+    of each result table is created once and reused for as long as it stays in the QGIS project, or until the
+    table is written again. Result tables get an index on link_id when they are loaded, so joins against the links
+    layer are fast. All reads and writes of the results database by the plugin go through this service"""
+
+    pool_size = 4
+
+    def __init__(self, project_base_path: str):
+        self.path = join(project_base_path, "results_database.sqlite")
+        self.__pool = []
+        self.__lock = threading.Lock()
+        self.__layers = {}
+        self.__tables = (None, set())
+        with self.connection() as conn:
+            sql = "SELECT count(*) FROM sqlite_master WHERE type='table' AND name='spatial_ref_sys'"
+            if conn.execute(sql).fetchone()[0] == 0:
+                conn.execute("SELECT InitSpatialMetaData();")
+                conn.commit()
+
+    @contextmanager
+    def connection(self):
+        with self.__lock:
+            conn = self.__pool.pop() if self.__pool else None
+        if conn is None:
+            conn = qgis.utils.spatialite_connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA temp_store = 0;")
+        try:
+            yield conn
+        finally:
+            with self.__lock:
+                if len(self.__pool) < self.pool_size:
+                    self.__pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def table_fields(self, table_name: str) -> list:
+        with self.connection() as conn:
+            return [x[1] for x in conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()]
+
+    def tables(self) -> set:
+        """Names of the tables in the database, read again only when the database files change"""
+        # Writes may still be in the write-ahead log, so its modification time counts as well
+        mtimes = tuple(os.stat(p).st_mtime_ns if isfile(p) else 0 for p in [self.path, f"{self.path}-wal"])
+        if self.__tables[0] != mtimes:
+            with self.connection() as conn:
+                sql = "SELECT name FROM sqlite_master WHERE type ='table'"
+                self.__tables = (mtimes, {x[0] for x in conn.execute(sql).fetchall()})
+        return self.__tables[1]
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self.tables()
+
+    def read_table(self, table_name: str) -> pd.DataFrame:
+        with self.connection() as conn:
+            return pd.read_sql(f'select * from "{table_name}"', conn)
+
+    def write_table(self, df: pd.DataFrame, table_name: str, **kwargs):
+        """Writes a DataFrame to a table, with the arguments of DataFrame.to_sql"""
+        with self.connection() as conn:
+            df.to_sql(table_name, conn, **kwargs)
+            conn.commit()
+        self.table_written(table_name)
+
+    def table_written(self, table_name: str):
+        """Forgets the layer of a table that was (re)written, as it may no longer match the table"""
+        with self.__lock:
+            self.__layers.pop(table_name, None)
+
+    def index_link_id(self, table_name: str):
+        if "link_id" in self.table_fields(table_name):
+            with self.connection() as conn:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_link_id" ON "{table_name}" (link_id);')
+                conn.commit()
+
+    def layer(self, table_name: str) -> QgsVectorLayer:
+        """Layer for a result table, already added to the QGIS project"""
+        layer_id = self.__layers.get(table_name)
+        lyr = QgsProject.instance().mapLayer(layer_id) if layer_id is not None else None
+        if lyr is not None:
+            return lyr
+
+        self.index_link_id(table_name)
+        uri = QgsDataSourceUri()
+        uri.setDatabase(self.path)
+        uri.setDataSource("", table_name, None)
+        lyr = QgsVectorLayer(uri.uri(), table_name, "spatialite")
+        QgsProject.instance().addMapLayer(lyr)
+        with self.__lock:
+            self.__layers[table_name] = lyr.id()
+        return lyr
+
+    def close(self):
+        with self.__lock:
+            pool, self.__pool = self.__pool, []
+        for conn in pool:
+            conn.close()
+        self.__layers.clear()
@@ -1,20 +1,18 @@
 import os
-import sqlite3
 import sys
 from functools import partial
-from os.path import join
 
-from qgis._core import QgsExpressionContextUtils, QgsLineSymbol, QgsSimpleLineSymbolLayer
+import pandas as pd
+from qgis._core import QgsLineSymbol, QgsSimpleLineSymbolLayer, QgsSymbolLayer, QgsProperty
 
 import qgis
 from qgis.PyQt import QtGui, QtWidgets, uic
-from qgis.core import QgsExpression
 from qgis.core import QgsProject
-from qgis.core import QgsVectorLayerJoinInfo
 from ..common_tools import get_parameter_chain
 from ..common_tools import find_table_fields
-from ..matrix_procedures.load_result_table import load_result_table
+from ..common_tools import results_database
 from ..matrix_procedures import list_results
+from .scenario_comparison import compare_flows, comparison_layer
 
 sys.modules["qgsfieldcombobox"] = qgis.gui
 sys.modules["qgsmaplayercombobox"] = qgis.gui
@@ -27,7 +25,7 @@ class CompareScenariosDialog(QtWidgets.QDialog, FORM_CLASS):
         self.qgis_project = qgis_project
         self.iface = qgis_project.iface
         self.setupUi(self)
-        self.conn = sqlite3.connect(join(qgis_project.project.project_base_path, "results_database.sqlite"))
+        self.results_db = results_database(qgis_project.project.project_base_path)
         self.positive_color.setColor(QtGui.QColor(0, 174, 116, 255))
         self.negative_color.setColor(QtGui.QColor(218, 0, 3, 255))
         self.common_flow_color.setColor(QtGui.QColor(0, 0, 0, 255))
@@ -94,7 +92,8 @@ class CompareScenariosDialog(QtWidgets.QDialog, FORM_CLASS):
         cob_fields.clear()
         if cob_scenario.currentIndex() < 0:
             return
-        lst = find_table_fields(self.conn, cob_scenario.currentText())
+        with self.results_db.connection() as conn:
+            lst = find_table_fields(conn, cob_scenario.currentText())
         flds = [x.replace("ab", "*") for x in lst if "ab" in x and x.replace("ab", "ba") in lst]
         cob_fields.addItems(flds)
 
@@ -103,84 +102,47 @@ class CompareScenariosDialog(QtWidgets.QDialog, FORM_CLASS):
             return
 
         self.but_run.setEnabled(False)
-        self.band_size = str(self.band_size)
-        self.space_size = str(self.space_size)
-
-        QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_spacer", float(self.space_size))
-        QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_width", float(self.band_size))
-        self.space_size = "@aeq_band_spacer"
-        self.band_size = "@aeq_band_width"
-
-        # define the side of the plotting based on the side of the road the system has defined
-        ab = 1 if self.drive_side == "right" else -1
-        ba = -ab
+        v1 = self.cob_base_scenario.currentText()
+        v2 = self.cob_alternative_scenario.currentText()
+        v3 = self.cob_base_data.currentText()
+        v4 = self.cob_alternative_data.currentText()
 
-        # fields
-        [ab_base, ba_base], [ab_alt, ba_alt] = self.load_result_tables()
+        # Everything is computed once and stored as plain fields, so redraws do not evaluate any expression
+        self.link_layer = self.qgis_project.layer_by_name("links")
+        df = compare_flows(
+            self.read_flows(v1, v3),
+            self.read_flows(v2, v4),
+            self.radio_compo.isChecked(),
+            band_size=self.band_size,
+            space_size=self.space_size,
+            drive_side=self.drive_side,
+        )
+        layer = comparison_layer(self.link_layer, df, f"{v1} ({v3}) x {v2} ({v4})")
 
-        # Create new simple stype
         symbol = QgsLineSymbol.createSimple({"name": "square", "color": "red"})
-        self.link_layer.renderer().setSymbol(symbol)
-
-        # Create the bandwidths for the common flow, if requested
         if self.radio_compo.isChecked():
-            exp = QgsExpression(
-                f"""max(maximum(coalesce("{ab_base}",0)),
-                                        maximum(coalesce("{ab_alt}",0)),
-                                        maximum(coalesce("{ba_base}",0)),
-                                        maximum(coalesce("{ba_alt}",0))) """
-            )
-            context = self.link_layer.createExpressionContext()
-            max_value = exp.evaluate(context).real
-
-            QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_max_value", float(max_value))
-            max_value = "@aeq_band_max_value"
-
-            # We create the styles for AB and BA directions and add to the fields
-            text_color = self.text_color(self.common_flow_color)
-            for abb, aba, di, t in ([ab_base, ab_alt, ab, "ab"], [ba_base, ba_alt, ba, "ba"]):
-                width = f'(coalesce(scale_linear(min("{abb}","{aba}") , 0,{max_value},0,{self.band_size}), 0))'
-                offset = f"{di}*({width}/2 + {self.space_size})"
-                line_pattern = f'if (max(coalesce("{abb}"+"{aba}", 0),0) = 0,' + "'no', 'solid')"
-                symbol_layer = self.create_style(width, offset, text_color, line_pattern)
-                self.link_layer.renderer().symbol().appendSymbolLayer(symbol_layer)
-                ab_offset = offset if t == "ab" else None
-                ba_offset = offset if t != "ab" else None
-
-        # If we want a plot of the differences only
-        if self.radio_diff.isChecked():
-            exp = QgsExpression(
-                f"""max(maximum(abs(coalesce("{ab_base}",0)-coalesce("{ab_alt}",0))),
-                                        maximum(abs(coalesce("{ba_base}",0)-coalesce("{ba_alt}",0)))) """
-            )
-            context = self.link_layer.createExpressionContext()
-            max_value = exp.evaluate(context).real
-            ab_offset = ba_offset = "0"
-
-            QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_max_value", float(max_value))
-            max_value = "@aeq_band_max_value"
-
-        # We now create the positive and negative bandwidths for each side of the link
-        styles = []
-        styles.append((ab_base, ab_alt, ab, ab_offset))
-        styles.append((ba_base, ba_alt, ba, ba_offset))
+            for d in ["ab", "ba"]:
+                color = QgsProperty.fromValue(self.common_flow_color.color())
+                symbol.appendSymbolLayer(self.create_style(f"common_{d}", color))
 
         pos_color = self.text_color(self.positive_color)
         neg_color = self.text_color(self.negative_color)
-
-        for i in styles:
-            width = f'(coalesce(scale_linear(abs("{i[0]}"-"{i[1]}") , 0,{max_value},0,{self.band_size}),0))'
-            offset = f"{i[3]}+{i[2]}*({width}/2 + {self.space_size})"
-            line_pattern = f'if (coalesce("{i[0]}"-"{i[1]}", 0) = 0,' + "'no', 'solid')"
-            color = f'if(max(("{i[0]}"-"{i[1]}"),0) = 0,{neg_color},{pos_color})'
-            symbol_layer = self.create_style(width, offset, color, line_pattern)
-            self.link_layer.renderer().symbol().appendSymbolLayer(symbol_layer)
+        for d in ["ab", "ba"]:
+            color = QgsProperty.fromExpression(f'if("positive_{d}" = 1, {pos_color}, {neg_color})')
+            symbol.appendSymbolLayer(self.create_style(f"diff_{d}", color))
 
         # Deletes the pre-existing style
-        self.link_layer.renderer().symbol().deleteSymbolLayer(0)
-        self.link_layer.triggerRepaint()
+        symbol.deleteSymbolLayer(0)
+        layer.renderer().setSymbol(symbol)
+        QgsProject.instance().addMapLayer(layer)
         self.exit_procedure()
 
+    def read_flows(self, table_name: str, field: str) -> pd.DataFrame:
+        ab, ba = field.replace("*", "ab"), field.replace("*", "ba")
+        sql = f'SELECT link_id, "{ab}" ab, "{ba}" ba FROM "{table_name}"'
+        with self.results_db.connection() as conn:
+            return pd.read_sql(sql, conn).set_index("link_id")
+
     def check_inputs(self):
         for combo in [
             self.cob_base_scenario,
@@ -199,45 +161,12 @@ class CompareScenariosDialog(QtWidgets.QDialog, FORM_CLASS):
             return False
         return True
 
-    def load_result_tables(self):
-        self.link_layer = self.qgis_project.layers["links"][0]
-        QgsProject.instance().addMapLayer(self.link_layer)
-
-        v1 = self.cob_base_scenario.currentText()
-        v2 = self.cob_alternative_scenario.currentText()
-        v3 = self.cob_base_data.currentText()
-        v4 = self.cob_alternative_data.currentText()
-        self.base_lyr = load_result_table(self.qgis_project.project.project_base_path, v1)
-        data_to_join = [[self.base_lyr, "base"]]
-
-        txt = f"base_{v3}"
-        data_fields = [[txt.replace("*", "ab"), txt.replace("*", "ba")]]
-        txt = f"base_{v4}"
-        if v1 != v2:
-            self.alter_layer = load_result_table(self.qgis_project.project.project_base_path, v2)
-            data_to_join.append([self.alter_layer, "alternative"])
-            txt = f"alternative_{v4}"
-        data_fields.append([txt.replace("*", "ab"), txt.replace("*", "ba")])
-
-        for lyr, nm in data_to_join:
-            lien = QgsVectorLayerJoinInfo()
-            lien.setJoinFieldName("link_id")
-            lien.setTargetFieldName("link_id")
-            lien.setJoinLayerId(lyr.id())
-            lien.setUsingMemoryCache(True)
-            lien.setJoinLayer(lyr)
-            lien.setPrefix(f"{nm}_")
-            self.link_layer.addJoin(lien)
-        return data_fields
-
-    def create_style(self, width, offset, color, line_pattern):
+    def create_style(self, band: str, color: QgsProperty):
         symbol_layer = QgsSimpleLineSymbolLayer.create({})
-        props = symbol_layer.properties()
-        props["width_dd_expression"] = width
-        props["offset_dd_expression"] = offset
-        props["line_style_expression"] = line_pattern
-        props["color_dd_expression"] = color
-        symbol_layer = QgsSimpleLineSymbolLayer.create(props)
+        symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyStrokeWidth, QgsProperty.fromField(f"width_{band}"))
+        symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyOffset, QgsProperty.fromField(f"offset_{band}"))
+        symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyStrokeStyle, QgsProperty.fromField(f"style_{band}"))
+        symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyStrokeColor, color)
         return symbol_layer
 
     def exit_procedure(self):
@@ -3,8 +3,10 @@ import sys
 from functools import partial
 from random import randint
 
+import numpy as np
+import pandas as pd
 from PyQt5.QtGui import QColor
-from qgis._core import QgsLineSymbol
+from qgis._core import QgsLineSymbol, QgsFeatureRequest, QgsProperty, QgsSymbolLayer
 from qgis._core import QgsMapLayerProxyModel, QgsSimpleLineSymbolLayer, QgsExpressionContextUtils, QgsProject
 
 import qgis
@@ -13,7 +15,7 @@ from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtWidgets import QPushButton, QTableWidgetItem, QTableWidget
 from qgis.PyQt.QtWidgets import QToolButton, QHBoxLayout, QWidget, QDialog
 from .set_color_ramps_dialog import LoadColorRampSelector
-from ..common_tools import get_parameter_chain
+from ..common_tools import get_parameter_chain, geo_layer_from_dataframe, field_ranges
 
 sys.modules["qgsfieldcombobox"] = qgis.gui
 sys.modules["qgscolorbutton"] = qgis.gui
@@ -265,21 +267,7 @@ class CreateBandwidthsDialog(QDialog, FORM_CLASS):
 
         bands_ab = []
         bands_ba = []
-        # go through all the fields that will be used to find the maximum value. This will be used
-        # to limit the size of bandwidth for all layers of bands
-        values = []
-        all_fields = [x.name() for x in self.layer.fields()]
         for i in range(self.tot_bands):
-            for j in range(2):
-                if max_value < 0:
-                    field = self.bands_list.item(i, j).text()
-                    idx = all_fields.index(field)
-                    values.append(self.layer.maximumValue(idx))
-
-                # we also build a list of bands to construct
-                # The function "(2 * j -1) * ba"  maps the index j {1,2} and the direction to the side of the
-                # link the band needs to be. Try it out. it works!!
-                # bands.append((field, (2 * j -1) * ba, self.bands_list.item(i, 2).backgroundColor()))
             if len(self.bands_list.item(i, 2).text()) == 0:
                 cl = self.bands_list.item(i, 2).background().color()
             else:
@@ -287,9 +275,16 @@ class CreateBandwidthsDialog(QDialog, FORM_CLASS):
             bands_ab.append((self.bands_list.item(i, 0).text(), ab, cl, "ab"))
             bands_ba.append((self.bands_list.item(i, 1).text(), ba, cl, "ba"))
 
+        # The largest value of all the fields used limits the size of bandwidth for all layers of bands
         if max_value < 0:
-            values = [x for x in values if x is not None] + [0]
-            max_value = max(values)
+            fields = [band[0] for band in bands_ab + bands_ba]
+            values = [maxval for _, maxval in field_ranges(self.layer, fields).values() if maxval is not None]
+            max_value = max(values + [0])
+
+        if self.chb_materialize.isChecked():
+            self.materialize_bands(bands_ab, bands_ba, max_value)
+            self.exit_procedure()
+            return
 
         QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_max_value", max_value)
         QgsExpressionContextUtils.setProjectVariable(QgsProject.instance(), "aeq_band_spacer", float(space_size))
@@ -374,5 +369,58 @@ class CreateBandwidthsDialog(QDialog, FORM_CLASS):
         self.layer.triggerRepaint()
         self.exit_procedure()
 
+    def materialize_bands(self, bands_ab: list, bands_ba: list, max_value: float):
+        """Computes the width and offset of every band once, and draws them from plain fields of a new layer
+
+        With expressions, the offset of each band repeats the widths of all bands before it, so the cost of
+        drawing grows with the square of the number of bands, and is paid on every repaint"""
+        band_size, space_size = float(self.scale["width"]), float(self.scale["spacing"])
+        fields = list({field for field, _, _, _ in bands_ab + bands_ba})
+        ramp_fields = [clr[f"ramp {d}"] for _, _, clr, d in bands_ab + bands_ba if isinstance(clr, dict)]
+        fields.extend(f for f in ramp_fields if f not in fields)
+
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(fields, self.layer.fields())
+        ids, records = [], []
+        for feat in self.layer.getFeatures(request):
+            ids.append(feat.id())
+            records.append([feat[f] for f in fields])
+        values = pd.DataFrame(records, index=ids, columns=fields).apply(pd.to_numeric, errors="coerce")
+
+        df = pd.DataFrame(index=values.index)
+        symbol = QgsLineSymbol.createSimple({"name": "square", "color": "red"})
+        for bands in [bands_ab, bands_ba]:
+            acc_offset = np.zeros(df.shape[0])
+            for k, (field, side, clr, direc) in enumerate(bands):
+                data = np.nan_to_num(values[field].values)
+                width = np.clip(data / max_value * band_size, 0, band_size) if max_value > 0 else data * 0
+                df[f"width_{direc}_{k}"] = width
+                df[f"offset_{direc}_{k}"] = acc_offset + side * (width / 2 + space_size)
+                df[f"style_{direc}_{k}"] = np.where(data == 0, "no", "solid")
+                acc_offset = acc_offset + side * (width + space_size)
+
+                symbol_layer = QgsSimpleLineSymbolLayer.create({})
+                for prop, name in [
+                    (QgsSymbolLayer.PropertyStrokeWidth, "width"),
+                    (QgsSymbolLayer.PropertyOffset, "offset"),
+                    (QgsSymbolLayer.PropertyStrokeStyle, "style"),
+                ]:
+                    symbol_layer.setDataDefinedProperty(prop, QgsProperty.fromField(f"{name}_{direc}_{k}"))
+
+                if isinstance(clr, dict):
+                    low, high = float(clr[f"min {direc}"]), float(clr[f"max {direc}"])
+                    ramp = np.nan_to_num(values[clr[f"ramp {direc}"]].values)
+                    df[f"ramp_{direc}_{k}"] = np.clip((ramp - low) / (high - low), 0, 1) if high > low else ramp * 0
+                    xpr = QgsProperty.fromExpression(f"""ramp_color('{clr[f"color {direc}"]}', "ramp_{direc}_{k}")""")
+                    symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyStrokeColor, xpr)
+                else:
+                    symbol_layer.setColor(clr)
+                symbol.appendSymbolLayer(symbol_layer)
+
+        symbol.deleteSymbolLayer(0)
+        layer = geo_layer_from_dataframe(self.layer, df, f"{self.layer.name()} - bands")
+        layer.renderer().setSymbol(symbol)
+        QgsProject.instance().addMapLayer(layer)
+
     def exit_procedure(self):
         self.close()
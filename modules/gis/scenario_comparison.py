@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from qgis.core import QgsVectorLayer
+
+from ..common_tools.data_layer_from_dataframe import geo_layer_from_dataframe
+
+
+def compare_flows(base: pd.DataFrame, alternative: pd.DataFrame, composite: bool, **kwargs) -> pd.DataFrame:
+    """Flows, differences and the widths and offsets of each band, for every link
+
+    *base* and *alternative* are indexed by link_id and have columns *ab* and *ba*. Widths are scaled to the
+    largest value shown, as the map would do, and bands are placed on the side of the road the system drives on.
+    In composite mode the common flow (the smaller of the two) is drawn first and the difference next to it.
+    Differences are base minus alternative, and bands with no flow or no difference get the 'no' line style"""
+    band_size = kwargs.get("band_size", 10.0)
+    space_size = kwargs.get("space_size", 0.0)
+    side = 1 if kwargs.get("drive_side", "right") == "right" else -1
+
+    df = base.add_prefix("base_").join(alternative.add_prefix("alt_"), how="outer")
+    for d in ["ab", "ba"]:
+        df[f"diff_{d}"] = df[f"base_{d}"] - df[f"alt_{d}"]
+
+    if composite:
+        max_value = np.max(np.nan_to_num(df[["base_ab", "base_ba", "alt_ab", "alt_ba"]].values), initial=0)
+    else:
+        max_value = np.max(np.nan_to_num(np.abs(df[["diff_ab", "diff_ba"]].values)), initial=0)
+
+    def scale(values):
+        if max_value <= 0:
+            return np.zeros(values.shape[0])
+        return np.clip(np.nan_to_num(values) / max_value * band_size, 0, band_size)
+
+    for d, direction in [("ab", side), ("ba", -side)]:
+        base_offset = 0
+        if composite:
+            total = np.nan_to_num(df[f"base_{d}"].values + df[f"alt_{d}"].values)
+            df[f"common_{d}"] = np.minimum(df[f"base_{d}"].values, df[f"alt_{d}"].values)
+            df[f"width_common_{d}"] = scale(df[f"common_{d}"].values)
+            df[f"offset_common_{d}"] = base_offset = direction * (df[f"width_common_{d}"] / 2 + space_size)
+            df[f"style_common_{d}"] = np.where(total > 0, "solid", "no")
+
+        diff = df[f"diff_{d}"].values
+        df[f"width_diff_{d}"] = scale(np.abs(diff))
+        df[f"offset_diff_{d}"] = base_offset + direction * (df[f"width_diff_{d}"] / 2 + space_size)
+        df[f"style_diff_{d}"] = np.where(np.nan_to_num(diff) != 0, "solid", "no")
+        df[f"positive_{d}"] = (np.nan_to_num(diff) > 0).astype(int)
+    return df
+
+
+def comparison_layer(link_layer: QgsVectorLayer, df: pd.DataFrame, layer_name: str) -> QgsVectorLayer:
+    """Memory layer with the geometry of the links and the comparison as plain fields, keyed by link_id"""
+    return geo_layer_from_dataframe(link_layer, df, layer_name, key="link_id")
@@ -7,6 +7,8 @@ from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QDialog
 from qgis.core import QgsStyle
 
+from ..common_tools.layer_statistics import field_ranges
+
 sys.modules["qgsfieldcombobox"] = qgis.gui
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_bandwidth_color_ramps.ui"))
 
@@ -69,12 +71,11 @@ class LoadColorRampSelector(QDialog, FORM_CLASS):
             min_box.setText(str(minval))
             max_box.setText(str(maxval))
 
-        def find_max_min(field):
-            idx = self.layer.fields().indexFromName(field)
-            minval, maxval = self.layer.minimumAndMaximumValue(idx)
-            minval = round(0 if minval is None else minval, 2)
-            maxval = round(0 if maxval is None else maxval, 2)
-            return minval, maxval
+        def find_max_min(*fields):
+            ranges = field_ranges(self.layer, list(fields)).values()
+            minval = min([x for x, _ in ranges if x is not None], default=0)
+            maxval = max([x for _, x in ranges if x is not None], default=0)
+            return round(minval, 2), round(maxval, 2)
 
         if direction == "BA":
             if self.cbb_ba_field.currentIndex() > 0:
@@ -86,10 +87,7 @@ class LoadColorRampSelector(QDialog, FORM_CLASS):
                 if self.chk_dual_fields.isChecked():
                     field_ab = self.cbb_ab_field.currentText().replace("_*", "_ab")
                     field_ba = self.cbb_ab_field.currentText().replace("_*", "_ba")
-                    minval, maxval = find_max_min(field_ab)
-                    minval1, maxval2 = find_max_min(field_ba)
-                    minval = min(minval, minval1)
-                    maxval = max(maxval, maxval2)
+                    minval, maxval = find_max_min(field_ab, field_ba)
                     set_values_to_boxes(minval, self.txt_ab_min, maxval, self.txt_ab_max)
                 else:
                     minval, maxval = find_max_min(self.cbb_ab_field.currentText())
@@ -0,0 +1,142 @@
+import importlib.util as iutil
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import pyqtSignal
+
+from ..common_tools import WorkerThread
+
+has_parquet = iutil.find_spec("pyarrow") is not None
+if has_parquet:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class DataExportProcedure(WorkerThread):
+    """Exports matrix cores or an AequilibraE dataset to CSV or Parquet, in blocks of rows
+
+    Matrices are written in long format, with one line per origin and destination and one column per core. With
+    the sparse option, cells that are zero or NaN in all cores are skipped.
+    Blocks are read from disk by this thread, one at a time, and converted to text by a pool of threads, so the
+    file is written while the next blocks are formatted. Parquet files get one row group per block"""
+
+    ProgressValue = pyqtSignal(object)
+    ProgressText = pyqtSignal(object)
+    ProgressMaxValue = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    # Target size of each block, in values
+    chunk_cells = 2 ** 20
+
+    def __init__(self, parentThread, output_path: str, **kwargs):
+        WorkerThread.__init__(self, parentThread)
+        self.output_path = output_path
+        self.cores = kwargs.get("cores", {})
+        self.index = kwargs.get("index")
+        self.dataset = kwargs.get("dataset")
+        self.sparse = kwargs.get("sparse", False)
+        self.threads = kwargs.get("threads", os.cpu_count())
+        self.parquet = output_path.lower().endswith(".parquet")
+        self.cancelled = False
+        self.error = None
+        self.lines = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def doWork(self):
+        try:
+            if self.parquet:
+                self.write_parquet()
+            else:
+                self.write_csv()
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            self.error = e.args
+
+        if (self.cancelled or self.error is not None) and os.path.isfile(self.output_path):
+            os.unlink(self.output_path)
+        self.finished_threaded_procedure.emit(self.output_path)
+
+    def blocks(self):
+        if self.dataset is not None:
+            rows, width = self.dataset.entries, self.dataset.num_fields + 1
+        else:
+            rows, width = self.index.shape[0], self.index.shape[0] * max(len(self.cores), 1)
+        chunk_rows = max(1, self.chunk_cells // max(width, 1))
+        self.ProgressMaxValue.emit(int(np.ceil(rows / chunk_rows)))
+        self.ProgressText.emit(f"Exporting to {os.path.basename(self.output_path)}")
+
+        for start in range(0, rows, chunk_rows):
+            if self.cancelled:
+                raise ExportCancelled()
+            end = min(start + chunk_rows, rows)
+            if self.dataset is not None:
+                yield self.dataset_block(start, end)
+            else:
+                yield self.matrix_block(start, end)
+
+    def dataset_block(self, start: int, end: int) -> pd.DataFrame:
+        data = self.dataset.data
+        df = pd.DataFrame({"index": np.array(data["index"][start:end])})
+        for field in self.dataset.fields:
+            df[field] = np.array(data[field][start:end])
+        return df
+
+    def matrix_block(self, start: int, end: int) -> pd.DataFrame:
+        zones = self.index.shape[0]
+        values = {name: np.array(core[start:end, :]).ravel() for name, core in self.cores.items()}
+        origins = np.repeat(self.index[start:end], zones)
+        destinations = np.tile(self.index, end - start)
+        if self.sparse:
+            keep = np.zeros(origins.shape[0], bool)
+            for vals in values.values():
+                keep |= np.nan_to_num(vals) != 0
+            origins, destinations = origins[keep], destinations[keep]
+            values = {name: vals[keep] for name, vals in values.items()}
+
+        df = pd.DataFrame({"origin": origins, "destination": destinations})
+        for name, vals in values.items():
+            df[name] = vals
+        return df
+
+    def write_csv(self):
+        def to_text(df: pd.DataFrame, header: bool) -> str:
+            return df.to_csv(header=header, index=False)
+
+        with open(self.output_path, "w", newline="") as output, ThreadPoolExecutor(self.threads) as pool:
+            pending, written = deque(), 0
+            for i, df in enumerate(self.blocks()):
+                self.lines += df.shape[0]
+                pending.append(pool.submit(to_text, df, i == 0))
+                # Keeps a bounded number of blocks in memory and writes them in order
+                while len(pending) > self.threads or (pending and pending[0].done()):
+                    output.write(pending.popleft().result())
+                    written += 1
+                    self.ProgressValue.emit(written)
+            while pending:
+                output.write(pending.popleft().result())
+                written += 1
+                self.ProgressValue.emit(written)
+
+    def write_parquet(self):
+        writer = None
+        try:
+            for i, df in enumerate(self.blocks()):
+                self.lines += df.shape[0]
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(self.output_path, table.schema)
+                writer.write_table(table)
+                self.ProgressValue.emit(i + 1)
+        finally:
+            if writer is not None:
+                writer.close()
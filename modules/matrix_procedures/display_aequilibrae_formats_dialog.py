@@ -8,9 +8,11 @@ from aequilibrae.matrix import AequilibraeMatrix, AequilibraeData
 import qgis
 from qgis.PyQt import QtWidgets, uic, QtCore
 from qgis.PyQt.QtWidgets import QComboBox, QCheckBox, QSpinBox, QLabel, QSpacerItem
-from qgis.PyQt.QtWidgets import QHBoxLayout, QTableView, QPushButton, QVBoxLayout
+from qgis.PyQt.QtWidgets import QHBoxLayout, QTableView, QPushButton, QVBoxLayout, QProgressBar
 from ..common_tools import DatabaseModel, NumpyModel, GetOutputFileName
 from ..common_tools.auxiliary_functions import standard_path
+from ..common_tools.numpy_model import omx_core
+from .data_export_procedure import DataExportProcedure, has_parquet
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_data_viewer.ui"))
 
@@ -32,6 +34,8 @@ class DisplayAequilibraEFormatsDialog(QtWidgets.QDialog, FORM_CLASS):
         self.logger = logging.getLogger("AequilibraEGUI")
         self.qgis_project = qgis_project
         self.from_proj = proj
+        self.model = None
+        self.export_thread = None
 
         if len(file_path) > 0:
             self.data_path = file_path
@@ -92,8 +96,7 @@ class DisplayAequilibraEFormatsDialog(QtWidgets.QDialog, FORM_CLASS):
         if self.data_type == "AEM":
             self.data_to_show.computational_view([self.data_to_show.names[0]])
         elif self.data_type == "OMX":
-            self.data_to_show.matrix_view = np.array(self.omx[self.list_cores[0]])
-            self.data_to_show.index = np.array(list(self.omx.mapping(self.list_indices[0]).keys()))
+            self.set_omx_core(self.list_cores[0], self.list_indices[0])
 
         # Elements that will be used during the displaying
         self._layout = QVBoxLayout()
@@ -151,11 +154,23 @@ class DisplayAequilibraEFormatsDialog(QtWidgets.QDialog, FORM_CLASS):
         self.but_export.setText("Export")
         self.but_export.clicked.connect(self.export)
 
+        self.export_all_cores = QCheckBox()
+        self.export_all_cores.setText("Export all cores")
+        self.export_sparse = QCheckBox()
+        self.export_sparse.setText("Skip zeros")
+        self.export_sparse.setToolTip("Only exports origin/destination pairs with a non-zero value in any core")
+        self.export_progress = QProgressBar()
+        self.export_progress.setVisible(False)
+        self._layout.addWidget(self.export_progress)
+
         self.but_close = QPushButton()
         self.but_close.clicked.connect(self.exit_procedure)
         self.but_close.setText("Close")
 
         self.but_layout = QHBoxLayout()
+        if self.data_type in ["AEM", "OMX"]:
+            self.but_layout.addWidget(self.export_all_cores)
+            self.but_layout.addWidget(self.export_sparse)
         self.but_layout.addWidget(self.but_export)
         self.but_layout.addWidget(self.but_close)
 
@@ -170,12 +185,15 @@ class DisplayAequilibraEFormatsDialog(QtWidgets.QDialog, FORM_CLASS):
             return
         decimals = self.decimals.value()
         separator = self.thousand_separator.isChecked()
+        if isinstance(self.model, (NumpyModel, DatabaseModel)):
+            self.model.set_format(separator, decimals)
+            return
         if isinstance(self.data_to_show, AequilibraeMatrix):
-            m = NumpyModel(self.data_to_show, separator, decimals)
+            self.model = NumpyModel(self.data_to_show, separator, decimals)
         else:
-            m = DatabaseModel(self.data_to_show, separator, decimals)
+            self.model = DatabaseModel(self.data_to_show, separator, decimals)
         self.table.clearSpans()
-        self.table.setModel(m)
+        self.table.setModel(self.model)
 
     def change_matrix_cores(self):
         idx = self.idx_list.currentText()
@@ -183,24 +201,75 @@ class DisplayAequilibraEFormatsDialog(QtWidgets.QDialog, FORM_CLASS):
         if self.data_type == "AEM":
             self.data_to_show.computational_view([core])
             self.data_to_show.set_index(idx)
-            self.format_showing()
         elif self.data_type == "OMX":
-            self.data_to_show.matrix_view = np.array(self.omx[core])
-            self.data_to_show.index = np.array(list(self.omx.mapping(idx).keys()))
-            self.format_showing()
+            self.set_omx_core(core, idx)
+        self.model = None
+        self.format_showing()
+
+    def set_omx_core(self, core: str, idx: str):
+        # The core is kept as an HDF5 array, so only the tiles on display are read from disk
+        self.data_to_show.matrix_view = omx_core(self.omx, core)
+        self.data_to_show.index = self.omx.get_node(self.omx.root.lookup, idx)[:]
 
     def export(self):
-        new_name, file_type = GetOutputFileName(
-            self, self.data_type, ["Comma-separated file(*.csv)"], ".csv", self.data_path
-        )
-        if new_name is not None:
-            self.data_to_show.export(new_name)
+        if self.export_thread is not None:
+            self.export_thread.cancel()
+            return
+
+        formats = ["Comma-separated file(*.csv)"]
+        if has_parquet:
+            formats.append("Parquet file(*.parquet)")
+        new_name, file_type = GetOutputFileName(self, self.data_type, formats, ".csv", self.data_path)
+        if new_name is None:
+            return
+
+        if self.data_type == "AED":
+            self.export_thread = DataExportProcedure(qgis.utils.iface.mainWindow(), new_name, dataset=self.data_to_show)
+        else:
+            names = self.list_cores if self.export_all_cores.isChecked() else [self.mat_list.currentText()]
+            if self.data_type == "AEM":
+                all_cores = self.data_to_show.names
+                cores = {name: self.data_to_show.matrices[:, :, all_cores.index(name)] for name in names}
+            else:
+                cores = {name: omx_core(self.omx, name) for name in names}
+            self.export_thread = DataExportProcedure(
+                qgis.utils.iface.mainWindow(),
+                new_name,
+                cores=cores,
+                index=np.array(self.data_to_show.index[:]),
+                sparse=self.export_sparse.isChecked(),
+            )
+
+        # The table would read from the same file while it is exported, so it is frozen in the meantime
+        self.table.setEnabled(False)
+        self.export_progress.setVisible(True)
+        self.but_export.setText("Cancel export")
+        self.export_thread.ProgressMaxValue.connect(lambda val: self.export_progress.setRange(0, val))
+        self.export_thread.ProgressValue.connect(self.export_progress.setValue)
+        self.export_thread.ProgressText.connect(lambda txt: self.export_progress.setFormat(f"{txt} - %p%"))
+        self.export_thread.finished_threaded_procedure.connect(self.export_finished)
+        self.export_thread.start()
+
+    def export_finished(self, output_path):
+        worker = self.export_thread
+        self.export_thread = None
+        self.table.setEnabled(True)
+        self.export_progress.setVisible(False)
+        self.but_export.setText("Export")
+        if worker.error is not None:
+            qgis.utils.iface.messageBar().pushMessage("Error exporting data:", str(worker.error), level=1)
+        elif not worker.cancelled:
+            msg = f"{worker.lines:,} lines written to {os.path.basename(output_path)}"
+            qgis.utils.iface.messageBar().pushMessage("Export finished", msg, level=0)
 
     def exit_with_error(self):
         qgis.utils.iface.messageBar().pushMessage("Error:", self.error, level=1)
         self.close()
 
     def exit_procedure(self):
+        if self.export_thread is not None:
+            self.export_thread.cancel()
+            self.export_thread.wait()
         if not self.from_proj:
             self.qgis_project.matrices.pop(self.data_path)
         self.show()
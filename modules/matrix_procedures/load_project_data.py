@@ -12,7 +12,9 @@ from .display_aequilibrae_formats_dialog import DisplayAequilibraEFormatsDialog
 from .load_result_table import load_result_table
 from .matrix_lister import list_matrices
 from .results_lister import list_results
-from ..common_tools import PandasModel
+from ..common_tools import DataFrameModel
+from ..paths_procedures.assignment_telemetry import read_telemetry
+from ..paths_procedures.convergence_chart_dialog import ConvergenceChartDialog
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_project_data.ui"))
 
@@ -32,30 +34,41 @@ class LoadProjectDataDialog(QtWidgets.QDialog, FORM_CLASS):
         self.project = qgs_proj.project
 
         self.matrices: pd.DataFrame = None
-        self.matrices_model: PandasModel = None
+        self.matrices_model: DataFrameModel = None
 
         self.results: pd.DataFrame = None
-        self.results_model: PandasModel = None
+        self.results_model: DataFrameModel = None
 
         for table in [self.list_matrices, self.list_results]:
             table.setSelectionBehavior(QAbstractItemView.SelectRows)
             table.setSelectionMode(QAbstractItemView.SingleSelection)
+            table.setSortingEnabled(True)
 
         self.load_matrices()
         self.load_results()
 
         self.but_update_matrices.clicked.connect(self.update_matrix_table)
         self.but_load_Results.clicked.connect(self.load_result_table)
+        self.but_show_convergence.clicked.connect(self.show_convergence)
         self.but_load_matrix.clicked.connect(self.display_matrix)
+        self.filter_matrices.textChanged.connect(lambda txt: self.matrices_model.set_filter(txt))
+        self.filter_results.textChanged.connect(lambda txt: self.results_model.set_filter(txt))
+
+    @staticmethod
+    def selected_row(table):
+        rows = [x.row() for x in list(table.selectionModel().selectedRows())]
+        if not rows:
+            return None
+        return table.model().source_row(rows[0])
 
     def display_matrix(self):
-        idx = [x.row() for x in list(self.list_matrices.selectionModel().selectedRows())]
-        if not idx:
+        row = self.selected_row(self.list_matrices)
+        if row is None:
             return
-        if self.matrices["WARNINGS"][idx[0]] != "":
+        if self.matrices["WARNINGS"].values[row] != "":
             return
 
-        file_name = self.matrices["file_name"][idx[0]]
+        file_name = self.matrices["file_name"].values[row]
 
         dlg2 = DisplayAequilibraEFormatsDialog(self.qgs_proj, join(self.project.matrices.fldr, file_name), proj=True)
         dlg2.show()
@@ -65,7 +78,8 @@ class LoadProjectDataDialog(QtWidgets.QDialog, FORM_CLASS):
 
         self.matrices = list_matrices(self.project.matrices.fldr)
 
-        self.matrices_model = PandasModel(self.matrices)
+        self.matrices_model = DataFrameModel(self.matrices)
+        self.matrices_model.set_filter(self.filter_matrices.text())
         self.list_matrices.setModel(self.matrices_model)
 
     def update_matrix_table(self):
@@ -76,19 +90,34 @@ class LoadProjectDataDialog(QtWidgets.QDialog, FORM_CLASS):
     def load_results(self):
         self.results = list_results(self.project.project_base_path)
 
-        self.results_model = PandasModel(self.results)
+        self.results_model = DataFrameModel(self.results)
+        self.results_model.set_filter(self.filter_results.text())
         self.list_results.setModel(self.results_model)
 
     def load_result_table(self):
-        idx = [x.row() for x in list(self.list_results.selectionModel().selectedRows())]
-        if not idx:
+        row = self.selected_row(self.list_results)
+        if row is None:
             return
-        table_name = self.results["table_name"][idx[0]]
-        if self.results["WARNINGS"][idx[0]] != "":
+        table_name = self.results["table_name"].values[row]
+        if self.results["WARNINGS"].values[row] != "":
             return
 
         _ = load_result_table(self.project.project_base_path, table_name)
 
+    def show_convergence(self):
+        row = self.selected_row(self.list_results)
+        if row is None:
+            return
+        table_name = self.results["table_name"].values[row]
+        telemetry = read_telemetry(self.project.project_base_path, table_name)
+        if telemetry.empty:
+            self.iface.messageBar().pushMessage("No convergence record for this result", "", level=1)
+            return
+
+        dlg2 = ConvergenceChartDialog(self.iface, telemetry, table_name)
+        dlg2.show()
+        dlg2.exec_()
+
     def exit_with_error(self):
         qgis.utils.iface.messageBar().pushMessage("Error:", self.error, level=1)
         self.close()
@@ -1,21 +1,7 @@
-from os.path import join
+from qgis._core import QgsVectorLayer
 
-from qgis._core import QgsProject, QgsVectorLayer, QgsDataSourceUri
-
-import qgis
+from ..common_tools.results_database import results_database
 
 
 def load_result_table(project_base_path: str, table_name: str) -> QgsVectorLayer:
-    pth = join(project_base_path, "results_database.sqlite")
-    conn = qgis.utils.spatialite_connect(pth)
-    conn.execute("PRAGMA temp_store = 0;")
-    conn.execute("SELECT InitSpatialMetaData();")
-    conn.commit()
-    conn.close()
-
-    uri = QgsDataSourceUri()
-    uri.setDatabase(pth)
-    uri.setDataSource("", table_name, None)
-    lyr = QgsVectorLayer(uri.uri(), table_name, "spatialite")
-    QgsProject.instance().addMapLayer(lyr)
-    return lyr
+    return results_database(project_base_path).layer(table_name)
@@ -1,25 +1,33 @@
 import importlib.util as iutil
 import os
 
+import numpy as np
 import pandas as pd
 from aequilibrae.project.database_connection import database_connection
 
 spec = iutil.find_spec("openmatrix")
 has_omx = spec is not None
 
+# Folder -> (modification time, set of file names). Adding or removing files changes the folder's mtime
+_folder_contents = {}
+
+
+def files_in_folder(fldr) -> set:
+    mtime = os.stat(fldr).st_mtime_ns
+    cached = _folder_contents.get(fldr)
+    if cached is None or cached[0] != mtime:
+        with os.scandir(fldr) as entries:
+            cached = (mtime, {entry.name for entry in entries})
+        _folder_contents[fldr] = cached
+    return cached[1]
+
 
 def list_matrices(fldr) -> pd.DataFrame:
     conn = database_connection()
     df = pd.read_sql("select * from matrices", conn)
     conn.close()
 
-    existing_files = os.listdir(fldr)
-
-    matrices = df.assign(WARNINGS="")
-    for idx, record in matrices.iterrows():
-        if record.file_name not in existing_files:
-            matrices.loc[idx, "WARNINGS"] = "File not found on disk"
-
-        elif record.file_name[-4:] == ".omx" and not has_omx:
-            matrices.loc[idx, "WARNINGS"] = "OMX not available for display"
-    return matrices
+    exists = df.file_name.isin(files_in_folder(fldr))
+    no_omx = (df.file_name.str[-4:] == ".omx") & (not has_omx)
+    warnings = np.where(exists, np.where(no_omx, "OMX not available for display", ""), "File not found on disk")
+    return df.assign(WARNINGS=warnings)
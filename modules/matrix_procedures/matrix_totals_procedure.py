@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from os.path import join
+
+import numpy as np
+from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.utils.worker_thread import WorkerThread
+
+from qgis.PyQt.QtCore import pyqtSignal
+from ..common_tools.auxiliary_functions import tempPath
+
+cache_lock = threading.Lock()
+
+# Largest number of totals kept on disk. The oldest are dropped first
+max_cache_entries = 2000
+
+
+def cache_key(file_path: str, mtime: float, core: str) -> str:
+    """Cache key for the total of a core. JSON keeps it unambiguous, whatever characters paths and names have"""
+    return json.dumps([file_path, mtime, core])
+
+
+def totals_cache_file() -> str:
+    return join(tempPath(), "qaequilibrae_matrix_totals.json")
+
+
+def read_totals_cache() -> dict:
+    with cache_lock:
+        if not os.path.isfile(totals_cache_file()):
+            return {}
+        try:
+            with open(totals_cache_file(), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def update_totals_cache(new_totals: dict):
+    with cache_lock:
+        cache = {}
+        if os.path.isfile(totals_cache_file()):
+            try:
+                with open(totals_cache_file(), "r") as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+        # Totals of older versions of the same files will never be used again
+        stamps = {tuple(json.loads(key)[:2]) for key in new_totals}
+        paths = {path for path, _ in stamps}
+        cache = {k: v for k, v in cache.items() if _is_current(k, paths, stamps)}
+        cache.update(new_totals)
+        cache = dict(list(cache.items())[-max_cache_entries:])
+        with open(totals_cache_file(), "w") as f:
+            json.dump(cache, f)
+
+
+def _is_current(key: str, paths: set, stamps: set) -> bool:
+    try:
+        path, mtime, _ = json.loads(key)
+    except (ValueError, TypeError):
+        return False
+    return path not in paths or (path, mtime) in stamps
+
+
+class MatrixTotalsProcedure(WorkerThread):
+    """Computes the total of each core of a matrix file, emitting each one as soon as it is available
+
+    Totals are cached on disk, keyed by file path, modification time and core name"""
+
+    core_total = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    def __init__(self, parentThread, file_path: str, cores: list):
+        WorkerThread.__init__(self, parentThread)
+        self.file_path = file_path
+        self.cores = cores
+        self.mtime = None
+        self.error = None
+
+    def cache_key(self, core: str) -> str:
+        return cache_key(self.file_path, self.mtime, core)
+
+    def doWork(self):
+        try:
+            self.mtime = os.path.getmtime(self.file_path)
+        except OSError as e:
+            self.error = e.args
+            self.finished_threaded_procedure.emit(self.file_path)
+            return
+
+        cache = read_totals_cache()
+        to_compute = []
+        for core in self.cores:
+            key = self.cache_key(core)
+            if key in cache:
+                self.core_total.emit([self.file_path, core, cache[key]])
+            else:
+                to_compute.append(core)
+
+        if to_compute:
+            new_totals = {}
+            matrix = AequilibraeMatrix()
+            try:
+                matrix.load(self.file_path)
+                for core in to_compute:
+                    total = float(np.nansum(matrix.get_matrix(core)))
+                    new_totals[self.cache_key(core)] = total
+                    self.core_total.emit([self.file_path, core, total])
+                matrix.close()
+            except Exception as e:
+                self.error = e.args
+            if new_totals:
+                update_totals_cache(new_totals)
+        self.finished_threaded_procedure.emit(self.file_path)
@@ -1,13 +1,20 @@
+from functools import partial
+
 from aequilibrae.project import Project
 
 import qgis
 from qgis.PyQt.QtCore import Qt
-from qgis.PyQt.QtWidgets import QTableWidgetItem, QTableWidget
+from qgis.PyQt.QtWidgets import QTableWidgetItem, QTableWidget, QProgressBar, QLabel
 from qgis.PyQt.QtWidgets import QWidget, QFileDialog, QVBoxLayout
 from ..common_tools.auxiliary_functions import standard_path
+from ..common_tools.graph_cache import GraphCache
+from ..project_procedures.project_opening_procedure import ProjectOpeningProcedure
 
 
 def run_load_project(qgis_project):
+    if qgis_project.opening_worker is not None:
+        qgis.utils.iface.messageBar().pushMessage("A project is already being opened", level=1, duration=10)
+        return
     proj_path = QFileDialog.getExistingDirectory(QWidget(), "AequilibraE Project folder", standard_path())
     if proj_path is None or proj_path == "":
         return
@@ -15,45 +22,81 @@ def run_load_project(qgis_project):
     tab_count = 1
     for i in range(tab_count):
         qgis_project.projectManager.removeTab(i)
-    if proj_path is not None and len(proj_path) > 0:
-        qgis_project.contents = []
-        qgis_project.showing.setVisible(True)
-        qgis_project.project = Project()
-
-        try:
-            qgis_project.project.load(proj_path)
-        except FileNotFoundError as e:
-            if e.args[0] == "Model does not exist. Check your path and try again":
-                qgis.utils.iface.messageBar().pushMessage("FOLDER DOES NOT CONTAIN AN AEQUILIBRAE MODEL", level=1)
-                return
-            else:
-                raise e
-
-    curr = qgis_project.project.conn.cursor()
-    curr.execute("select f_table_name from geometry_columns;")
-    layers = [x[0] for x in curr.fetchall()]
+    qgis_project.contents = []
+    qgis_project.showing.setVisible(True)
+    qgis_project.set_menus_enabled(qgis_project.project_menus + qgis_project.network_menus, False)
+
+    # The database is checked and read in the background, with progress shown in the dock
+    label = QLabel("Opening project")
+    progress_bar = QProgressBar()
+    descrlayout = QVBoxLayout()
+    descrlayout.addWidget(label)
+    descrlayout.addWidget(progress_bar)
+    descrlayout.addStretch()
+    descr = QWidget()
+    descr.setLayout(descrlayout)
+    qgis_project.projectManager.addTab(descr, "Opening project")
+
+    worker = ProjectOpeningProcedure(qgis.utils.iface.mainWindow(), proj_path)
+    worker.ProgressText.connect(label.setText)
+    worker.ProgressValue.connect(progress_bar.setValue)
+    worker.ProgressMaxValue.connect(progress_bar.setMaximum)
+    worker.finished_threaded_procedure.connect(partial(project_checked, qgis_project, worker))
+    qgis_project.opening_worker = worker
+    worker.start()
+
+
+def project_checked(qgis_project, worker: ProjectOpeningProcedure, _):
+    if qgis_project.opening_worker is not worker:
+        return
+    qgis_project.opening_worker = None
+    qgis_project.projectManager.clear()
+    if worker.cancelled or worker.error is not None:
+        qgis_project.set_menus_enabled(qgis_project.project_menus + qgis_project.network_menus, True)
+        if worker.error is None:
+            return
+        if worker.error[0] == "Model does not exist. Check your path and try again":
+            qgis.utils.iface.messageBar().pushMessage("FOLDER DOES NOT CONTAIN AN AEQUILIBRAE MODEL", level=1)
+        else:
+            qgis.utils.iface.messageBar().pushMessage("Error", f"Could not open project: {worker.error[0]}", level=3)
+        return
+
+    # The project open so far is closed, so no layers, indices, workers or connections of it are left behind
+    qgis_project.run_close_project()
+    qgis_project.set_menus_enabled(qgis_project.network_menus, False)
+    # Loading uses the project's own connection, so it happens here, after the worker warmed up what it reads
+    qgis_project.project = Project()
+    qgis_project.project.load(worker.proj_path)
+
+    # Network layers come first, as network tools are enabled once their metadata is read
+    layers = dict(sorted(worker.layers.items(), key=lambda x: x[0].lower() not in ["links", "nodes"]))
 
     descrlayout = QVBoxLayout()
     qgis_project.geo_layers_table = QTableWidget()
     qgis_project.geo_layers_table.doubleClicked.connect(qgis_project.load_geo_layer)
 
     qgis_project.geo_layers_table.setRowCount(len(layers))
-    qgis_project.geo_layers_table.setColumnCount(1)
+    qgis_project.geo_layers_table.setColumnCount(2)
     qgis_project.geo_layers_table.horizontalHeader().hide()
     for i, f in enumerate(layers):
-        item1 = QTableWidgetItem(f)
-        item1.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        qgis_project.geo_layers_table.setItem(i, 0, item1)
+        for j, text in enumerate([f, ""]):
+            item1 = QTableWidgetItem(text)
+            item1.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
+            qgis_project.geo_layers_table.setItem(i, j, item1)
 
+    progress_bar = QProgressBar()
     descrlayout.addWidget(qgis_project.geo_layers_table)
+    descrlayout.addWidget(progress_bar)
 
     descr = QWidget()
     descr.setLayout(descrlayout)
     qgis_project.tabContents = [(descr, "Geo layers")]
     qgis_project.projectManager.addTab(descr, "Geo layers")
     qgis_project.project.conn.execute("PRAGMA temp_store = 0;")
+    qgis_project.graph_cache = GraphCache(qgis_project.project)
+    qgis_project.set_menus_enabled(qgis_project.project_menus, True)
 
-    # Creates all layers and puts them in memory
+    # Layers are only created when first requested, and their metadata is read in the background
     qgis_project.layers.clear()
-    for lyr in layers:
-        qgis_project.create_layer_by_name(lyr)
+    qgis_project.layer_metadata = {lyr.lower(): meta for lyr, meta in layers.items()}
+    qgis_project.probe_layers(layers, progress_bar)
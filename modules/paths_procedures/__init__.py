@@ -22,3 +22,4 @@
 from .action_run_shortest_path import run_shortest_path
 from .action_skim_matrix import run_dist_matrix
 from .action_traffic_assignment import run_traffic_assig
+from .action_batch_assignment import run_batch_assignment
@@ -0,0 +1,9 @@
+def run_batch_assignment(qgis_project):
+    from .batch_assignment_dialog import BatchAssignmentDialog
+
+    if qgis_project.project is None:
+        qgis_project.show_message_no_project()
+    else:
+        dlg2 = BatchAssignmentDialog(qgis_project)
+        dlg2.show()
+        dlg2.exec_()
@@ -0,0 +1,158 @@
+import importlib.util as iutil
+import os
+from os.path import join
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import pyqtSignal
+from aequilibrae.paths.traffic_assignment import TrafficAssignment
+
+from ..common_tools import WorkerThread
+from ..common_tools.results_database import results_database
+
+spec = iutil.find_spec("openmatrix")
+has_omx = spec is not None
+if has_omx:
+    import openmatrix as omx
+    import tables
+
+
+class SavingCancelled(Exception):
+    pass
+
+
+def compression_filters(compress: bool, cores: int):
+    """HDF5 filters for OMX cores. Blosc compresses chunks in parallel, so it is preferred when available"""
+    if not compress:
+        return tables.Filters(complevel=0)
+    if tables.which_lib_version("blosc") is not None:
+        tables.set_blosc_max_threads(cores)
+        return tables.Filters(complevel=4, complib="blosc:lz4", shuffle=True)
+    return tables.Filters(complevel=1, complib="zlib", shuffle=True)
+
+
+class AssignmentOutputsProcedure(WorkerThread):
+    """Saves the link results and skims of a finished assignment
+
+    Result tables and records go through connections that belong to the GUI thread, so the caller saves them with
+    save_tables before starting the worker, which only writes skims to OMX. Skims are written in blocks of rows,
+    which allows for progress reporting and cancellation. With compression, cores are written with Blosc, which
+    compresses chunks in parallel with as many threads as the assignment used. Select link matrices, if any, are
+    written the same way as skims. Matrix records are also left for the caller to create, on the GUI thread"""
+
+    ProgressValue = pyqtSignal(object)
+    ProgressText = pyqtSignal(object)
+    ProgressMaxValue = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    # Target size of each chunk, in matrix cells
+    chunk_cells = 2 ** 18
+
+    def __init__(self, parentThread, assignment: TrafficAssignment, table_name: str, project_base_path: str, **kwargs):
+        WorkerThread.__init__(self, parentThread)
+        self.assignment = assignment
+        self.table_name = table_name
+        self.project_base_path = project_base_path
+        self.matrix_folder = join(project_base_path, "matrices")
+        self.select_link = kwargs.get("select_link", {})
+        self.save_skims = kwargs.get("save_skims", True)
+        self.compress = kwargs.get("compress", False)
+        self.cores = kwargs.get("cores", os.cpu_count())
+        self.cancelled = False
+        self.matrix_files = {}
+        self.error = None
+        self.report = []
+        self.__written = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def doWork(self):
+        if (self.save_skims or self.select_link) and not has_omx:
+            self.report.append("OpenMatrix is not available on your system. Skims and matrices were not saved")
+        elif self.save_skims or self.select_link:
+            try:
+                self.write_matrices()
+            except SavingCancelled:
+                self.report.append("Saving of matrices cancelled. Partial matrix files were removed")
+            except Exception as e:
+                self.error = e.args
+        self.finished_threaded_procedure.emit(self.table_name)
+
+    def skim_cores(self, traffic_class) -> dict:
+        cores = {}
+        last_skims = traffic_class._aon_results.skims
+        avg_skims = traffic_class.results.skims
+        for core in last_skims.names:
+            cores[f"{core}_final"] = last_skims.matrix[core]
+        for core in avg_skims.names:
+            cores[f"{core}_blended"] = avg_skims.matrix[core]
+        return cores
+
+    def save_tables(self):
+        """Saves the link results and select link loads. Must be called from the thread that owns the connections"""
+        # AequilibraE writes the link results with its own connection, so the service is told the table changed
+        db = results_database(self.project_base_path)
+        self.assignment.save_results(self.table_name)
+        db.table_written(self.table_name)
+        self.report.append(f"Link results saved to table {self.table_name}")
+        if not self.select_link:
+            return
+
+        loads = pd.concat([sl.link_loads() for sl in self.select_link.values()], axis=1).fillna(0)
+        db.write_table(loads, f"{self.table_name}_select_link")
+        self.report.append(f"Select link loads saved to table {self.table_name}_select_link")
+
+    def write_matrices(self):
+        to_write = {}
+        for cls in self.assignment.classes:
+            if self.save_skims and cls.results.num_skims > 0:
+                description = f"Skimming for assignment procedure. Class {cls.__id__}"
+                to_write[f"{self.table_name}_{cls.__id__}.omx"] = (description, self.skim_cores(cls))
+            if cls.__id__ in self.select_link:
+                description = f"Select link analysis for assignment procedure. Class {cls.__id__}"
+                cores = self.select_link[cls.__id__].od_matrices()
+                to_write[f"{self.table_name}_{cls.__id__}_select_link.omx"] = (description, cores)
+
+        zones = self.assignment.classes[0].graph.centroids.shape[0]
+        chunk_rows = max(1, min(zones, self.chunk_cells // max(zones, 1)))
+        blocks = int(np.ceil(zones / chunk_rows))
+        self.ProgressMaxValue.emit(blocks * sum(len(cores) for _, cores in to_write.values()))
+
+        filters = compression_filters(self.compress, self.cores)
+        index = self.assignment.classes[0].graph.centroids
+        for file_name, (description, cores) in to_write.items():
+            file_path = join(self.matrix_folder, file_name)
+            if os.path.isfile(file_path):
+                raise FileExistsError(f"{file_name} already exists. Choose a different name")
+            try:
+                self.write_omx(file_path, cores, index, filters, chunk_rows)
+            except Exception:
+                if os.path.isfile(file_path):
+                    os.unlink(file_path)
+                raise
+            self.matrix_files[file_name] = description
+            self.report.append(f"Matrices saved to {file_name}")
+
+    def write_omx(self, file_path: str, cores: dict, index: np.ndarray, filters, chunk_rows: int):
+        zones = index.shape[0]
+        omx_file = omx.open_file(file_path, "w")
+        try:
+            for name, data in cores.items():
+                self.ProgressText.emit(f"Writing {os.path.basename(file_path)} - {name}")
+                mat = omx_file.create_matrix(
+                    name,
+                    atom=tables.Atom.from_dtype(data.dtype),
+                    shape=(zones, zones),
+                    filters=filters,
+                    chunkshape=(chunk_rows, zones),
+                )
+                for start in range(0, zones, chunk_rows):
+                    if self.cancelled:
+                        raise SavingCancelled()
+                    mat[start : start + chunk_rows, :] = data[start : start + chunk_rows, :]
+                    self.__written += 1
+                    self.ProgressValue.emit(self.__written)
+            omx_file.create_mapping("main_index", index)
+        finally:
+            omx_file.close()
@@ -0,0 +1,123 @@
+import sys
+from collections import defaultdict
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from aequilibrae.paths.linear_approximation import LinearApproximation
+
+from ..common_tools.aequilibrae_internals import internals_available
+from ..common_tools.results_database import results_database
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def telemetry_table(table_name: str) -> str:
+    return f"{table_name}_convergence"
+
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of the QGIS process, in MB. NaN where the platform does not expose it"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    except (ImportError, AttributeError):
+        return np.nan
+
+
+def save_telemetry(project_base_path: str, table_name: str, telemetry: pd.DataFrame):
+    results_database(project_base_path).write_table(
+        telemetry, telemetry_table(table_name), if_exists="replace", index=False
+    )
+
+
+def read_telemetry(project_base_path: str, table_name: str) -> pd.DataFrame:
+    db = results_database(project_base_path)
+    if not db.has_table(telemetry_table(table_name)):
+        return pd.DataFrame([])
+    return db.read_table(telemetry_table(table_name))
+
+
+def telemetry_available(traffic_classes: list) -> bool:
+    """Whether the all-or-nothing loadings of these classes can be timed"""
+    members = [(LinearApproximation, x) for x in ["execute", "calculate_stepsize"]]
+    members += [(c, "_aon_results") for c in traffic_classes]
+    members += [(c._aon_results, "total_flows") for c in traffic_classes if hasattr(c, "_aon_results")]
+    return internals_available("Assignment telemetry", members)
+
+
+class TelemetryLinearApproximation(LinearApproximation):
+    """Equilibrium assignment that records timings and memory use for each iteration
+
+    Time spent in all-or-nothing assignments is measured from the moment each class finishes loading the network,
+    so it also includes the (small) cost update at the end of the previous iteration"""
+
+    def __init__(self, assig_spec, algorithm) -> None:
+        LinearApproximation.__init__(self, assig_spec, algorithm)
+        self.__timings = defaultdict(lambda: defaultdict(float))
+        self.__mark = 0.0
+
+    def execute(self):
+        self.__timings.clear()
+        start = self.__mark = perf_counter()
+        for c in self.traffic_classes:
+            c._aon_results.total_flows = self.__timed_aon(c, c._aon_results.total_flows)
+        try:
+            LinearApproximation.execute(self)
+        finally:
+            for c in self.traffic_classes:
+                del c._aon_results.total_flows
+        self.__timings[self.iter]["end"] = perf_counter()
+        self.__timings[0]["end"] = start
+
+    def __timed_aon(self, traffic_class, total_flows):
+        def timed_total_flows():
+            now = perf_counter()
+            timing = self.__timings[self.iter]
+            timing["aon_time"] += now - self.__mark
+            timing["peak_memory_mb"] = peak_memory_mb()
+            if self.iter > 1:
+                self.__timings[self.iter - 1].setdefault("end", self.__mark)
+            total_flows()
+            self.aon_finished(traffic_class)
+            self.__mark = perf_counter()
+
+        return timed_total_flows
+
+    def aon_finished(self, traffic_class):
+        """Called as soon as the all-or-nothing assignment of a class is done, in every iteration"""
+        pass
+
+    def calculate_stepsize(self):
+        start = perf_counter()
+        LinearApproximation.calculate_stepsize(self)
+        self.__mark = perf_counter()
+        self.__timings[self.iter]["line_search_time"] = self.__mark - start
+
+    def telemetry(self) -> pd.DataFrame:
+        """Per-iteration record of convergence, timings (in seconds), cores used and peak memory"""
+        report = self.convergence_report
+        iterations = report["iteration"]
+        if not iterations:
+            return pd.DataFrame([])
+        ends = [self.__timings[i - 1]["end"] for i in iterations] + [self.__timings[iterations[-1]]["end"]]
+        return pd.DataFrame(
+            {
+                "iteration": iterations,
+                "rgap": report["rgap"],
+                "stepsize": report["alpha"],
+                "wall_time": np.diff(ends),
+                "aon_time": [self.__timings[i]["aon_time"] for i in iterations],
+                "line_search_time": [self.__timings[i]["line_search_time"] for i in iterations],
+                "cores": self.cores,
+                "peak_memory_mb": [self.__timings[i]["peak_memory_mb"] for i in iterations],
+            }
+        )
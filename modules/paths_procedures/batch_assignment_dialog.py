@@ -0,0 +1,299 @@
+import logging
+
+import yaml
+from aequilibrae.paths.traffic_assignment import TrafficAssignment
+from aequilibrae.paths.traffic_class import TrafficClass
+
+import qgis
+from qgis.PyQt import QtWidgets
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtWidgets import QHBoxLayout, QVBoxLayout, QPushButton, QLabel, QLineEdit, QSpinBox, QProgressBar
+from qgis.PyQt.QtWidgets import QTableWidget, QTableWidgetItem, QFileDialog
+from .assignment_outputs_procedure import AssignmentOutputsProcedure
+from .batch_assignment_procedure import ScenarioAssignmentProcedure
+from ..common_tools import ReportDialog
+from ..common_tools import standard_path
+
+logger = logging.getLogger("AequilibraEGUI")
+
+
+def specification_error(spec) -> str:
+    """Returns what is wrong with the structure of a scenario specification, or None if nothing is"""
+    if not isinstance(spec, dict):
+        return "The specification must be a mapping with a list of scenarios"
+    scenarios = spec.get("scenarios")
+    if not isinstance(scenarios, list) or not scenarios:
+        return "No scenarios found in the specification"
+    if not all(isinstance(scn, dict) for scn in scenarios):
+        return "Each scenario must be a mapping of its parameters"
+    names = [scn.get("name") for scn in scenarios]
+    if not all(isinstance(nm, str) and nm for nm in names) or len(set(names)) != len(names):
+        return "All scenarios need a unique name"
+    for scn in scenarios:
+        classes = scn.get("classes")
+        if not isinstance(classes, list) or not classes or not all(isinstance(c, dict) for c in classes):
+            return f"Scenario {scn['name']} needs a list of traffic classes"
+    try:
+        int(spec.get("concurrent_assignments", 1))
+    except (TypeError, ValueError):
+        return "concurrent_assignments must be a whole number"
+    return None
+
+
+class BatchAssignmentDialog(QtWidgets.QDialog):
+    """Runs a list of assignment scenarios read from a YAML file, several of them at a time
+
+    Graphs come from the project's graph cache, so scenarios sharing a network never build it twice"""
+
+    def __init__(self, qgis_project):
+        QtWidgets.QDialog.__init__(self)
+        self.iface = qgis_project.iface
+        self.project = qgis_project.project
+        self.graph_cache = qgis_project.graph_cache
+        self.setWindowTitle("Batch traffic assignment")
+        self.scenarios = []
+        self.pending = []
+        self.running = {}
+        self.report = []
+        self.done = 0
+        self.closing = False
+
+        self.txt_spec = QLineEdit()
+        self.txt_spec.setReadOnly(True)
+        self.but_load = QPushButton("Load scenarios")
+        self.but_load.clicked.connect(self.load_scenarios)
+        spec_layout = QHBoxLayout()
+        spec_layout.addWidget(self.txt_spec)
+        spec_layout.addWidget(self.but_load)
+
+        self.tbl_scenarios = QTableWidget(0, 3)
+        self.tbl_scenarios.setHorizontalHeaderLabels(["Scenario", "Cores", "Status"])
+        self.tbl_scenarios.setColumnWidth(0, 250)
+        self.tbl_scenarios.setColumnWidth(1, 60)
+        self.tbl_scenarios.setColumnWidth(2, 250)
+
+        self.spb_concurrent = QSpinBox()
+        self.spb_concurrent.setMinimum(1)
+        self.spb_concurrent.setMaximum(64)
+        self.spb_concurrent.setValue(1)
+        concurrency_layout = QHBoxLayout()
+        concurrency_layout.addWidget(QLabel("Concurrent assignments"))
+        concurrency_layout.addWidget(self.spb_concurrent)
+
+        self.progressbar = QProgressBar()
+        self.progressbar.setVisible(False)
+
+        self.but_run = QPushButton("Run")
+        self.but_run.setEnabled(False)
+        self.but_run.clicked.connect(self.run)
+        self.but_close = QPushButton("Close")
+        self.but_close.clicked.connect(self.exit_procedure)
+        but_layout = QHBoxLayout()
+        but_layout.addWidget(self.but_run)
+        but_layout.addWidget(self.but_close)
+
+        layout = QVBoxLayout()
+        layout.addItem(spec_layout)
+        layout.addWidget(self.tbl_scenarios)
+        layout.addItem(concurrency_layout)
+        layout.addWidget(self.progressbar)
+        layout.addItem(but_layout)
+        self.setLayout(layout)
+        self.resize(620, 400)
+
+    def load_scenarios(self):
+        file_types = "YAML(*.yml *.yaml)"
+        file_name, _ = QFileDialog.getOpenFileName(self, "Scenario specification", standard_path(), file_types)
+        if not file_name:
+            return
+
+        try:
+            with open(file_name, "r") as yml:
+                spec = yaml.safe_load(yml)
+        except (OSError, yaml.YAMLError) as e:
+            error = f"Could not read the specification. {e}"
+        else:
+            error = specification_error(spec)
+
+        if error is None:
+            scenarios = spec["scenarios"]
+            sql = "Select count(*) from results where table_name=?"
+            used = [scn["name"] for scn in scenarios if sum(self.project.conn.execute(sql, [scn["name"]]).fetchone())]
+            if used:
+                error = f"Result table names already exist: {', '.join(used)}"
+        if error is not None:
+            qgis.utils.iface.messageBar().pushMessage("Input error", error, level=3)
+            return
+
+        self.txt_spec.setText(file_name)
+        self.scenarios = scenarios
+        self.spb_concurrent.setValue(int(spec.get("concurrent_assignments", 1)))
+
+        self.tbl_scenarios.setRowCount(len(scenarios))
+        for i, scn in enumerate(scenarios):
+            for j, txt in enumerate([scn["name"], str(scn.get("cores", "all")), "Waiting"]):
+                item = QTableWidgetItem(txt)
+                item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
+                self.tbl_scenarios.setItem(i, j, item)
+        self.but_run.setEnabled(True)
+
+    def set_status(self, scenario_name: str, status: str):
+        row = [scn["name"] for scn in self.scenarios].index(scenario_name)
+        self.tbl_scenarios.item(row, 2).setText(status)
+
+    def build_assignment(self, scn: dict) -> TrafficAssignment:
+        assignment = TrafficAssignment()
+        classes = []
+        for cls in scn["classes"]:
+            matrix = self.project.matrices.get_matrix(cls["matrix"])
+            matrix.computational_view(cls.get("matrix_cores", matrix.names))
+
+            # Every class gets its own copy of the cached graph, as scenarios may run concurrently
+            graph = self.graph_cache.get_graph(cls["mode"])
+            if scn.get("exclude_links"):
+                graph.exclude_links(scn["exclude_links"])
+            graph.set_graph(scn["time_field"])
+            if cls.get("skims"):
+                graph.set_skimming(cls["skims"])
+            graph.set_blocked_centroid_flows(cls.get("block_centroid_flows", True))
+
+            assigclass = TrafficClass(cls["name"], graph, matrix)
+            assigclass.set_pce(cls.get("pce", 1.0))
+            if cls.get("fixed_cost"):
+                assigclass.set_vot(cls.get("vot", 1.0))
+                assigclass.set_fixed_cost(cls["fixed_cost"])
+            classes.append(assigclass)
+
+        assignment.set_classes(classes)
+        assignment.set_vdf(scn.get("vdf", "BPR"))
+        assignment.set_vdf_parameters(scn.get("vdf_parameters", {}))
+        assignment.set_capacity_field(scn["capacity_field"])
+        assignment.set_time_field(scn["time_field"])
+        assignment.set_algorithm(scn.get("algorithm", "bfw"))
+        assignment.max_iter = int(scn.get("max_iter", 250))
+        assignment.rgap_target = float(scn.get("rgap", 0.0001))
+        if scn.get("cores"):
+            assignment.set_cores(int(scn["cores"]))
+        return assignment
+
+    def run(self):
+        self.but_run.setEnabled(False)
+        self.but_load.setEnabled(False)
+        self.spb_concurrent.setEnabled(False)
+        self.progressbar.setVisible(True)
+        self.progressbar.setRange(0, len(self.scenarios))
+        self.progressbar.setValue(0)
+        self.pending = list(self.scenarios)
+        self.done = 0
+        self.start_next()
+
+    def start_next(self):
+        while self.pending and len(self.running) < self.spb_concurrent.value():
+            scn = self.pending.pop(0)
+            try:
+                assignment = self.build_assignment(scn)
+            except Exception as e:
+                logger.error(f"Could not set scenario {scn['name']}. {e.args}")
+                self.report.append(f"{scn['name']}: Could not set the assignment. {e.args}")
+                self.set_status(scn["name"], "Failed to set up")
+                self.scenario_done()
+                continue
+
+            worker = ScenarioAssignmentProcedure(qgis.utils.iface.mainWindow(), scn["name"], assignment)
+            worker.finished_threaded_procedure.connect(self.scenario_finished)
+            self.running[scn["name"]] = (worker, scn)
+            self.set_status(scn["name"], "Running")
+            worker.start()
+
+    def scenario_finished(self, scenario_name: str):
+        worker, scn = self.running.pop(scenario_name)
+        if self.closing:
+            self.scenario_done()
+            return
+        if worker.error is not None:
+            self.report.append(f"{scenario_name}: Assignment failed. {worker.error}")
+            self.set_status(scenario_name, "Failed")
+            self.scenario_done()
+            self.start_next()
+            return
+
+        # The scenario keeps its slot while its results are saved
+        outputs = AssignmentOutputsProcedure(
+            qgis.utils.iface.mainWindow(),
+            worker.assignment,
+            scenario_name,
+            self.project.project_base_path,
+            save_skims=any(cls.get("skims") for cls in scn["classes"]),
+            cores=worker.assignment.cores,
+        )
+        outputs.finished_threaded_procedure.connect(self.outputs_saved)
+        self.running[scenario_name] = (outputs, scn)
+        self.set_status(scenario_name, "Saving results")
+        # Tables are saved here, as the project connection belongs to this thread. Only skims are left to the worker
+        try:
+            outputs.save_tables()
+        except Exception as e:
+            outputs.error = e.args
+        outputs.start()
+
+    def outputs_saved(self, scenario_name: str):
+        worker, _ = self.running.pop(scenario_name)
+        self.report.extend(f"{scenario_name}: {line}" for line in worker.report)
+        status = "Done"
+        if worker.error is not None:
+            self.report.append(f"{scenario_name}: Saving results failed. {worker.error}")
+            status = "Failed saving results"
+
+        # Matrix records go through the project connection, which belongs to this thread
+        try:
+            for file_name, description in worker.matrix_files.items():
+                record = self.project.matrices.new_record(file_name[:-4], file_name)
+                record.procedure_id = worker.assignment.procedure_id
+                record.timestamp = worker.assignment.procedure_date
+                record.procedure = "Traffic Assignment"
+                record.description = description
+                record.save()
+        except Exception as e:
+            logger.error(f"Could not record matrices of scenario {scenario_name}. {e.args}")
+            self.report.append(f"{scenario_name}: Could not record matrices. {e.args}")
+            status = "Failed saving results"
+
+        self.set_status(scenario_name, "Cancelled" if worker.cancelled else status)
+        self.scenario_done()
+        self.start_next()
+
+    def scenario_done(self):
+        self.done += 1
+        self.progressbar.setValue(self.done)
+        if self.closing:
+            if not self.running:
+                self.close()
+            return
+        if self.done == len(self.scenarios):
+            self.but_load.setEnabled(True)
+            self.spb_concurrent.setEnabled(True)
+            dlg2 = ReportDialog(self.iface, self.report)
+            dlg2.show()
+            dlg2.exec_()
+
+    def exit_procedure(self):
+        # Assignments cannot be interrupted, so the dialog closes once the running ones finish
+        self.pending.clear()
+        if not self.running:
+            self.close()
+            return
+        self.closing = True
+        self.but_close.setEnabled(False)
+        self.but_close.setText("Closing")
+        for worker, scn in self.running.values():
+            if isinstance(worker, AssignmentOutputsProcedure):
+                worker.cancel()
+            self.set_status(scn["name"], "Cancelling")
+
+    def closeEvent(self, event):
+        if self.running and not self.closing:
+            self.exit_procedure()
+        if self.running:
+            event.ignore()
+        else:
+            event.accept()
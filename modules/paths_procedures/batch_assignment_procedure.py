@@ -0,0 +1,23 @@
+from PyQt5.QtCore import pyqtSignal
+from aequilibrae.paths.traffic_assignment import TrafficAssignment
+
+from ..common_tools import WorkerThread
+
+
+class ScenarioAssignmentProcedure(WorkerThread):
+    """Runs the assignment for one scenario of a batch. Results are saved afterwards by AssignmentOutputsProcedure"""
+
+    finished_threaded_procedure = pyqtSignal(object)
+
+    def __init__(self, parentThread, scenario_name: str, assignment: TrafficAssignment):
+        WorkerThread.__init__(self, parentThread)
+        self.scenario_name = scenario_name
+        self.assignment = assignment
+        self.error = None
+
+    def doWork(self):
+        try:
+            self.assignment.execute()
+        except Exception as e:
+            self.error = e.args
+        self.finished_threaded_procedure.emit(self.scenario_name)
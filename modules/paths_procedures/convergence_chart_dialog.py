@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from qgis.PyQt import QtWidgets
+from qgis.PyQt.QtCore import Qt, QPointF, QRectF
+from qgis.PyQt.QtGui import QPainter, QPen, QColor, QPolygonF
+from qgis.PyQt.QtWidgets import QVBoxLayout, QTabWidget, QTableView
+from ..common_tools import DataFrameModel
+
+
+class ConvergenceChart(QtWidgets.QWidget):
+    """Relative gap (log scale) on top and time spent in all-or-nothing and line search per iteration below"""
+
+    margin = 50
+    aon_color = QColor(31, 119, 180)
+    line_search_color = QColor(255, 127, 14)
+
+    def __init__(self, telemetry: pd.DataFrame):
+        QtWidgets.QWidget.__init__(self)
+        self.telemetry = telemetry
+        self.setMinimumSize(600, 450)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+
+        half = (self.height() - 2 * self.margin) / 2
+        rgap_area = QRectF(self.margin, self.margin / 2, self.width() - 1.5 * self.margin, half)
+        time_area = QRectF(self.margin, rgap_area.bottom() + self.margin, rgap_area.width(), half)
+        self.draw_rgap(painter, rgap_area)
+        self.draw_times(painter, time_area)
+        painter.end()
+
+    def x_position(self, area: QRectF, i: int) -> float:
+        return area.left() + area.width() * (i + 0.5) / self.telemetry.shape[0]
+
+    def draw_axes(self, painter: QPainter, area: QRectF, title: str, low: str, high: str):
+        painter.setPen(QPen(Qt.black, 1))
+        painter.drawLine(area.bottomLeft(), area.bottomRight())
+        painter.drawLine(area.bottomLeft(), area.topLeft())
+        painter.drawText(QRectF(area.left(), area.top() - 20, area.width(), 20), Qt.AlignCenter, title)
+        painter.drawText(QRectF(0, area.top() - 8, self.margin - 4, 16), Qt.AlignRight, high)
+        painter.drawText(QRectF(0, area.bottom() - 8, self.margin - 4, 16), Qt.AlignRight, low)
+        last = int(self.telemetry.iteration.values[-1])
+        painter.drawText(QRectF(area.right() - 40, area.bottom() + 2, 40, 16), Qt.AlignRight, str(last))
+
+    def draw_rgap(self, painter: QPainter, area: QRectF):
+        rgap = self.telemetry.rgap.values.astype(np.float64)
+        finite = np.isfinite(rgap) & (rgap > 0)
+        if not finite.any():
+            return
+        log_gap = np.log10(rgap[finite])
+        low, high = np.floor(log_gap.min()), np.ceil(log_gap.max())
+        high = high if high > low else low + 1
+        self.draw_axes(painter, area, "Relative gap", f"1E{low:.0f}", f"1E{high:.0f}")
+
+        line = QPolygonF()
+        for i, val in zip(np.where(finite)[0], log_gap):
+            line.append(QPointF(self.x_position(area, i), area.bottom() - area.height() * (val - low) / (high - low)))
+        painter.setPen(QPen(Qt.darkGreen, 2))
+        painter.drawPolyline(line)
+
+    def draw_times(self, painter: QPainter, area: QRectF):
+        aon = np.nan_to_num(self.telemetry.aon_time.values.astype(np.float64))
+        line_search = np.nan_to_num(self.telemetry.line_search_time.values.astype(np.float64))
+        top = max(float((aon + line_search).max()), 1e-6)
+        self.draw_axes(painter, area, "Seconds per iteration (AoN / line search)", "0", f"{top:.2f}")
+
+        width = max(area.width() / self.telemetry.shape[0] * 0.8, 1)
+        for i, (t_aon, t_ls) in enumerate(zip(aon, line_search)):
+            x = self.x_position(area, i) - width / 2
+            h_aon = area.height() * t_aon / top
+            h_ls = area.height() * t_ls / top
+            painter.fillRect(QRectF(x, area.bottom() - h_aon, width, h_aon), self.aon_color)
+            painter.fillRect(QRectF(x, area.bottom() - h_aon - h_ls, width, h_ls), self.line_search_color)
+
+
+class ConvergenceChartDialog(QtWidgets.QDialog):
+    def __init__(self, iface, telemetry: pd.DataFrame, table_name: str):
+        QtWidgets.QDialog.__init__(self)
+        self.iface = iface
+        self.setWindowTitle(f"Convergence - {table_name}")
+
+        tabs = QTabWidget()
+        tabs.addTab(ConvergenceChart(telemetry), "Chart")
+        table = QTableView()
+        self.model = DataFrameModel(telemetry)
+        table.setModel(self.model)
+        tabs.addTab(table, "Iterations")
+
+        layout = QVBoxLayout()
+        layout.addWidget(tabs)
+        self.setLayout(layout)
@@ -1,7 +1,8 @@
+import hashlib
 import importlib.util as iutil
 import os
 
-from aequilibrae.paths import Graph, SkimResults, NetworkSkimming
+from aequilibrae.paths import Graph
 
 import qgis
 from ..common_tools.global_parameters import integer_types, float_types
@@ -10,6 +11,8 @@ from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtWidgets import QTableWidgetItem, QAbstractItemView
 from ..common_tools import ReportDialog
 from ..common_tools import standard_path
+from .resumable_skimming import ResumableNetworkSkimming, checkpoint_folder
+from .skim_outputs_procedure import SkimOutputsProcedure
 
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_impedance_matrix.ui"))
 
@@ -24,8 +27,11 @@ class ImpedanceMatrixDialog(QtWidgets.QDialog, FORM_CLASS):
         self.setupUi(self)
 
         self.project = qgis_project.project
-        self.link_layer = qgis_project.layers["links"][0]
-        self.result = SkimResults()
+        self.graph_cache = qgis_project.graph_cache
+        self.link_layer = qgis_project.layer_by_name("links")
+        self.worker_thread = None
+        self.outputs_thread = None
+        self.report = []
         self.validtypes = integer_types + float_types
         self.tot_skims = 0
         self.name_skims = 0
@@ -41,6 +47,17 @@ class ImpedanceMatrixDialog(QtWidgets.QDialog, FORM_CLASS):
         self.but_removes_from_links.clicked.connect(self.removes_fields)
         self.do_dist_matrix.clicked.connect(self.run_skimming)
 
+        # Output options
+        # Scaled integers need the scale recorded with the cores, which only OMX allows
+        data_types = [x for x in SkimOutputsProcedure.data_types if has_omx or x != "scaled integer"]
+        self.cob_skim_dtype.addItems(data_types)
+        self.cob_skim_dtype.currentTextChanged.connect(lambda txt: self.spn_scale.setEnabled(txt == "scaled integer"))
+        self.chb_cost_threshold.toggled.connect(self.spn_cost_threshold.setEnabled)
+        if not has_omx:
+            self.chb_compress_skims.setEnabled(False)
+            self.chb_cost_threshold.setEnabled(False)
+            self.chb_cost_threshold.setToolTip("Requires OpenMatrix")
+
         # SECOND, we set visibility for sections that should not be shown when the form opens (overlapping items)
         #        and re-dimension the items that need re-dimensioning
         self.hide_all_progress_bars()
@@ -122,7 +139,9 @@ class ImpedanceMatrixDialog(QtWidgets.QDialog, FORM_CLASS):
         return True
 
     def run_thread(self):
-        self.do_dist_matrix.setVisible(False)
+        self.do_dist_matrix.clicked.disconnect(self.run_skimming)
+        self.do_dist_matrix.clicked.connect(self.worker_thread.cancel)
+        self.do_dist_matrix.setText("Cancel")
         self.progressbar.setRange(0, self.graph.num_zones)
         self.worker_thread.skimming.connect(self.signal_handler)
         self.worker_thread.start()
@@ -138,17 +157,89 @@ class ImpedanceMatrixDialog(QtWidgets.QDialog, FORM_CLASS):
 
     def finished_threaded_procedure(self):
         self.report = self.worker_thread.report
-        format = "omx" if has_omx else "aem"
-        self.worker_thread.save_to_project(self.only_str(self.mat_name), format=format)
+        if self.worker_thread.error is not None:
+            self.report.append(f"Skimming failed: {self.worker_thread.error}")
+            self.report.append("Origins finished before the failure were kept, and are reused if it is run again.")
+            self.exit_procedure()
+        elif self.worker_thread.cancelled:
+            done, total = self.worker_thread.cumulative, self.graph.num_zones
+            self.report.append(f"Skimming cancelled after {done:,} of {total:,} origins.")
+            self.report.append("Run it again with the same settings to resume from where it stopped.")
+            self.exit_procedure()
+        else:
+            self.save_skims()
+
+    def save_skims(self):
+        file_name = f"{self.only_str(self.mat_name)}.{'omx' if has_omx else 'aem'}"
+        file_path = os.path.join(self.project.project_base_path, "matrices", file_name)
+        if os.path.isfile(file_path):
+            self.report.append(f"{file_name} already exists. Skims were kept to be saved with a different name")
+            self.exit_procedure()
+            return
+
+        threshold = None
+        if self.chb_cost_threshold.isChecked():
+            threshold = self.spn_cost_threshold.value()
+        self.outputs_thread = SkimOutputsProcedure(
+            qgis.utils.iface.mainWindow(),
+            self.worker_thread.results.skims,
+            file_path,
+            self.cob_skim_dtype.currentText(),
+            scale=self.spn_scale.value(),
+            compress=self.chb_compress_skims.isChecked(),
+            threshold=threshold,
+            threshold_field=self.cb_minimizing.currentText(),
+            cores=self.worker_thread.results.cores,
+        )
+        self.do_dist_matrix.clicked.disconnect(self.worker_thread.cancel)
+        self.do_dist_matrix.clicked.connect(self.outputs_thread.cancel)
+        self.outputs_thread.ProgressMaxValue.connect(lambda val: self.progressbar.setRange(0, val))
+        self.outputs_thread.ProgressValue.connect(self.progressbar.setValue)
+        self.outputs_thread.ProgressText.connect(self.progress_label.setText)
+        self.outputs_thread.finished_threaded_procedure.connect(self.skims_saved)
+        self.outputs_thread.start()
+
+    def skims_saved(self, file_path):
+        worker = self.outputs_thread
+        self.report.extend(worker.report)
+        if worker.error is not None:
+            self.report.append(f"Error saving skims: {worker.error}")
+        elif worker.scaled and not worker.cancelled:
+            # AequilibraE would read the scaled values as they are, so the file is not offered to other procedures
+            self.report.append(f"{os.path.basename(file_path)} holds scaled values, so it was not added to the project")
+            self.report.append("It can be opened with the matrix viewer, which reads it back in the original units")
+            self.worker_thread.clear_checkpoint()
+        elif not worker.cancelled:
+            record = self.project.matrices.new_record(self.only_str(self.mat_name), os.path.basename(file_path))
+            record.procedure_id = self.worker_thread.procedure_id
+            record.timestamp = self.worker_thread.procedure_date
+            record.procedure = "Network skimming"
+            record.description = "; ".join(worker.report)
+            record.save()
+            self.worker_thread.clear_checkpoint()
+        self.outputs_thread = None
         self.exit_procedure()
 
+    def checkpoint_key(self, mode: str, excluded_links: list) -> str:
+        """Skims with the same settings on the same network share a checkpoint, so they can be resumed"""
+        settings = [
+            self.project.project_base_path,
+            mode,
+            self.graph_cache.network_version(),
+            self.cb_minimizing.currentText(),
+            list(self.graph.skim_fields),
+            self.block_paths.isChecked(),
+            self.rdo_all_nodes.isChecked(),
+            sorted(excluded_links),
+        ]
+        return hashlib.md5(str(settings).encode()).hexdigest()
+
     def run_skimming(self):  # Saving results
         if not self.check_name_exists():
             return
         self.mat_name = self.line_matrix.text()
         mode = self.all_modes[self.cb_modes.currentText()]
-        self.project.network.build_graphs()
-        self.graph = self.project.network.graphs[mode]
+        self.graph = self.graph_cache.get_graph(mode)
 
         # We prepare the graph to set all nodes as centroids
         if self.rdo_all_nodes.isChecked():
@@ -157,20 +248,24 @@ class ImpedanceMatrixDialog(QtWidgets.QDialog, FORM_CLASS):
         self.graph.set_graph(cost_field=self.cb_minimizing.currentText())
         self.graph.set_blocked_centroid_flows(self.block_paths.isChecked())
 
+        remove = []
         if self.chb_chosen_links.isChecked():
             idx = self.link_layer.dataProvider().fieldNameIndex("link_id")
             remove = [feat.attributes()[idx] for feat in self.link_layer.selectedFeatures()]
             self.graph.exclude_links(remove)
 
-        self.graph.set_skimming(self.skim_fields)
-
-        self.result.prepare(self.graph)
+        # Discarding cells beyond a cost threshold requires skimming the cost itself
+        skims = list(self.skim_fields)
+        if self.chb_cost_threshold.isChecked() and self.cb_minimizing.currentText() not in skims:
+            skims.append(self.cb_minimizing.currentText())
+        self.graph.set_skimming(skims)
 
         self.funding1.setVisible(False)
         self.funding2.setVisible(False)
         self.progressbar.setVisible(True)
         self.progress_label.setVisible(True)
-        self.worker_thread = NetworkSkimming(self.graph, self.result)
+        checkpoint = checkpoint_folder(self.checkpoint_key(mode, remove))
+        self.worker_thread = ResumableNetworkSkimming(self.graph, checkpoint)
         try:
             self.run_thread()
         except ValueError as error:
@@ -11,6 +11,19 @@ from ..common_tools import LinkQueryModel
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_link_query_builder.ui"))
 
 
+def link_directions(graph) -> np.ndarray:
+    """Link IDs and directions (AB/BA) of the graph, sorted by link ID
+
+    Directions are stored as text, not bytes, so they are shown and read back as AB or BA"""
+    dt = [("link_id", np.int32), ("direction", "<U2")]
+    data = np.zeros(graph.shape[0], dtype=dt)
+    data["link_id"][:] = graph["link_id"][:]
+    data["direction"][graph["direction"] < 0] = "BA"
+    data["direction"][graph["direction"] > 0] = "AB"
+    data.sort(order="link_id")
+    return data
+
+
 class LoadSelectLinkQueryBuilderDialog(QtWidgets.QDialog, FORM_CLASS):
     def __init__(self, iface, graph, window_title):
         QtWidgets.QDialog.__init__(self)
@@ -28,17 +41,7 @@ class LoadSelectLinkQueryBuilderDialog(QtWidgets.QDialog, FORM_CLASS):
         self.query_type = "or"
         self.links = None
 
-        dt = [("link_id", np.int32), ("direction", "|S2")]
-
-        self.data = np.zeros(graph.shape[0], dtype=dt)
-
-        self.data["link_id"][:] = graph["link_id"][:]
-
-        self.data["direction"][graph["direction"] < 0] = "BA"
-        self.data["direction"][graph["direction"] > 0] = "AB"
-
-        self.data.sort(order="link_id")
-
+        self.data = link_directions(graph)
         self.model = LinkQueryModel(self.data, ["Link ID", "Dir"])
 
         # filter proxy model
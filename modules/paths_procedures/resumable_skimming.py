@@ -0,0 +1,210 @@
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+from multiprocessing.dummy import Pool as ThreadPool
+from os.path import join, isfile
+from time import perf_counter, time
+from uuid import uuid4
+
+import numpy as np
+from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.paths import NetworkSkimming
+
+from ..common_tools.aequilibrae_internals import internals_available
+from ..common_tools.auxiliary_functions import tempPath
+
+try:
+    from aequilibrae.paths.AoN import skimming_single_origin
+    from aequilibrae.paths.multi_threaded_skimming import MultiThreadedNetworkSkimming
+except ImportError:
+    skimming_single_origin = MultiThreadedNetworkSkimming = None
+
+logger = logging.getLogger("AequilibraEGUI")
+
+# Checkpoints are dropped once this old (in seconds), and only the most recent ones are kept
+checkpoint_max_age = 7 * 24 * 3600
+max_checkpoints = 3
+
+
+def checkpoints_root() -> str:
+    return join(tempPath(), "qaequilibrae_skims")
+
+
+def checkpoint_folder(key: str) -> str:
+    return join(checkpoints_root(), key)
+
+
+def prune_checkpoints(keep: str):
+    """Removes checkpoints that are too old or beyond the most recent ones, except for the folder in *keep*
+
+    Checkpoints of networks or settings that changed are never resumed, and skims can take gigabytes on disk"""
+    if not os.path.isdir(checkpoints_root()):
+        return
+    folders = []
+    for entry in os.scandir(checkpoints_root()):
+        if entry.is_dir() and os.path.abspath(entry.path) != os.path.abspath(keep):
+            stamps = [f.stat().st_mtime for f in os.scandir(entry.path) if f.is_file()]
+            folders.append((max(stamps, default=entry.stat().st_mtime), entry.path))
+    folders.sort(reverse=True)
+    now = time()
+    for pos, (stamp, folder) in enumerate(folders):
+        # The folder being resumed counts as one of the most recent
+        if now - stamp > checkpoint_max_age or pos >= max_checkpoints - 1:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def resumable_skimming_available(graph) -> bool:
+    """Whether the installed aequilibrae has the skimming internals ResumableNetworkSkimming drives directly"""
+    if skimming_single_origin is None or MultiThreadedNetworkSkimming is None:
+        logger.warning("Resumable skimming is not available. AequilibraE lacks its multi-threaded skimming routines")
+        return False
+    members = [(graph, x) for x in ["compact_num_nodes", "compact_num_links", "num_zones", "skim_fields", "fs"]]
+    members += [(graph, x) for x in ["__id__", "centroids", "nodes_to_indices"]]
+    members += [(MultiThreadedNetworkSkimming, "prepare")]
+    return internals_available("Resumable skimming", members)
+
+
+class ResumableNetworkSkimming(NetworkSkimming):
+    """Network skimming that can be cancelled and resumed
+
+    Skims are computed directly into a matrix file in the checkpoint folder, and the list of finished origins is
+    saved next to it every few seconds. If a run is cancelled or interrupted, a new run with the same checkpoint
+    folder only skims the origins that were not finished. Progress is reported with throughput and ETA.
+    The skimming loop follows NetworkSkimming.execute, so on aequilibrae versions it was not checked against the
+    plain (neither cancellable nor resumable) skimming runs instead"""
+
+    def __init__(self, graph, checkpoint_dir: str, checkpoint_interval=30):
+        NetworkSkimming.__init__(self, graph)
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.cancelled = False
+        self.error = None
+        self.done = None
+        self.resumed = 0
+        self.resumable = resumable_skimming_available(graph)
+        self.__lock = threading.Lock()
+        self.__last_checkpoint = 0.0
+        self.__start = 0.0
+
+    @property
+    def matrix_file(self) -> str:
+        return join(self.checkpoint_dir, "skims.aem")
+
+    @property
+    def done_file(self) -> str:
+        return join(self.checkpoint_dir, "finished_origins.npy")
+
+    def cancel(self):
+        # The plain skimming cannot be stopped
+        self.cancelled = self.resumable
+
+    def execute(self):
+        if not self.resumable:
+            self.report.append("Skimming cannot be cancelled or resumed with the installed AequilibraE version")
+            NetworkSkimming.execute(self)
+            return
+
+        self.skimming.emit(["zones finalized", 0])
+        prune_checkpoints(self.checkpoint_dir)
+        self.__prepare_results()
+        self.aux_res = MultiThreadedNetworkSkimming()
+        self.aux_res.prepare(self.graph, self.results)
+
+        self.resumed = self.cumulative = int(self.done.sum())
+        self.__start = self.__last_checkpoint = perf_counter()
+        pool = ThreadPool(self.results.cores)
+        all_threads = {"count": 0}
+        for pos, orig in enumerate(self.graph.centroids):
+            if self.done[pos]:
+                continue
+            i = int(self.graph.nodes_to_indices[orig])
+            if i >= self.graph.nodes_to_indices.shape[0]:
+                self.report.append(f"Centroid {orig} is beyond the domain of the graph")
+            elif self.graph.fs[int(i)] == self.graph.fs[int(i) + 1]:
+                self.report.append(f"Centroid {orig} does not exist in the graph")
+            else:
+                pool.apply_async(self.__skim_origin, args=(pos, orig, all_threads), error_callback=self.__failed)
+        pool.close()
+        pool.join()
+        self.aux_res = None
+        self.checkpoint()
+
+        self.procedure_id = uuid4().hex
+        self.procedure_date = str(datetime.today())
+        if self.error is not None:
+            self.skimming.emit(["text skimming", f"Failed. {self.cumulative:,} origins saved to resume later"])
+        elif self.cancelled:
+            self.skimming.emit(["text skimming", f"Cancelled. {self.cumulative:,} origins saved to resume later"])
+        else:
+            self.skimming.emit(["text skimming", "Saving Outputs"])
+        self.skimming.emit(["finished_threaded_procedure", None])
+
+    def __prepare_results(self):
+        # Same as SkimResults.prepare, but the matrix lives in the checkpoint folder
+        res, graph = self.results, self.graph
+        res.nodes = graph.compact_num_nodes + 1
+        res.zones = graph.num_zones
+        res.links = graph.compact_num_links + 1
+        res.num_skims = len(graph.skim_fields)
+        res.__graph_id__ = graph.__id__
+        res.graph = graph
+
+        res.skims = AequilibraeMatrix()
+        if isfile(self.matrix_file) and isfile(self.done_file):
+            res.skims.load(self.matrix_file)
+            self.done = np.load(self.done_file)
+        else:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            res.skims.create_empty(file_name=self.matrix_file, zones=res.zones, matrix_names=graph.skim_fields)
+            res.skims.index[:] = graph.centroids[:]
+            self.done = np.zeros(res.zones, bool)
+        res.skims.computational_view(core_list=res.skims.names)
+        res.skims.matrix_view = res.skims.matrix_view.reshape(res.zones, res.zones, res.num_skims)
+
+    def __skim_origin(self, pos, origin, all_threads):
+        if self.cancelled:
+            return
+        with self.__lock:
+            if threading.get_ident() not in all_threads:
+                all_threads[threading.get_ident()] = all_threads["count"]
+                all_threads["count"] += 1
+            th = all_threads[threading.get_ident()]
+
+        x = skimming_single_origin(origin, self.graph, self.results, self.aux_res, th)
+
+        with self.__lock:
+            self.done[pos] = True
+            self.cumulative += 1
+            if x != origin:
+                self.report.append(x)
+            now = perf_counter()
+            if now - self.__last_checkpoint > self.checkpoint_interval:
+                self.checkpoint()
+                self.__last_checkpoint = now
+
+        rate = (self.cumulative - self.resumed) / max(now - self.__start, 1e-6)
+        eta = (self.results.zones - self.cumulative) / rate
+        self.skimming.emit(["zones finalized", self.cumulative])
+        txt = f"{self.cumulative:,}/{self.results.zones:,} origins - {rate:,.1f} origins/s - ETA {eta:,.0f}s"
+        self.skimming.emit(["text skimming", txt])
+
+    def __failed(self, error: Exception):
+        # The first failure stops the remaining origins. Finished ones are kept in the checkpoint
+        with self.__lock:
+            if self.error is None:
+                self.error = error.args
+            self.cancelled = True
+
+    def checkpoint(self):
+        """Flushes finished rows to disk and then records which origins they belong to"""
+        self.results.skims.matrices.flush()
+        np.save(self.done_file + ".tmp.npy", self.done)
+        os.replace(self.done_file + ".tmp.npy", self.done_file)
+
+    def clear_checkpoint(self):
+        if not self.resumable:
+            return
+        self.results.skims.close()
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
@@ -0,0 +1,222 @@
+import os
+import shutil
+from os.path import join
+
+import numpy as np
+import pandas as pd
+from aequilibrae.paths.traffic_class import TrafficClass
+from aequilibrae.project.database_connection import ENVIRON_VAR
+
+from .assignment_telemetry import TelemetryLinearApproximation, telemetry_available
+from ..common_tools.aequilibrae_internals import internals_available
+
+
+def link_direction(direction) -> int:
+    """Direction of a link as 1 (AB) or -1 (BA), from text (also as bytes) or from its numeric value"""
+    if isinstance(direction, bytes):
+        direction = direction.decode()
+    if isinstance(direction, str):
+        text = direction.strip().upper()
+        if text in ["AB", "BA"]:
+            return 1 if text == "AB" else -1
+        direction = int(text) if text.lstrip("-").isdigit() else direction
+    if isinstance(direction, (int, np.integer)) and direction in [1, -1]:
+        return int(direction)
+    raise ValueError(f"Link direction must be AB, BA, 1 or -1. Got {direction!r}")
+
+
+class SelectLinkQuery:
+    """A named set of (link_id, direction) pairs. Paths are selected if they use any ("or") or all ("and") of them"""
+
+    def __init__(self, name: str, links: list, query_type="or"):
+        self.name = name
+        self.links = [(int(link_id), link_direction(direction)) for link_id, direction in links]
+        self.query_type = query_type
+
+
+class SelectLinkResults:
+    """Select link OD matrices and link loads of one traffic class, for all queries
+
+    Each array has one slice per query and the same shape as the class' matrix (OD) or link loads (links)"""
+
+    def __init__(self, traffic_class: TrafficClass, queries: list):
+        self.traffic_class = traffic_class
+        self.queries = queries
+        graph = traffic_class.graph
+        matrix = traffic_class.matrix
+        self.zones = matrix.zones
+        self.cores = len(matrix.view_names)
+        self.demand = matrix.matrix_view.reshape((self.zones, self.zones, self.cores))
+
+        network_links = list(zip(graph.graph.link_id.values, graph.graph.direction.values))
+        compressed = pd.Series(graph.graph.__compressed_id__.values, index=pd.MultiIndex.from_tuples(network_links))
+        self.query_links = []
+        for query in queries:
+            ids = [compressed.get(link) for link in query.links]
+            self.query_links.append([int(x) for x in ids if x is not None])
+
+        self.origins = graph.compact_nodes_to_indices[matrix.index[:].astype(np.int64)]
+        self.destinations = self.origins
+        self.crosswalk = np.zeros(graph.graph.shape[0], np.int64)
+        self.crosswalk[graph.graph.__supernet_id__.values] = graph.graph.__compressed_id__.values
+        self.num_links = graph.graph.shape[0]
+        self.compact_links = int(graph.graph.__compressed_id__.max()) + 1
+
+        self.aon = self.__empty()
+        self.step_direction = self.__empty()
+        self.previous_step_direction = None
+        self.results = self.__empty()
+
+    def __empty(self) -> dict:
+        q = len(self.queries)
+        return {
+            "od": np.zeros((q, self.zones, self.zones, self.cores), np.float64),
+            "loads": np.zeros((q, self.num_links, self.cores), np.float64),
+        }
+
+    def load_path_files(self, path_file_dir: str):
+        """Computes the select link matrices and loads of the all-or-nothing assignment saved in path_file_dir"""
+        for arr in self.aon.values():
+            arr.fill(0)
+
+        for i, origin in enumerate(self.origins):
+            # Origins without demand have no path file
+            if not os.path.isfile(join(path_file_dir, f"o{origin}.feather")):
+                continue
+            paths = pd.read_feather(join(path_file_dir, f"o{origin}.feather")).iloc[:, 0].values
+            path_ends = pd.read_feather(join(path_file_dir, f"o{origin}_indexdata.feather")).iloc[:, 0].values
+            ends = path_ends[self.destinations]
+            starts = np.where(self.destinations > 0, path_ends[np.maximum(self.destinations - 1, 0)], 0)
+            lengths = ends - starts
+
+            for q, (query, links) in enumerate(zip(self.queries, self.query_links)):
+                if not links:
+                    continue
+                if query.query_type == "and":
+                    selected = lengths > 0
+                    for link in links:
+                        uses = np.concatenate([[0], np.cumsum(paths == link)])
+                        selected &= (uses[ends] - uses[starts]) > 0
+                else:
+                    uses = np.concatenate([[0], np.cumsum(np.isin(paths, links))])
+                    selected = (uses[ends] - uses[starts]) > 0
+
+                if not selected.any():
+                    continue
+                demand = self.demand[i, :, :] * selected[:, None]
+                self.aon["od"][q, i, :, :] = demand
+
+                # Every link of a selected path carries the demand to its destination
+                sel_dest = np.where(selected)[0]
+                sel_lengths = lengths[sel_dest]
+                offsets = starts[sel_dest] - np.concatenate([[0], np.cumsum(sel_lengths)[:-1]])
+                positions = np.repeat(offsets, sel_lengths) + np.arange(sel_lengths.sum())
+                path_demand = np.repeat(demand[sel_dest, :], sel_lengths, axis=0)
+                for k in range(self.cores):
+                    compact = np.bincount(paths[positions], weights=path_demand[:, k], minlength=self.compact_links)
+                    self.aon["loads"][q, :, k] += compact[self.crosswalk]
+
+    def first_iteration(self):
+        for key in self.results:
+            self.results[key][:] = self.aon[key]
+
+    def update(self, direction: str, stepsize: float, conjugate_stepsize: float, betas: np.ndarray):
+        """Combines the last all-or-nothing result into the current solution, exactly as the equilibrium algorithm
+        does with the link loads of the class"""
+        if direction == "bfw" and self.previous_step_direction is None:
+            self.previous_step_direction = self.__empty()
+
+        for key in self.results:
+            aon, step_dir, results = self.aon[key], self.step_direction[key], self.results[key]
+            if direction == "fw":
+                step_dir[:] = aon
+            elif direction == "cfw":
+                step_dir[:] = conjugate_stepsize * step_dir + (1.0 - conjugate_stepsize) * aon
+            else:
+                previous = self.previous_step_direction[key]
+                new_direction = betas[0] * aon + betas[1] * step_dir + betas[2] * previous
+                previous[:] = step_dir
+                step_dir[:] = new_direction
+            results[:] = stepsize * step_dir + (1.0 - stepsize) * results
+
+    def od_matrices(self) -> dict:
+        names = self.traffic_class.matrix.view_names
+        return {
+            f"{query.name}_{core}": self.results["od"][q, :, :, k]
+            for q, query in enumerate(self.queries)
+            for k, core in enumerate(names)
+        }
+
+    def link_loads(self) -> pd.DataFrame:
+        graph = self.traffic_class.graph.graph
+        names = self.traffic_class.matrix.view_names
+        df = pd.DataFrame({"link_id": graph.link_id.values, "direction": graph.direction.values})
+        fields = []
+        for q, query in enumerate(self.queries):
+            for k, core in enumerate(names):
+                field = f"{query.name}_{core}"
+                df[field] = self.results["loads"][q, graph.__supernet_id__.values, k]
+                fields.append(field)
+
+        ab = df[df.direction > 0].set_index("link_id")[fields].add_suffix("_ab")
+        ba = df[df.direction < 0].set_index("link_id")[fields].add_suffix("_ba")
+        loads = ab.join(ba, how="outer").fillna(0)
+        for field in fields:
+            loads[f"{field}_tot"] = loads[f"{field}_ab"] + loads[f"{field}_ba"]
+        return loads
+
+
+def select_link_available(solver) -> bool:
+    """Whether the select link solver can follow the step directions of the installed aequilibrae
+
+    The blending of select link results copies LinearApproximation's choice of step direction, so it relies on its
+    private flags and on path files being saved for each class"""
+    members = [(solver, x) for x in ["iter", "stepsize", "conjugate_stepsize", "betas", "do_fw_step"]]
+    members += [(solver, x) for x in ["do_conjugate_step", "algorithm", "procedure_id"]]
+    members += [(c._aon_results, x) for c in solver.traffic_classes for x in ["save_path_file", "write_feather"]]
+    available = internals_available("Select link analysis", members)
+    return available and telemetry_available(solver.traffic_classes)
+
+
+class SelectLinkLinearApproximation(TelemetryLinearApproximation):
+    """Equilibrium assignment that also computes select link analysis for a set of queries
+
+    Paths of every all-or-nothing assignment are saved to disk, read back right away to build the select link
+    matrices and loads of that iteration, and then discarded. These are blended into the select link results with
+    the same step directions and sizes the algorithm uses for link loads, so no second assignment is needed"""
+
+    def __init__(self, assig_spec, algorithm, queries: list) -> None:
+        TelemetryLinearApproximation.__init__(self, assig_spec, algorithm)
+        self.queries = queries
+        self.select_link = {c.__id__: SelectLinkResults(c, queries) for c in self.traffic_classes}
+        self.__direction = "fw"
+        for c in self.traffic_classes:
+            c._aon_results.save_path_file = True
+            c._aon_results.write_feather = True
+
+    def execute(self):
+        try:
+            TelemetryLinearApproximation.execute(self)
+        finally:
+            shutil.rmtree(join(os.environ[ENVIRON_VAR], "path_files", self.procedure_id), ignore_errors=True)
+
+    def aon_finished(self, traffic_class):
+        # Same rule the algorithm uses to choose its step direction, before it updates its flags
+        if self.iter == 2 or self.stepsize == 1.0 or self.do_fw_step or self.algorithm in ["msa", "frank-wolfe"]:
+            self.__direction = "fw"
+        elif self.iter == 3 or self.do_conjugate_step or self.algorithm == "cfw":
+            self.__direction = "cfw"
+        else:
+            self.__direction = "bfw"
+
+        path_file_dir = traffic_class._aon_results.path_file_dir
+        select_link = self.select_link[traffic_class.__id__]
+        select_link.load_path_files(path_file_dir)
+        shutil.rmtree(path_file_dir, ignore_errors=True)
+        if self.iter == 1:
+            select_link.first_iteration()
+
+    def calculate_stepsize(self):
+        TelemetryLinearApproximation.calculate_stepsize(self)
+        for select_link in self.select_link.values():
+            select_link.update(self.__direction, self.stepsize, self.conjugate_stepsize, self.betas)
@@ -1,17 +1,17 @@
 import logging
+import numpy as np
 import os
 import sys
-from aequilibrae.paths import path_computation
-from aequilibrae.paths.results import PathResults
 from aequilibrae.project import Project
-from qgis._core import QgsProject, QgsVectorLayer, QgsSpatialIndex
+from qgis._core import QgsProject, QgsVectorLayer, QgsFeature, QgsField
 
 import qgis
 from qgis.PyQt import QtCore
 from qgis.PyQt import QtWidgets, uic
+from qgis.PyQt.QtCore import QVariant
 from qgis.utils import iface
 from .point_tool import PointTool
-from ..common_tools import LoadGraphLayerSettingDialog
+from ..common_tools import LoadGraphLayerSettingDialog, PathTreeCache
 from ..common_tools import standard_path
 
 logger = logging.getLogger("AequilibraEGUI")
@@ -29,27 +29,29 @@ class ShortestPathDialog(QtWidgets.QDialog, FORM_CLASS):
         QtWidgets.QDialog.__init__(self)
         self.iface = qgis_project.iface
         self.project = qgis_project.project  # type: Project
+        self.graph_cache = qgis_project.graph_cache
         self.setupUi(self)
         self.field_types = {}
         self.centroids = None
-        self.node_layer = qgis_project.layers["nodes"][0]
-        self.line_layer = qgis_project.layers["links"][0]
-        self.node_keys = {}
-        self.node_fields = None
-        self.index = None
+        self.node_layer = qgis_project.layer_by_name("nodes")
+        self.line_layer = qgis_project.layer_by_name("links")
+        self.link_index = qgis_project.feature_index("links", "link_id")
+        self.node_index = qgis_project.feature_index("nodes", "node_id")
         self.matrix = None
         self.path = standard_path()
         self.node_id = None
 
-        self.res = PathResults()
-        self.link_features = None
+        self.trees = None  # type: PathTreeCache
+        self.paths = {}
 
         self.do_dist_matrix.setEnabled(False)
         self.from_but.setEnabled(False)
         self.to_but.setEnabled(False)
+        self.to_selected_but.setEnabled(False)
         self.configure_graph.clicked.connect(self.prepare_graph_and_network)
         self.from_but.clicked.connect(self.search_for_point_from)
         self.to_but.clicked.connect(self.search_for_point_to)
+        self.to_selected_but.clicked.connect(self.fill_path_to_selected)
         self.do_dist_matrix.clicked.connect(self.produces_path)
 
     def prepare_graph_and_network(self):
@@ -63,13 +65,7 @@ class ShortestPathDialog(QtWidgets.QDialog, FORM_CLASS):
             self.mode = dlg2.mode
             self.minimize_field = dlg2.minimize_field
 
-            if self.mode not in self.project.network.graphs:
-                self.project.network.build_graphs(modes=[self.mode])
-
-            if dlg2.remove_chosen_links:
-                self.graph = self.project.network.graphs.pop(self.mode)
-            else:
-                self.graph = self.project.network.graphs[self.mode]
+            self.graph = self.graph_cache.get_graph(self.mode)
             self.graph.set_graph(self.minimize_field)
             self.graph.set_skimming([self.minimize_field])
             self.graph.set_blocked_centroid_flows(dlg2.block_connector)
@@ -79,27 +75,14 @@ class ShortestPathDialog(QtWidgets.QDialog, FORM_CLASS):
                 remove = [feat.attributes()[idx] for feat in self.line_layer.selectedFeatures()]
                 self.graph.exclude_links(remove)
 
-            self.res.prepare(self.graph)
-
-            self.node_fields = [field.name() for field in self.node_layer.dataProvider().fields().toList()]
-            self.index = QgsSpatialIndex()
-            for feature in self.node_layer.getFeatures():
-                self.index.addFeature(feature)
-                self.node_keys[feature.id()] = feature.attributes()
-
-            idx = self.line_layer.dataProvider().fieldNameIndex("link_id")
-            self.link_features = {}
-            for feat in self.line_layer.getFeatures():
-                link_id = feat.attributes()[idx]
-                self.link_features[link_id] = feat
+            # Trees from previous configurations are no longer valid for this graph
+            self.trees = PathTreeCache(self.graph)
 
             self.do_dist_matrix.setText("Display")
             self.do_dist_matrix.setEnabled(True)
             self.from_but.setEnabled(True)
             self.to_but.setEnabled(True)
-
-    def clear_memory_layer(self):
-        self.link_features = None
+            self.to_selected_but.setEnabled(True)
 
     def search_for_point_from(self):
         self.clickTool.clicked.connect(self.fill_path_from)
@@ -120,6 +103,11 @@ class ShortestPathDialog(QtWidgets.QDialog, FORM_CLASS):
         self.path_to.setText(str(self.to_node))
         self.to_but.setEnabled(True)
 
+    def fill_path_to_selected(self):
+        idx = self.node_layer.dataProvider().fieldNameIndex("node_id")
+        destinations = sorted([int(feat.attributes()[idx]) for feat in self.node_layer.selectedFeatures()])
+        self.path_to.setText(", ".join([str(x) for x in destinations]))
+
     @QtCore.pyqtSlot()
     def fill_path_from(self):
         self.from_node = self.find_point()
@@ -130,55 +118,69 @@ class ShortestPathDialog(QtWidgets.QDialog, FORM_CLASS):
     def find_point(self):
         try:
             point = self.clickTool.point
-            nearest = self.index.nearestNeighbor(point, 1)
+            node_actual_id = self.node_index.nearest(point)
             self.iface.mapCanvas().setMapTool(None)
             self.clickTool = PointTool(self.iface.mapCanvas())
-            node_id = self.node_keys[nearest[0]]
-
-            index_field = self.node_fields.index("node_id")
-            node_actual_id = node_id[index_field]
             return node_actual_id
         except Exception as e:
             logger.error(e.args)
 
     def produces_path(self):
         self.to_but.setEnabled(True)
-        if self.path_from.text().isdigit() and self.path_to.text().isdigit():
-            self.res.reset()
-            self.res.compute_path(int(self.path_from.text()), int(self.path_to.text()))
-
-            if self.res.path is not None:
-                # If you want to do selections instead of new layers
-                if self.rdo_selection.isChecked():
-                    self.create_path_with_selection()
-                # If you want to create new layers
-                else:
-                    self.create_path_with_scratch_layer()
+        destinations = [x.strip() for x in self.path_to.text().split(",") if x.strip()]
+        if not self.path_from.text().isdigit() or not destinations or not all(x.isdigit() for x in destinations):
+            return
+
+        # Paths from the same origin are traced from the cached tree, without recomputing it
+        origin = int(self.path_from.text())
+        self.paths = {}
+        for destination in destinations:
+            res = self.trees.compute_path(origin, int(destination))
+            if res.path is not None:
+                self.paths[int(destination)] = np.array(res.path)
+
+        missing = [x for x in destinations if int(x) not in self.paths]
+        if missing:
+            msg = f"No path between {self.path_from.text()} and {', '.join(missing)}"
+            qgis.utils.iface.messageBar().pushMessage(msg, "", level=3)
+
+        if self.paths:
+            # If you want to do selections instead of new layers
+            if self.rdo_selection.isChecked():
+                self.create_path_with_selection()
+            # If you want to create new layers
             else:
-                msg = f"No path between {self.path_from.text()} and {self.path_to.text()}"
-                qgis.utils.iface.messageBar().pushMessage(msg, "", level=3)
+                self.create_path_with_scratch_layer()
 
     def create_path_with_selection(self):
-        f = "link_id"
-        t = " or ".join([f"{f}={int(k)}" for k in self.res.path])
-        self.line_layer.selectByExpression(t)
+        fids = self.link_index.feature_ids(np.hstack(list(self.paths.values())))
+        self.line_layer.selectByIds(fids)
 
     def create_path_with_scratch_layer(self):
+        destinations = list(self.paths.keys())
+        if len(destinations) == 1:
+            layer_name = f"{self.path_from.text()} to {destinations[0]}"
+        else:
+            layer_name = f"{self.path_from.text()} to {len(destinations)} destinations"
+
         crs = self.line_layer.dataProvider().crs().authid()
-        vl = QgsVectorLayer(
-            "LineString?crs={}".format(crs), f"{self.path_from.text()} to {self.path_to.text()}", "memory"
-        )
+        vl = QgsVectorLayer("LineString?crs={}".format(crs), layer_name, "memory")
         pr = vl.dataProvider()
 
         # add fields
         pr.addAttributes(self.line_layer.dataProvider().fields())
+        pr.addAttributes([QgsField("destination", QVariant.Int)])
         vl.updateFields()  # tell the vector layer to fetch changes from the provider
 
-        # add a feature
+        # add a feature for each link of each path
+        link_features = self.link_index.features(np.hstack(list(self.paths.values())))
         all_links = []
-        for k in self.res.path:
-            fet = self.link_features[k]
-            all_links.append(fet)
+        for destination, path in self.paths.items():
+            for k in path:
+                fet = QgsFeature(vl.fields())
+                fet.setGeometry(link_features[k].geometry())
+                fet.setAttributes(link_features[k].attributes() + [destination])
+                all_links.append(fet)
 
         # add all links to the temp layer
         pr.addFeatures(all_links)
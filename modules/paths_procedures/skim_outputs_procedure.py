@@ -0,0 +1,164 @@
+import os
+from os.path import isfile
+
+import numpy as np
+from PyQt5.QtCore import pyqtSignal
+from aequilibrae.matrix import AequilibraeMatrix
+
+from ..common_tools import WorkerThread
+from .assignment_outputs_procedure import SavingCancelled, compression_filters, has_omx
+
+if has_omx:
+    import openmatrix as omx
+    import tables
+
+
+class SkimOutputsProcedure(WorkerThread):
+    """Writes the skims of a finished network skimming to a matrix file
+
+    Skims are computed in float64, but can be stored as float32, float16 or as integers scaled by a factor (e.g. 100
+    for hundredths of a minute), with unreachable cells stored as the smallest int32. Scaled integers are only
+    written to OMX, where the factor and missing value are stored as attributes of each core, which the plugin's
+    matrix viewer and exporter use to recover the original values. As nothing else applies the factor, these files
+    are not registered as project matrices. With a threshold, cells where the threshold field is above the
+    threshold value are stored as missing (NaN or the smallest int32). The matrix keeps all its cells, but the file
+    is compressed, so the discarded cells take almost no space on disk.
+    Matrices are written in blocks of rows, so progress is reported and the saving can be cancelled"""
+
+    ProgressValue = pyqtSignal(object)
+    ProgressText = pyqtSignal(object)
+    ProgressMaxValue = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    data_types = {"float64": np.float64, "float32": np.float32, "float16": np.float16, "scaled integer": np.int32}
+    missing_integer = np.iinfo(np.int32).min
+
+    # Target size of each chunk, in matrix cells
+    chunk_cells = 2 ** 18
+
+    def __init__(self, parentThread, skims: AequilibraeMatrix, file_path: str, data_type="float64", **kwargs):
+        WorkerThread.__init__(self, parentThread)
+        self.skims = skims
+        self.file_path = file_path
+        self.dtype = self.data_types[data_type]
+        self.scaled = np.issubdtype(self.dtype, np.integer)
+        self.scale = kwargs.get("scale", 1.0)
+        self.threshold = kwargs.get("threshold")
+        self.threshold_field = kwargs.get("threshold_field")
+        self.compress = kwargs.get("compress", False) or self.threshold is not None
+        self.cores = kwargs.get("cores", os.cpu_count())
+        self.cancelled = False
+        self.error = None
+        self.report = []
+        self.kept_cells = 0
+        self.overflow_cells = 0
+
+        self.zones = skims.zones
+        self.names = list(skims.names)
+        self.skim_view = skims.matrix_view.reshape(self.zones, self.zones, len(self.names))
+        self.chunk_rows = max(1, min(self.zones, self.chunk_cells // max(self.zones, 1)))
+
+    def cancel(self):
+        self.cancelled = True
+
+    def doWork(self):
+        try:
+            if self.scaled and not self.file_path.lower().endswith(".omx"):
+                raise ValueError("Scaled integer skims can only be saved to OMX")
+            if self.file_path.lower().endswith(".omx"):
+                self.write_omx()
+            else:
+                self.write_aem()
+            self.summarize()
+        except SavingCancelled:
+            self.report.append("Saving of skims cancelled. Run the skimming again to save them from the checkpoint")
+        except Exception as e:
+            self.error = e.args
+
+        if (self.cancelled or self.error is not None) and isfile(self.file_path):
+            os.unlink(self.file_path)
+        self.finished_threaded_procedure.emit(self.file_path)
+
+    def blocks(self):
+        blocks = int(np.ceil(self.zones / self.chunk_rows))
+        self.ProgressMaxValue.emit(blocks * len(self.names))
+        written = 0
+        for k, name in enumerate(self.names):
+            self.ProgressText.emit(f"Writing {os.path.basename(self.file_path)} - {name}")
+            for start in range(0, self.zones, self.chunk_rows):
+                if self.cancelled:
+                    raise SavingCancelled()
+                end = min(start + self.chunk_rows, self.zones)
+                yield k, start, end, self.convert(start, end, k)
+                written += 1
+                self.ProgressValue.emit(written)
+
+    def convert(self, start: int, end: int, k: int) -> np.ndarray:
+        block = np.array(self.skim_view[start:end, :, k])
+        keep = np.ones(block.shape, bool)
+        if self.threshold is not None:
+            keep = self.skim_view[start:end, :, self.names.index(self.threshold_field)] <= self.threshold
+            if k == 0:
+                self.kept_cells += int(keep.sum())
+        finite = np.isfinite(block)
+
+        if self.scaled:
+            limit = np.iinfo(self.dtype).max
+            scaled = np.rint(np.where(finite, block, 0) * self.scale)
+            overflow = np.abs(scaled) > limit
+            data = np.clip(scaled, -limit, limit).astype(self.dtype)
+            data[~(keep & finite)] = self.missing_integer
+        else:
+            limit = np.finfo(self.dtype).max
+            overflow = finite & (np.abs(block) > limit)
+            data = np.where(overflow, np.sign(block) * limit, block).astype(self.dtype)
+            data[~keep] = np.nan
+        self.overflow_cells += int((keep & overflow).sum())
+        return data
+
+    def write_omx(self):
+        filters = compression_filters(self.compress, self.cores)
+        omx_file = omx.open_file(self.file_path, "w")
+        try:
+            matrices = {}
+            for name in self.names:
+                matrices[name] = omx_file.create_matrix(
+                    name,
+                    atom=tables.Atom.from_dtype(np.dtype(self.dtype)),
+                    shape=(self.zones, self.zones),
+                    filters=filters,
+                    chunkshape=(self.chunk_rows, self.zones),
+                )
+                if self.scaled:
+                    matrices[name].attrs.scale_factor = self.scale
+                    matrices[name].attrs.missing_value = self.missing_integer
+
+            for k, start, end, data in self.blocks():
+                matrices[self.names[k]][start:end, :] = data
+            omx_file.create_mapping("main_index", self.skims.index[:])
+        finally:
+            omx_file.close()
+
+    def write_aem(self):
+        mat = AequilibraeMatrix()
+        mat.create_empty(file_name=self.file_path, zones=self.zones, matrix_names=self.names, data_type=self.dtype)
+        try:
+            mat.index[:] = self.skims.index[:]
+            for k, start, end, data in self.blocks():
+                mat.matrices[start:end, :, k] = data
+            mat.matrices.flush()
+        finally:
+            mat.close()
+
+    def summarize(self):
+        self.report.append(f"Skims saved to {os.path.basename(self.file_path)} as {np.dtype(self.dtype).name}")
+        if self.scaled:
+            self.report.append(f"Values were multiplied by {self.scale:,} and rounded")
+            self.report.append(f"Divide values by {self.scale:,} (scale_factor attribute of each core) to read them")
+            self.report.append(f"Unreachable and discarded cells are stored as {self.missing_integer}")
+        if self.threshold is not None:
+            share = 100 * self.kept_cells / max(self.zones ** 2, 1)
+            txt = f"{self.threshold_field} <= {self.threshold}"
+            self.report.append(f"{self.kept_cells:,} cells ({share:.1f}%) kept, where {txt}")
+        if self.overflow_cells:
+            self.report.append(f"{self.overflow_cells:,} values did not fit the chosen data type and were clipped")
@@ -5,6 +5,7 @@ import os
 import pandas as pd
 import re
 import sys
+from functools import partial
 from PyQt5.QtCore import Qt
 from aequilibrae.parameters import Parameters
 from aequilibrae.paths import Graph, AssignmentResults, allOrNothing
@@ -17,9 +18,16 @@ from tempfile import gettempdir
 import qgis
 from qgis.PyQt import QtWidgets, uic
 from qgis.PyQt.QtWidgets import QTableWidgetItem, QLineEdit, QComboBox, QCheckBox, QPushButton, QAbstractItemView
-from ..common_tools import PandasModel
+from ..common_tools import DataFrameModel
 from ..common_tools import ReportDialog
 from ..common_tools import standard_path
+from ..matrix_procedures.results_lister import list_results
+from ..matrix_procedures.matrix_totals_procedure import MatrixTotalsProcedure
+from .assignment_outputs_procedure import AssignmentOutputsProcedure
+from .assignment_telemetry import TelemetryLinearApproximation, save_telemetry, telemetry_available
+from .load_select_link_query_builder_dialog import LoadSelectLinkQueryBuilderDialog
+from .select_link_analysis import SelectLinkQuery, SelectLinkLinearApproximation, select_link_available
+from .warm_start_results import WarmStartResults, read_stored_flows, warm_start_available
 
 sys.modules["qgsmaplayercombobox"] = qgis.gui
 FORM_CLASS, _ = uic.loadUiType(os.path.join(os.path.dirname(__file__), "forms/ui_traffic_assignment.ui"))
@@ -31,6 +39,7 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         QtWidgets.QDialog.__init__(self)
         self.iface = qgis_project.iface
         self.project = qgis_project.project
+        self.graph_cache = qgis_project.graph_cache
         self.setupUi(self)
         self.skimming = False
         self.path = standard_path()
@@ -45,8 +54,15 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.matrices = pd.DataFrame([])
         self.skims = {}
         self.matrix = None
+        self.matrices_model = None
+        self.core_totals = None
+        self.totals_path = None
+        self.totals_workers = []
         self.block_centroid_flows = None
         self.worker_thread = None
+        self.outputs_thread = None
+        self.warm_start_flows = None
+        self.select_link_queries = {}
         self.all_modes = {}
         self.__populate_project_info()
         self.rgap = "Undefined"
@@ -59,6 +75,7 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.cob_matrices.currentIndexChanged.connect(self.change_matrix_selected)
         self.cob_mode_for_class.currentIndexChanged.connect(self.change_class_name)
         self.chb_fixed_cost.toggled.connect(self.set_fixed_cost_use)
+        self.chb_warm_start.toggled.connect(self.cob_warm_start.setEnabled)
 
         self.do_assignment.clicked.connect(self.run)
         self.cancel_all.clicked.connect(self.exit_procedure)
@@ -91,10 +108,11 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.tbl_project_properties.setColumnWidth(0, 120)
         self.tbl_project_properties.setColumnWidth(1, 450)
 
+        self.do_select_link.toggled.connect(self.set_select_link_use)
+        self.but_build_query.clicked.connect(self.build_select_link_query)
+        self.set_select_link_use()
+
         # Disabling resources not yet implemented
-        self.do_select_link.setEnabled(False)
-        self.but_build_query.setEnabled(False)
-        self.select_link_list.setEnabled(False)
         self.do_extract_link_flows.setEnabled(False)
         self.but_build_query_extract.setEnabled(False)
         self.list_link_extraction.setEnabled(False)
@@ -115,6 +133,52 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.change_class_name()
         self.set_fixed_cost_use()
 
+    def set_select_link_use(self):
+        for item in [self.but_build_query, self.select_link_list]:
+            item.setEnabled(self.do_select_link.isChecked())
+
+    def build_select_link_query(self):
+        if not self.traffic_classes:
+            qgis.utils.iface.messageBar().pushMessage("Add a traffic class before building queries", "", level=3)
+            return
+
+        graph = list(self.traffic_classes.values())[0].graph.graph
+        dlg2 = LoadSelectLinkQueryBuilderDialog(self.iface, graph, "Select link query")
+        dlg2.show()
+        dlg2.exec_()
+        if not dlg2.links:
+            return
+
+        # Query names become matrix cores and field names
+        name = dlg2.query_name
+        if not re.match(r"^[A-Za-z][A-Za-z0-9_]*$", name) or name in self.select_link_queries:
+            msg = "Query names must be unique, start with a letter and contain only letters, numbers and underscores"
+            qgis.utils.iface.messageBar().pushMessage("Input error", msg, level=3)
+            return
+
+        self.select_link_queries[name] = SelectLinkQuery(name, dlg2.links, dlg2.query_type)
+        self.list_select_link_queries()
+
+    def list_select_link_queries(self):
+        table = self.select_link_list
+        table.clearContents()
+        table.setRowCount(len(self.select_link_queries))
+        for i, query in enumerate(self.select_link_queries.values()):
+            links = ", ".join(f"{link_id} {'AB' if direc > 0 else 'BA'}" for link_id, direc in query.links)
+            for j, txt in enumerate([links, query.query_type.upper(), query.name]):
+                item = QTableWidgetItem(txt)
+                item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
+                table.setItem(i, j, item)
+            del_button = QPushButton("X")
+            del_button.clicked.connect(self.remove_select_link_query)
+            table.setCellWidget(i, 3, del_button)
+
+    def remove_select_link_query(self):
+        row = self.select_link_list.indexAt(self.sender().pos()).row()
+        name = self.select_link_list.item(row, 2).text()
+        self.select_link_queries.pop(name, None)
+        self.list_select_link_queries()
+
     def set_fixed_cost_use(self):
         for item in [self.cob_fixed_cost, self.lbl_vot, self.vot_setter]:
             item.setEnabled(self.chb_fixed_cost.isChecked())
@@ -144,20 +208,44 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         if not mat_name:
             return
 
+        self.totals_path = None
         if " (OMX not available)" in mat_name or " (file missing)" in mat_name:
             df = pd.DataFrame([])
         else:
-            print(mat_name)
             matrix = self.project.matrices.get_matrix(mat_name)
             cores = matrix.names
 
-            totals = [f"{np.nansum(matrix.get_matrix(x)):,.1f}" for x in cores]
-            df = pd.DataFrame({"matrix_core": cores, "total": totals})
+            # Totals are computed (or retrieved from cache) in the background and filled in as they arrive
+            df = pd.DataFrame({"matrix_core": cores, "total": ["..."] * len(cores)})
+            file_name = self.matrices["file_name"].values[self.cob_matrices.currentIndex()]
+            self.totals_path = os.path.join(self.project.matrices.fldr, file_name)
+            worker = MatrixTotalsProcedure(qgis.utils.iface.mainWindow(), self.totals_path, cores)
+            worker.core_total.connect(self.core_total_signal_handler)
+            worker.finished_threaded_procedure.connect(partial(self.core_totals_finished, worker))
+            self.totals_workers = [w for w in self.totals_workers if not w.isFinished()] + [worker]
+            worker.start()
             self.but_add_class.setEnabled(True)
-        matrices_model = PandasModel(df)
-        self.tbl_core_list.setModel(matrices_model)
+        self.core_totals = df
+        self.matrices_model = DataFrameModel(df)
+        self.tbl_core_list.setModel(self.matrices_model)
         self.tbl_core_list.setSelectionBehavior(QAbstractItemView.SelectRows)
 
+    def core_total_signal_handler(self, val):
+        file_path, core, total = val
+        # Totals for a matrix that is no longer selected are discarded
+        if file_path != self.totals_path:
+            return
+        row = int(np.where(self.core_totals.matrix_core.values == core)[0][0])
+        self.matrices_model.set_value(row, 1, f"{total:,.1f}")
+
+    def core_totals_finished(self, worker, file_path):
+        if file_path != self.totals_path or worker.error is None:
+            return
+        # Cores whose totals never arrived are flagged, instead of waiting forever
+        for row in np.where(self.core_totals.total.values == "...")[0]:
+            self.matrices_model.set_value(int(row), 1, "error")
+        self.iface.messageBar().pushMessage("Error", f"Could not compute matrix totals: {worker.error}", level=1)
+
     def __populate_project_info(self):
         table = self.tbl_project_properties
         table.setRowCount(2)
@@ -199,6 +287,12 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.cob_matrices.clear()
         self.cob_matrices.addItems(self.matrices["name"].tolist())
 
+        results = list_results(self.project.project_base_path)
+        results = results[(results.procedure == "traffic assignment") & (results.WARNINGS == "")]
+        self.cob_warm_start.clear()
+        self.cob_warm_start.addItems(results.table_name.tolist())
+        self.chb_warm_start.setEnabled(results.shape[0] > 0)
+
     def __edit_skimming_modes(self):
         self.cob_skim_class.clear()
         for class_name in set(self.traffic_classes.keys()):
@@ -242,19 +336,15 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         sel = self.tbl_core_list.selectionModel().selectedRows()
         if not sel:
             return
-        rows = [s.row() for s in sel if s.column() == 0]
+        rows = [self.matrices_model.source_row(s.row()) for s in sel if s.column() == 0]
         user_classes = [matrix.names[i] for i in rows]
         matrix.computational_view(user_classes)
 
         mode = self.cob_mode_for_class.currentText()
         mode_id = self.all_modes[mode]
-        if mode_id not in self.project.network.graphs:
-            self.project.network.build_graphs(modes=[mode_id])
-
-        graph = self.project.network.graphs[mode_id]
+        graph = self.graph_cache.get_graph(mode_id)
 
         if self.chb_chosen_links.isChecked():
-            graph = self.project.network.graphs.pop(mode_id)
             idx = self.link_layer.dataProvider().fieldNameIndex("link_id")
             remove = [feat.attributes()[idx] for feat in self.link_layer.selectedFeatures()]
             graph.exclude_links(remove)
@@ -337,8 +427,6 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         # self.report = self.worker_thread.report
         self.produce_all_outputs()
 
-        self.exit_procedure()
-
     def run(self):
         if not self.check_data():
             qgis.utils.iface.messageBar().pushMessage("Input error", self.error, level=3)
@@ -360,8 +448,23 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         self.assignment.set_capacity_field(self.cob_capacity.currentText())
         self.assignment.set_time_field(self.cob_ffttime.currentText())
         self.assignment.set_algorithm(self.cb_choose_algorithm.currentText())
+        if self.do_select_link.isChecked():
+            queries = list(self.select_link_queries.values())
+            algo = self.assignment.algorithm
+            self.assignment.assignment = SelectLinkLinearApproximation(self.assignment, algo, queries)
+            if not select_link_available(self.assignment.assignment):
+                msg = "Select link analysis is not supported by the installed AequilibraE version"
+                qgis.utils.iface.messageBar().pushMessage("Error", msg, level=3)
+                return
+        elif algorithm != "all-or-nothing" and telemetry_available(self.assignment.classes):
+            # Without telemetry, the assignment keeps aequilibrae's own solver
+            self.assignment.assignment = TelemetryLinearApproximation(self.assignment, self.assignment.algorithm)
         self.assignment.max_iter = self.miter
         self.assignment.rgap_target = float(self.rel_gap.text())
+        if self.warm_start_flows is not None:
+            for cls in self.assignment.classes:
+                cls._aon_results = WarmStartResults(cls, self.warm_start_flows)
+            self.assignment.description = f"Warm start from {self.cob_warm_start.currentText()}"
         self.worker_thread = self.assignment.assignment
         self.run_thread()
 
@@ -387,6 +490,31 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
             self.error = "Result table name already exists. Choose a new name"
             return False
 
+        if self.do_select_link.isChecked():
+            if not self.select_link_queries:
+                self.error = "No select link queries were built"
+                return False
+            if self.chb_warm_start.isChecked():
+                self.error = "Select link analysis cannot be combined with a warm start"
+                return False
+
+        self.warm_start_flows = None
+        if self.chb_warm_start.isChecked():
+            if self.cb_choose_algorithm.currentText() == "all-or-nothing":
+                self.error = "Warm start is only available for equilibrium algorithms"
+                return False
+            table_name = self.cob_warm_start.currentText()
+            stored = read_stored_flows(self.project.project_base_path, table_name)
+            for name, cls in self.traffic_classes.items():
+                if not any(f"{core}_ab" in stored.columns for core in cls.matrix.view_names):
+                    self.error = f"Result table {table_name} has no flows for the matrix cores of class {name}"
+                    return False
+            if warm_start_available(list(self.traffic_classes.values())):
+                self.warm_start_flows = stored
+            else:
+                msg = "Warm start is not supported by the installed AequilibraE. Assigning from free flow"
+                self.iface.messageBar().pushMessage("Warning", msg, level=1, duration=10)
+
         self.temp_path = gettempdir()
         tries_setup = self.set_assignment()
         return tries_setup
@@ -413,9 +541,53 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
 
     # Save link flows to disk
     def produce_all_outputs(self):
-        self.assignment.save_results(self.scenario_name)
-        if self.skimming:
-            self.assignment.save_skims(self.scenario_name, which_ones="all", format="omx")
+        select_link = {}
+        if isinstance(self.assignment.assignment, TelemetryLinearApproximation):
+            telemetry = self.assignment.assignment.telemetry()
+            if not telemetry.empty:
+                save_telemetry(self.project.project_base_path, self.scenario_name, telemetry)
+        if isinstance(self.assignment.assignment, SelectLinkLinearApproximation):
+            select_link = self.assignment.assignment.select_link
+
+        self.outputs_thread = AssignmentOutputsProcedure(
+            qgis.utils.iface.mainWindow(),
+            self.assignment,
+            self.scenario_name,
+            self.project.project_base_path,
+            save_skims=self.skimming,
+            select_link=select_link,
+            compress=self.chb_compress_skims.isChecked(),
+            cores=self.assignment.cores,
+        )
+        self.progress_label0.setText("Saving link results")
+        try:
+            self.outputs_thread.save_tables()
+        except Exception as e:
+            self.outputs_thread.error = e.args
+        self.outputs_thread.ProgressMaxValue.connect(lambda val: self.progressbar0.setRange(0, val))
+        self.outputs_thread.ProgressValue.connect(self.progressbar0.setValue)
+        self.outputs_thread.ProgressText.connect(self.progress_label0.setText)
+        self.outputs_thread.finished_threaded_procedure.connect(self.outputs_saved)
+        self.cancel_all.setText("Cancel saving")
+        self.outputs_thread.start()
+
+    def outputs_saved(self, table_name):
+        worker = self.outputs_thread
+        self.report = worker.report
+        if worker.error is not None:
+            self.report.append(f"Error saving outputs: {worker.error}")
+
+        # Matrix records go through the project connection, which belongs to this thread
+        for file_name, description in worker.matrix_files.items():
+            record = self.project.matrices.new_record(file_name[:-4], file_name)
+            record.procedure_id = self.assignment.procedure_id
+            record.timestamp = self.assignment.procedure_date
+            record.procedure = "Traffic Assignment"
+            record.description = description
+            record.save()
+
+        self.outputs_thread = None
+        self.exit_procedure()
 
     # def click_button_inside_the_list(self, purpose):
     #     if purpose == "select link":
@@ -460,6 +632,9 @@ class TrafficAssignmentDialog(QtWidgets.QDialog, FORM_CLASS):
         return True
 
     def exit_procedure(self):
+        if self.outputs_thread is not None:
+            self.outputs_thread.cancel()
+            return
         self.close()
         if self.report:
             dlg2 = ReportDialog(self.iface, self.report)
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.traffic_class import TrafficClass
+
+from ..common_tools.aequilibrae_internals import internals_available
+from ..common_tools.results_database import results_database
+
+
+def read_stored_flows(project_base_path: str, table_name: str) -> pd.DataFrame:
+    """Reads the link flows of a previous assignment from the results database, indexed by link_id"""
+    return results_database(project_base_path).read_table(table_name).set_index("link_id")
+
+
+def warm_start_available(traffic_classes: list) -> bool:
+    """Whether the all-or-nothing results of these classes can be replaced with warm start results"""
+    results = AssignmentResults()
+    members = [(c, "_aon_results") for c in traffic_classes]
+    members += [(results, x) for x in ["link_loads", "classes", "save_path_file", "write_feather", "total_flows"]]
+    return internals_available("Warm start", members)
+
+
+class WarmStartResults(AssignmentResults):
+    """All-or-nothing results holder that replaces the very first loading with stored link flows
+
+    The first equilibrium iteration keeps the flows of a previous assignment instead of a free-flow loading, so
+    congested times and the following search directions are computed from a solution that is already close to
+    the equilibrium. Flows are matched by link_id, direction and matrix core (user class)"""
+
+    def __init__(self, traffic_class: TrafficClass, stored: pd.DataFrame):
+        AssignmentResults.__init__(self)
+        original = traffic_class._aon_results
+        self.set_cores(original.cores)
+        self.save_path_file = original.save_path_file
+        self.write_feather = original.write_feather
+
+        self.stored = stored
+        self.pce = traffic_class.pce
+        self.matched_cores = []
+        self.warm_loads = None
+
+    def prepare(self, graph, matrix) -> None:
+        AssignmentResults.prepare(self, graph, matrix)
+        self.warm_loads = np.zeros_like(self.link_loads)
+        self.matched_cores = []
+
+        link_ids = graph.graph.link_id.values
+        directions = graph.graph.direction.values
+        graph_rows = graph.graph.__supernet_id__.values
+        for i, core in enumerate(self.classes["names"]):
+            if f"{core}_ab" not in self.stored.columns:
+                continue
+            self.matched_cores.append(core)
+            for direction, suffix in [(1, "ab"), (-1, "ba")]:
+                sel = directions == direction
+                flows = self.stored[f"{core}_{suffix}"].reindex(link_ids[sel]).fillna(0).values
+                # Stored flows are in vehicles, while the algorithm works with PCEs
+                self.warm_loads[graph_rows[sel], i] = flows * self.pce
+
+    def total_flows(self) -> None:
+        if self.warm_loads is not None:
+            self.link_loads[:, :] = self.warm_loads[:, :]
+            self.warm_loads = None
+        AssignmentResults.total_flows(self)
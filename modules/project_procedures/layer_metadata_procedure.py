@@ -0,0 +1,62 @@
+import sqlite3
+
+import qgis
+from PyQt5.QtCore import pyqtSignal
+
+from ..common_tools import WorkerThread
+
+
+class LayerMetadataProcedure(WorkerThread):
+    """Reads feature counts and extents of the geometry tables of a project, one table at a time
+
+    Feature counts and extents come from the R-tree of each table when there is one, so large tables are not
+    scanned. In that case, features without a geometry are not counted. Each table is
+    reported through *LayerMetadata* as soon as it is read, as a tuple (table name, metadata)"""
+
+    ProgressValue = pyqtSignal(object)
+    ProgressText = pyqtSignal(object)
+    ProgressMaxValue = pyqtSignal(object)
+    LayerMetadata = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    def __init__(self, parentThread, db_path: str, layers: dict):
+        WorkerThread.__init__(self, parentThread)
+        self.db_path = db_path
+        self.layers = layers
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def doWork(self):
+        self.ProgressMaxValue.emit(len(self.layers))
+        self.ProgressText.emit("Reading layer metadata")
+        try:
+            conn = qgis.utils.spatialite_connect(self.db_path)
+            for i, (layer_name, meta) in enumerate(self.layers.items()):
+                if self.cancelled:
+                    break
+                try:
+                    self.LayerMetadata.emit((layer_name, self.read_metadata(conn, layer_name, meta)))
+                except sqlite3.Error as e:
+                    self.error = e.args
+                self.ProgressValue.emit(i + 1)
+            conn.close()
+        except Exception as e:
+            self.error = e.args
+        self.finished_threaded_procedure.emit("metadata")
+
+    def read_metadata(self, conn, layer_name: str, meta: dict) -> dict:
+        geo = meta["geometry_column"]
+        if meta.get("spatial_index"):
+            # The R-tree keeps its row IDs in a small table of its own, which is much cheaper to count
+            features = conn.execute(f'SELECT count(*) FROM "idx_{layer_name}_{geo}_rowid"').fetchone()[0]
+            sql = f'SELECT min(xmin), min(ymin), max(xmax), max(ymax) FROM "idx_{layer_name}_{geo}"'
+        else:
+            features = conn.execute(f'SELECT count(*) FROM "{layer_name}"').fetchone()[0]
+            sql = f'SELECT min(MbrMinX("{geo}")), min(MbrMinY("{geo}")), max(MbrMaxX("{geo}")), max(MbrMaxY("{geo}"))'
+            sql += f' FROM "{layer_name}"'
+        extent = conn.execute(sql).fetchone()
+        extent = None if extent is None or None in extent else extent
+        return {"features": features, "extent": extent}
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+
+from PyQt5.QtCore import pyqtSignal
+
+from ..common_tools import WorkerThread
+
+
+class ProjectOpeningProcedure(WorkerThread):
+    """Checks an AequilibraE project and warms up its database before it is opened
+
+    The schema is checked for the tables the plugin relies on and the geometry tables are listed. The project
+    itself must be loaded by the caller, as its database connection belongs to the thread that opens it, so the
+    pages that loading it and creating its network layers read are read here first: the small tables read by the
+    project, and the first rows of the network tables and of their R-trees. The operating system then has them
+    cached when the project is loaded on the GUI thread. Reading network tables is bounded by *warm_up_rows*, as
+    reading whole tables from network drives would take longer than it saves"""
+
+    ProgressValue = pyqtSignal(object)
+    ProgressText = pyqtSignal(object)
+    ProgressMaxValue = pyqtSignal(object)
+    finished_threaded_procedure = pyqtSignal(object)
+
+    required_tables = ["links", "nodes", "geometry_columns"]
+    project_tables = ["about", "modes", "link_types", "geometry_columns"]
+    warm_up_tables = ["links", "nodes"]
+    warm_up_rows = 50000
+
+    def __init__(self, parentThread, proj_path: str):
+        WorkerThread.__init__(self, parentThread)
+        self.proj_path = proj_path
+        self.db_path = os.path.join(proj_path, "project_database.sqlite")
+        self.layers = {}
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def doWork(self):
+        try:
+            self.check()
+        except Exception as e:
+            self.error = e.args
+        self.finished_threaded_procedure.emit("project")
+
+    def check(self):
+        if not os.path.isfile(self.db_path):
+            raise FileNotFoundError("Model does not exist. Check your path and try again")
+
+        self.ProgressMaxValue.emit(3)
+        self.ProgressText.emit("Checking project database")
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            tables = [x[0] for x in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]
+            missing = [x for x in self.required_tables if x not in tables]
+            if missing:
+                raise ValueError(f"Project database is missing the tables: {', '.join(missing)}")
+            self.ProgressValue.emit(1)
+
+            self.ProgressText.emit("Listing geometry tables")
+            sql = "SELECT f_table_name, f_geometry_column, geometry_type, srid, spatial_index_enabled"
+            sql += " FROM geometry_columns"
+            for table, geo, geo_type, srid, spatial_index in conn.execute(sql).fetchall():
+                meta = {"geometry_column": geo, "wkb_type": geo_type, "srid": srid, "spatial_index": spatial_index == 1}
+                self.layers[table] = meta
+            self.ProgressValue.emit(2)
+
+            self.ProgressText.emit("Reading network")
+            self.warm_up(conn, tables)
+            self.ProgressValue.emit(3)
+        finally:
+            conn.close()
+
+    def warm_up(self, conn, tables: list):
+        to_read = [(x, None) for x in self.project_tables]
+        for table in self.warm_up_tables:
+            meta = self.layers.get(table, {})
+            to_read.append((table, self.warm_up_rows))
+            if meta.get("spatial_index"):
+                rtree = f"idx_{table}_{meta['geometry_column']}"
+                to_read.extend((f"{rtree}_{x}", self.warm_up_rows) for x in ["node", "rowid", "parent"])
+
+        for table, rows in to_read:
+            if table not in tables:
+                continue
+            sql = f'SELECT * FROM "{table}"' + ("" if rows is None else f" LIMIT {rows}")
+            cursor = conn.execute(sql)
+            while cursor.fetchmany(5000):
+                if self.cancelled:
+                    return
@@ -1,14 +1,13 @@
 import logging
 import numpy as np
 import os
-from aequilibrae.paths import Graph, path_computation
-from aequilibrae.paths.results import PathResults
+from aequilibrae.paths import Graph
 from aequilibrae.project import Project
 
 import qgis
 from qgis.PyQt import QtWidgets, uic
 from qgis.PyQt.QtCore import QVariant
-from qgis.core import QgsVectorLayer, QgsField, QgsProject, QgsMarkerSymbol
+from qgis.core import QgsVectorLayer, QgsField, QgsProject, QgsMarkerSymbol, QgsFeature
 from .tsp_procedure import TSPProcedure
 from ..common_tools import ReportDialog
 
@@ -23,8 +22,10 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
         self.project = qgisproject.project  # type: Project
         self._PQgis = qgisproject
 
-        self.link_layer = self._PQgis.layers["links"][0]
-        self.node_layer = self._PQgis.layers["nodes"][0]
+        self.link_layer = self._PQgis.layer_by_name("links")
+        self.node_layer = self._PQgis.layer_by_name("nodes")
+        self.link_index = self._PQgis.feature_index("links", "link_id")
+        self.node_index = self._PQgis.feature_index("nodes", "node_id")
 
         QgsProject.instance().addMapLayer(self.link_layer)
         QgsProject.instance().addMapLayer(self.node_layer)
@@ -32,7 +33,6 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
         self.all_modes = {}
         self.worker_thread: TSPProcedure = None
         self.but_run.clicked.connect(self.run)
-        self.res = PathResults()
 
         self.rdo_selected.clicked.connect(self.populate_node_source)
         self.rdo_centroids.clicked.connect(self.populate_node_source)
@@ -68,8 +68,7 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
     def run(self):
         md = self.all_modes[self.cob_mode.currentText()]
 
-        self.project.network.build_graphs(modes=[md])
-        self.graph = self.project.network.graphs[md]
+        self.graph = self._PQgis.graph_cache.get_graph(md)
 
         if self.rdo_selected.isChecked():
             centroids = self.selected_nodes()
@@ -87,8 +86,7 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
         self.graph.set_blocked_centroid_flows(self.chb_block.isChecked())
         self.graph.set_skimming([self.cob_minimize.currentText()])  # And will skim time and distance
         depot = int(self.cob_start.currentText())
-        vehicles = 1
-        self.res.prepare(self.graph)
+        vehicles = self.spb_vehicles.value()
         self.worker_thread = TSPProcedure(qgis.utils.iface.mainWindow(), self.graph, depot, vehicles)
         self.run_thread()
 
@@ -98,21 +96,11 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
         self.exec_()
 
     def finished(self):
-        ns = self.worker_thread.node_sequence
-        print(ns)
-        if len(ns) < 2:
-            return
-
-        all_links = []
-        for i in range(1, len(ns)):
-            self.res.reset()
-            path_computation(ns[i - 1], ns[i], self.graph, self.res)
-            all_links.extend(list(self.res.path))
-
-        if self.rdo_new_layer.isChecked():
-            self.create_path_with_scratch_layer(all_links)
-        else:
-            self.create_path_with_selection(all_links)
+        if self.worker_thread.routes:
+            if self.rdo_new_layer.isChecked():
+                self.create_path_with_scratch_layer()
+            else:
+                self.create_path_with_selection(np.hstack(self.worker_thread.route_links))
         self.close()
 
         if self.worker_thread.report is not None:
@@ -121,11 +109,12 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
             dlg2.exec_()
 
     def create_path_with_selection(self, all_links):
-        f = "link_id"
-        t = " or ".join([f"{f}={k}" for k in all_links])
-        self.link_layer.selectByExpression(t)
+        self.link_layer.selectByIds(self.link_index.feature_ids(all_links))
+
+    def create_path_with_scratch_layer(self):
+        routes = self.worker_thread.routes
+        route_links = self.worker_thread.route_links
 
-    def create_path_with_scratch_layer(self, path_links):
         # Create TSP route
         crs = self.link_layer.dataProvider().crs().authid()
         vl = QgsVectorLayer(f"LineString?crs={crs}", "TSP Solution", "memory")
@@ -133,19 +122,19 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
 
         # add fields
         pr.addAttributes(self.link_layer.dataProvider().fields())
+        pr.addAttributes([QgsField("vehicle", QVariant.Int)])
         vl.updateFields()  # tell the vector layer to fetch changes from the provider
 
-        idx = self.link_layer.dataProvider().fieldNameIndex("link_id")
-        self.link_features = {}
-        for feat in self.link_layer.getFeatures():
-            link_id = feat.attributes()[idx]
-            self.link_features[link_id] = feat
+        link_features = self.link_index.features(np.hstack(route_links))
 
-        # add a feature
+        # add a feature for each link traversed by each vehicle
         all_links = []
-        for k in path_links:
-            fet = self.link_features[k]
-            all_links.append(fet)
+        for vehicle, links in enumerate(route_links):
+            for k in links:
+                fet = QgsFeature(vl.fields())
+                fet.setGeometry(link_features[k].geometry())
+                fet.setAttributes(link_features[k].attributes() + [vehicle + 1])
+                all_links.append(fet)
 
         # add all links to the temp layer
         pr.addFeatures(all_links)
@@ -164,37 +153,23 @@ class TSPDialog(QtWidgets.QDialog, FORM_CLASS):
 
         # add fields
         pn.addAttributes(self.node_layer.dataProvider().fields())
+        pn.addAttributes([QgsField("vehicle", QVariant.Int), QgsField("sequence", QVariant.Int)])
         nl.updateFields()  # tell the vector layer to fetch changes from the provider
 
-        idx = self.node_layer.dataProvider().fieldNameIndex("node_id")
-        self.node_features = {}
-        for feat in self.node_layer.getFeatures():
-            node_id = feat.attributes()[idx]
-            self.node_features[node_id] = feat
+        node_features = self.node_index.features(np.hstack(routes))
 
-        # add the feature
+        # add the stops with the order in which each vehicle visits them
         stop_nodes = []
-        seq = {}
-        for i, k in enumerate(self.worker_thread.node_sequence[:-1]):
-            fet = self.node_features[k]
-            stop_nodes.append(fet)
-            seq[k] = i + 1
-
-        # add all links to the temp layer
+        for vehicle, route in enumerate(routes):
+            for i, k in enumerate(route[:-1]):
+                fet = QgsFeature(nl.fields())
+                fet.setGeometry(node_features[k].geometry())
+                fet.setAttributes(node_features[k].attributes() + [vehicle + 1, i + 1])
+                stop_nodes.append(fet)
+
+        # add all stops to the temp layer
         pn.addFeatures(stop_nodes)
 
-        # Goes back and adds the order of visitation for each node
-        pn.addAttributes([QgsField("sequence", QVariant.Int)])
-        nl.updateFields()
-        sdx = nl.dataProvider().fieldNameIndex("sequence")
-
-        nl.startEditing()
-        for feat in nl.getFeatures():
-            node_id = feat.attributes()[idx]
-            nl.changeAttributeValue(feat.id(), sdx, seq[node_id])
-
-        nl.commitChanges()
-
         # add layer to the map
         QgsProject.instance().addMapLayer(nl)
         symbol = QgsMarkerSymbol.createSimple({"name": "star", "color": "red"})
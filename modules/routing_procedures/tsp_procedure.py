@@ -1,6 +1,7 @@
+import numpy as np
 from PyQt5.QtCore import pyqtSignal
-from aequilibrae.paths import NetworkSkimming, SkimResults
 from aequilibrae.utils.worker_thread import WorkerThread
+from ..common_tools import PathTreeCache
 
 
 class TSPProcedure(WorkerThread):
@@ -14,33 +15,27 @@ class TSPProcedure(WorkerThread):
         self.error = None
         self.mult = 100
         self.report = []
-        self.node_sequence = []
+        self.routes = []
+        self.route_links = []
+        # We keep all trees, so the legs of the solution can be traced without recomputing any path
+        self.trees = PathTreeCache(graph, max_trees=None)
+        # The graph is prepared with the stops as its centroids, so we only skim between them
+        self.stops = np.array(graph.centroids, np.int64)
 
     def doWork(self):
         from ortools.constraint_solver import pywrapcp
         from ortools.constraint_solver import routing_enums_pb2
 
-        ns = NetworkSkimming(self.graph)
-        ns.execute()
-
-        skm = ns.results.skims
-        mat = (skm.get_matrix(skm.names[0]) * self.mult).astype(int)
-        self.depot = list(skm.index).index(self.depot)
+        mat = self.stop_costs()
+        self.depot = list(self.stops).index(self.depot)
         # Create the routing index manager.
         manager = pywrapcp.RoutingIndexManager(mat.shape[0], self.vehicles, self.depot)
 
         # Create Routing Model.
         routing = pywrapcp.RoutingModel(manager)
 
-        def distance_callback(from_index, to_index):
-            """Returns the distance between the two nodes."""
-            # Convert from routing variable Index to distance matrix NodeIndex.
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-
-            return mat[from_node, to_node]
-
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+        # The distance table is handed to OR-Tools as is, so no Python callback is evaluated during the search
+        transit_callback_index = routing.RegisterTransitMatrix(mat.tolist())
 
         # Define cost of each arc.
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -58,20 +53,55 @@ class TSPProcedure(WorkerThread):
             self.report.append(self.error)
         else:
             self.report.append(f"Objective function value: {solution.ObjectiveValue() / self.mult}")
-            index = routing.Start(0)
-            plan_output = "Route:\n"
-            route_distance = 0
-
-            while not routing.IsEnd(index):
-                p = skm.index[manager.IndexToNode(index)]
-                self.node_sequence.append(p)
-                plan_output += f" {p} ->"
-                previous_index = index
-                index = solution.Value(routing.NextVar(index))
-                route_distance += routing.GetArcCostForVehicle(previous_index, index, 0)
-
-            p = skm.index[manager.IndexToNode(index)]
-            self.node_sequence.append(p)
-            plan_output += f" {p}\n"
-            self.report.append(plan_output)
+            for vehicle in range(self.vehicles):
+                index = routing.Start(vehicle)
+                route = []
+                route_distance = 0
+
+                while not routing.IsEnd(index):
+                    route.append(int(self.stops[manager.IndexToNode(index)]))
+                    previous_index = index
+                    index = solution.Value(routing.NextVar(index))
+                    route_distance += routing.GetArcCostForVehicle(previous_index, index, vehicle)
+                route.append(int(self.stops[manager.IndexToNode(index)]))
+
+                # Vehicles that never leave the depot are not part of the solution
+                if len(route) < 3:
+                    continue
+                self.routes.append(route)
+                self.route_links.append(self.links_for_route(route))
+                plan_output = f"Route for vehicle {vehicle}:\n"
+                plan_output += " -> ".join([str(p) for p in route])
+                plan_output += f"\nCost of the route: {route_distance / self.mult}\n"
+                self.report.append(plan_output)
         self.finished.emit("TSP")
+
+    def stop_costs(self) -> np.ndarray:
+        """Integer cost matrix between stops, built from one shortest path tree per stop"""
+        stop_indices = self.graph.nodes_to_indices[self.stops]
+        costs = np.zeros((self.stops.shape[0], self.stops.shape[0]), np.float64)
+        for i, origin in enumerate(self.stops):
+            # Any other stop works as destination, as the whole tree is computed anyway
+            destination = self.stops[1] if i == 0 else self.stops[0]
+            res = self.trees.compute_path(int(origin), int(destination))
+            costs[i, :] = res.skims[stop_indices, 0]
+
+        costs *= self.mult
+        # Stops we cannot reach get a cost large enough to never be chosen when there is an alternative
+        unreachable = ~np.isfinite(costs)
+        costs[unreachable] = 0
+        costs[unreachable] = (costs.max() + 1) * self.stops.shape[0]
+        return costs.astype(np.int64)
+
+    def links_for_route(self, route: list) -> np.ndarray:
+        """Sequence of links traversed by a route, traced from the trees computed during skimming"""
+        legs = []
+        for origin, destination in zip(route[:-1], route[1:]):
+            if origin == destination:
+                continue
+            res = self.trees.compute_path(origin, destination)
+            if res.path is not None:
+                legs.append(np.array(res.path))
+        if not legs:
+            return np.array([], np.int64)
+        return np.hstack(legs)
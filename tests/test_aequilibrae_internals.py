@@ -0,0 +1,39 @@
+import inspect
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.traffic_class import TrafficClass
+
+from modules.common_tools import aequilibrae_internals
+from modules.paths_procedures.assignment_telemetry import telemetry_available
+from modules.paths_procedures.warm_start_results import warm_start_available
+
+
+class AequilibraeInternalsTest(unittest.TestCase):
+    """Fails as soon as aequilibrae drops a private member the plugin hooks into"""
+
+    def test_installed_release_is_checked(self):
+        self.assertTrue(str(aequilibrae_internals.release_version).startswith(aequilibrae_internals.checked_series))
+
+    def test_warm_start_hooks(self):
+        self.assertIn("self._aon_results", inspect.getsource(TrafficClass.__init__))
+        self.assertTrue(warm_start_available([SimpleNamespace(_aon_results=None)]))
+
+    def test_warm_start_falls_back(self):
+        self.assertFalse(warm_start_available([SimpleNamespace()]))
+        with patch.object(aequilibrae_internals, "release_version", "99.0.0"):
+            self.assertFalse(warm_start_available([SimpleNamespace(_aon_results=None)]))
+
+    def test_telemetry_hooks(self):
+        self.assertIn("self._aon_results", inspect.getsource(TrafficClass.__init__))
+        self.assertTrue(telemetry_available([SimpleNamespace(_aon_results=AssignmentResults())]))
+
+    def test_telemetry_falls_back(self):
+        self.assertFalse(telemetry_available([SimpleNamespace(_aon_results=SimpleNamespace())]))
+        self.assertFalse(telemetry_available([SimpleNamespace()]))
+
+
+if __name__ == "__main__":
+    unittest.main()
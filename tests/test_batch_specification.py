@@ -0,0 +1,28 @@
+import unittest
+
+from modules.paths_procedures.batch_assignment_dialog import specification_error
+
+
+class SpecificationErrorTest(unittest.TestCase):
+    def scenario(self, name):
+        return {"name": name, "classes": [{"name": "car", "mode": "c", "matrix": "demand"}]}
+
+    def test_valid_specification(self):
+        spec = {"concurrent_assignments": 2, "scenarios": [self.scenario("base"), self.scenario("future")]}
+        self.assertIsNone(specification_error(spec))
+
+    def test_malformed_structures(self):
+        for spec in [None, "scenarios", [self.scenario("base")], {"scenarios": {"base": {}}}, {"scenarios": ["base"]}]:
+            self.assertIsNotNone(specification_error(spec), spec)
+
+    def test_names_must_be_unique(self):
+        self.assertIsNotNone(specification_error({"scenarios": [self.scenario("base"), self.scenario("base")]}))
+        self.assertIsNotNone(specification_error({"scenarios": [self.scenario(None)]}))
+
+    def test_classes_are_required(self):
+        self.assertIsNotNone(specification_error({"scenarios": [{"name": "base"}]}))
+        self.assertIsNotNone(specification_error({"scenarios": [{"name": "base", "classes": ["car"]}]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
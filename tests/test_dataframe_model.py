@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from qgis.PyQt import QtCore
+
+from modules.common_tools.dataframe_model import DataFrameModel
+
+
+class DataFrameModelTest(unittest.TestCase):
+    def setUp(self):
+        df = pd.DataFrame(
+            {"name": ["Alpha", "beta", "Gamma", "delta", "alphabet"], "value": [5.0, np.nan, 1.0, 3.0, 2.0]},
+            index=[10, 20, 30, 40, 50],
+        )
+        self.model = DataFrameModel(df)
+
+    def shown(self, column=0) -> list:
+        return [self.model.data(self.model.index(r, column)) for r in range(self.model.rowCount())]
+
+    def test_sort(self):
+        self.model.sort(1, QtCore.Qt.AscendingOrder)
+        self.assertListEqual(self.shown(), ["Gamma", "alphabet", "delta", "Alpha", "beta"])
+        self.assertEqual(self.model.source_row(0), 2)
+
+        self.model.sort(1, QtCore.Qt.DescendingOrder)
+        self.assertListEqual(self.shown(), ["Alpha", "delta", "alphabet", "Gamma", "beta"])
+
+    def test_filter_ignores_case_and_searches_all_columns(self):
+        self.model.set_filter("ALPHA")
+        self.assertListEqual(self.shown(), ["Alpha", "alphabet"])
+        self.model.set_filter("5")
+        self.assertListEqual(self.shown(), ["Alpha"])
+
+    def test_filter_narrows_and_widens(self):
+        self.model.set_filter("a")
+        self.assertEqual(self.model.rowCount(), 5)
+        self.model.set_filter("alphab")
+        self.assertListEqual(self.shown(), ["alphabet"])
+        self.model.set_filter("ta")
+        self.assertListEqual(self.shown(), ["beta", "delta"])
+        self.model.set_filter("")
+        self.assertEqual(self.model.rowCount(), 5)
+
+    def test_filter_and_sort(self):
+        self.model.set_filter("alpha")
+        self.model.sort(1, QtCore.Qt.AscendingOrder)
+        self.assertListEqual(self.shown(), ["alphabet", "Alpha"])
+        self.assertListEqual([self.model.source_row(r) for r in range(2)], [4, 0])
+
+    def test_filter_after_changing_a_value(self):
+        self.model.set_filter("gamma")
+        self.model.set_value(1, 0, "gamma ray")
+        self.model.set_filter("gamma")
+        self.assertListEqual(self.shown(), ["gamma ray", "Gamma"])
+
+    def test_fetch_more(self):
+        model = DataFrameModel(pd.DataFrame({"x": np.arange(2500)}))
+        self.assertEqual(model.rowCount(), DataFrameModel.fetch_size)
+        while model.canFetchMore():
+            model.fetchMore()
+        self.assertEqual(model.rowCount(), 2500)
+        self.assertEqual(model.data(model.index(2499, 0)), "2499")
+
+        model.set_filter("1")
+        self.assertEqual(model.rowCount(), DataFrameModel.fetch_size)
+        self.assertTrue(model.canFetchMore())
+
+
+if __name__ == "__main__":
+    unittest.main()
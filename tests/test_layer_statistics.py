@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+from os.path import join
+from unittest.mock import patch
+
+from qgis.core import QgsFeature, QgsProject, QgsVectorFileWriter, QgsVectorLayer
+
+from modules.common_tools import layer_statistics
+from .utilities import get_qgis_app
+
+
+def memory_layer() -> QgsVectorLayer:
+    layer = QgsVectorLayer("None?field=link_id:integer&field=flow:double&field=label:string", "links", "memory")
+    features = []
+    for link_id, flow, label in [(1, 10.0, "2"), (2, None, "x"), (3, -4.5, None), (4, 7.0, "12")]:
+        feat = QgsFeature(layer.fields())
+        feat.setAttributes([link_id, flow, label])
+        features.append(feat)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class FieldRangesTest(unittest.TestCase):
+    def setUp(self):
+        _ = get_qgis_app()
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def gpkg_layer(self) -> QgsVectorLayer:
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        options.layerName = "links"
+        path = join(self.folder.name, "links.gpkg")
+        context = QgsProject.instance().transformContext()
+        QgsVectorFileWriter.writeAsVectorFormatV2(memory_layer(), path, context, options)
+        return QgsVectorLayer(f"{path}|layername=links", "links", "ogr")
+
+    def test_features(self):
+        ranges = layer_statistics.field_ranges(memory_layer(), ["flow", "link_id"])
+        self.assertDictEqual(ranges, {"flow": (-4.5, 10.0), "link_id": (1, 4)})
+
+    def test_non_numeric_values_are_ignored(self):
+        self.assertDictEqual(layer_statistics.field_ranges(memory_layer(), ["label"]), {"label": (2, 12)})
+
+    def test_sql(self):
+        layer = self.gpkg_layer()
+        with patch.object(layer_statistics, "_ranges_from_features", side_effect=AssertionError):
+            self.assertDictEqual(layer_statistics.field_ranges(layer, ["flow"]), {"flow": (-4.5, 10.0)})
+
+    def test_uncommitted_edits(self):
+        layer = self.gpkg_layer()
+        self.assertDictEqual(layer_statistics.field_ranges(layer, ["flow"]), {"flow": (-4.5, 10.0)})
+
+        layer.startEditing()
+        feat = next(layer.getFeatures())
+        layer.changeAttributeValue(feat.id(), layer.fields().indexFromName("flow"), 100.0)
+        self.assertDictEqual(layer_statistics.field_ranges(layer, ["flow"]), {"flow": (-4.5, 100.0)})
+        layer.rollBack()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from modules.matrix_procedures import matrix_totals_procedure as totals
+
+
+class MatrixTotalsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(totals, "tempPath", return_value=self.folder.name)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.folder.cleanup()
+
+    def test_round_trip(self):
+        key = totals.cache_key("/data/demand.omx", 10.0, "cars")
+        totals.update_totals_cache({key: 123.5})
+        self.assertDictEqual(totals.read_totals_cache(), {key: 123.5})
+
+    def test_separators_in_paths_and_names(self):
+        first = totals.cache_key("/data/a|b.omx", 10.0, "core|1")
+        second = totals.cache_key("/data/a", 10.0, "b.omx|core|1")
+        self.assertNotEqual(first, second)
+        totals.update_totals_cache({first: 1.0, second: 2.0})
+        self.assertEqual(len(totals.read_totals_cache()), 2)
+
+    def test_older_versions_are_pruned(self):
+        old = totals.cache_key("/data/demand.omx", 10.0, "cars")
+        other = totals.cache_key("/data/skims.omx", 10.0, "time")
+        totals.update_totals_cache({old: 1.0, other: 5.0})
+
+        new = totals.cache_key("/data/demand.omx", 20.0, "cars")
+        totals.update_totals_cache({new: 2.0})
+        self.assertDictEqual(totals.read_totals_cache(), {other: 5.0, new: 2.0})
+
+    def test_cache_is_bounded(self):
+        with patch.object(totals, "max_cache_entries", 3):
+            for i in range(5):
+                totals.update_totals_cache({totals.cache_key(f"/data/m{i}.omx", 1.0, "c"): float(i)})
+        cached = totals.read_totals_cache()
+        self.assertListEqual([json.loads(k)[0] for k in cached], ["/data/m2.omx", "/data/m3.omx", "/data/m4.omx"])
+
+    def test_unreadable_cache(self):
+        with open(totals.totals_cache_file(), "w") as f:
+            f.write("not json")
+        self.assertDictEqual(totals.read_totals_cache(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from modules.common_tools import path_tree_cache
+
+
+class TracingResults:
+    """Traces paths over a fixed tree rooted at node 1, in which node 3 cannot be reached
+
+    Like aequilibrae's PathResults, tracing to an unreachable node leaves the previous path untouched"""
+
+    def prepare(self, graph):
+        self.graph = graph
+        self.predecessors = np.full(3, -1)
+        self.connectors = np.full(3, -1)
+        self.skims = np.zeros((3, 1))
+        self.reset()
+
+    def reset(self):
+        self.path = self.path_nodes = self.path_link_directions = self.milepost = None
+
+    def compute_path(self, origin, destination):
+        self.origin = origin
+        self.predecessors[:] = [-1, 0, -1]
+        self.connectors[:] = [-1, 10, -1]
+        self.update_trace(destination)
+
+    def update_trace(self, destination):
+        idx = self.graph.nodes_to_indices[destination]
+        if destination == self.origin or self.predecessors[idx] < 0:
+            return
+        self.path = np.array([self.connectors[idx]])
+        self.path_nodes = np.array([self.origin, destination])
+        self.path_link_directions = np.array([1])
+        self.milepost = np.array([0, 1])
+
+
+class PathTreeCacheTest(unittest.TestCase):
+    def setUp(self):
+        graph = SimpleNamespace(cost_field="distance", nodes_to_indices={1: 0, 2: 1, 3: 2})
+        with patch.object(path_tree_cache, "PathResults", TracingResults):
+            self.cache = path_tree_cache.PathTreeCache(graph)
+
+    def test_unreachable_destination_after_cache_hit(self):
+        res = self.cache.compute_path(1, 2)
+        self.assertListEqual(list(res.path), [10])
+
+        res = self.cache.compute_path(1, 3)
+        self.assertIsNone(res.path)
+        self.assertIsNone(res.path_nodes)
+        self.assertIsNone(res.milepost)
+
+    def test_origin_as_destination_after_cache_hit(self):
+        self.cache.compute_path(1, 2)
+        self.assertIsNone(self.cache.compute_path(1, 1).path)
+
+
+if __name__ == "__main__":
+    unittest.main()
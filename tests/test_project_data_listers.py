@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from os.path import join
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from modules.matrix_procedures import matrix_lister, results_lister
+
+
+def project_connection():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("create table matrices (name text, file_name text)")
+    conn.executemany("insert into matrices values (?, ?)", [("demand", "demand.aem"), ("skims", "skims.omx")])
+    conn.execute("create table results (table_name text, procedure text)")
+    conn.executemany("insert into results values (?, ?)", [("base", "assignment"), ("gone", "assignment")])
+    return conn
+
+
+class ListersTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.patchers = [
+            patch.object(matrix_lister, "database_connection", project_connection),
+            patch.object(results_lister, "database_connection", project_connection),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.folder.cleanup()
+
+    def test_matrix_warnings(self):
+        open(join(self.folder.name, "skims.omx"), "w").close()
+        with patch.object(matrix_lister, "has_omx", False):
+            df = matrix_lister.list_matrices(self.folder.name)
+        self.assertListEqual(list(df.WARNINGS), ["File not found on disk", "OMX not available for display"])
+
+        with patch.object(matrix_lister, "has_omx", True):
+            df = matrix_lister.list_matrices(self.folder.name)
+        self.assertListEqual(list(df.WARNINGS), ["File not found on disk", ""])
+
+    def test_folder_contents_are_read_again_when_files_change(self):
+        self.assertSetEqual(matrix_lister.files_in_folder(self.folder.name), set())
+        open(join(self.folder.name, "demand.aem"), "w").close()
+        # Makes sure the folder's modification time moves, whatever the resolution of the file system
+        stamp = os.stat(self.folder.name).st_mtime_ns + 10 ** 9
+        os.utime(self.folder.name, ns=(stamp, stamp))
+        self.assertSetEqual(matrix_lister.files_in_folder(self.folder.name), {"demand.aem"})
+
+        with patch.object(matrix_lister, "has_omx", True):
+            df = matrix_lister.list_matrices(self.folder.name)
+        self.assertListEqual(list(df.WARNINGS), ["", "File not found on disk"])
+
+    def test_result_warnings(self):
+        database = SimpleNamespace(tables=lambda: {"base", "base_convergence"})
+        with patch.object(results_lister, "results_database", return_value=database):
+            df = results_lister.list_results(self.folder.name)
+        self.assertListEqual(list(df.table_name), ["base", "gone"])
+        self.assertListEqual(list(df.WARNINGS), ["", "Table not found in the results database"])
+
+
+if __name__ == "__main__":
+    unittest.main()
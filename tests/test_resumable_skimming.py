@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from os.path import join
+from time import time
+from unittest.mock import patch
+
+from modules.paths_procedures import resumable_skimming as skimming
+
+
+class PruneCheckpointsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.patcher = patch.object(skimming, "tempPath", return_value=self.folder.name)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.folder.cleanup()
+
+    def checkpoint(self, key: str, age: float) -> str:
+        folder = skimming.checkpoint_folder(key)
+        os.makedirs(folder)
+        file_name = join(folder, "finished_origins.npy")
+        open(file_name, "w").close()
+        os.utime(file_name, (time() - age, time() - age))
+        return folder
+
+    def test_old_checkpoints_are_removed(self):
+        self.checkpoint("old", skimming.checkpoint_max_age + 60)
+        recent = self.checkpoint("recent", 60)
+        current = self.checkpoint("current", skimming.checkpoint_max_age + 60)
+        skimming.prune_checkpoints(current)
+        self.assertListEqual(sorted(os.listdir(skimming.checkpoints_root())), ["current", "recent"])
+        self.assertTrue(os.path.isdir(recent))
+
+    def test_only_the_most_recent_are_kept(self):
+        for i in range(5):
+            self.checkpoint(f"run{i}", i * 60)
+        skimming.prune_checkpoints(skimming.checkpoint_folder("new"))
+        self.assertListEqual(sorted(os.listdir(skimming.checkpoints_root())), ["run0", "run1"])
+
+    def test_missing_folder(self):
+        skimming.prune_checkpoints(skimming.checkpoint_folder("new"))
+
+
+if __name__ == "__main__":
+    unittest.main()
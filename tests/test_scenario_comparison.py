@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from modules.gis.scenario_comparison import compare_flows
+
+
+class CompareFlowsTest(unittest.TestCase):
+    def setUp(self):
+        self.base = pd.DataFrame({"ab": [100.0, 50.0], "ba": [0.0, 20.0]}, index=pd.Index([1, 2], name="link_id"))
+        self.alt = pd.DataFrame({"ab": [60.0, 50.0], "ba": [0.0, 40.0]}, index=pd.Index([1, 2], name="link_id"))
+
+    def test_differences(self):
+        df = compare_flows(self.base, self.alt, False)
+        self.assertListEqual(list(df.diff_ab), [40, 0])
+        self.assertListEqual(list(df.diff_ba), [0, -20])
+        self.assertListEqual(list(df.positive_ab), [1, 0])
+        self.assertListEqual(list(df.positive_ba), [0, 0])
+        self.assertListEqual(list(df.style_diff_ab), ["solid", "no"])
+        self.assertListEqual(list(df.style_diff_ba), ["no", "solid"])
+
+    def test_widths_are_scaled_to_the_largest_difference(self):
+        df = compare_flows(self.base, self.alt, False, band_size=10)
+        self.assertListEqual(list(df.width_diff_ab), [10, 0])
+        self.assertListEqual(list(df.width_diff_ba), [0, 5])
+        self.assertListEqual(list(df.offset_diff_ab), [5, 0])
+        self.assertListEqual(list(df.offset_diff_ba), [0, -2.5])
+
+    def test_drive_side(self):
+        df = compare_flows(self.base, self.alt, False, band_size=10, drive_side="left")
+        self.assertListEqual(list(df.offset_diff_ab), [-5, 0])
+        self.assertListEqual(list(df.offset_diff_ba), [0, 2.5])
+
+    def test_composite_bands(self):
+        df = compare_flows(self.base, self.alt, True, band_size=10, space_size=0.5)
+        self.assertListEqual(list(df.common_ab), [60, 50])
+        # Widths are scaled to the largest flow, and the difference is drawn next to the common flow
+        self.assertListEqual(list(df.width_common_ab), [6, 5])
+        self.assertListEqual(list(df.offset_common_ab), [3.5, 3])
+        self.assertListEqual(list(df.width_diff_ab), [4, 0])
+        self.assertListEqual(list(df.offset_diff_ab), [6, 3.5])
+        self.assertListEqual(list(df.style_common_ba), ["no", "solid"])
+
+    def test_no_flows(self):
+        zero = pd.DataFrame({"ab": [0.0], "ba": [0.0]}, index=pd.Index([1], name="link_id"))
+        df = compare_flows(zero, zero, True)
+        self.assertTrue(np.all(df[["width_common_ab", "width_diff_ab", "width_diff_ba"]].values == 0))
+        self.assertListEqual(list(df.style_diff_ab), ["no"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import tempfile
+import unittest
+from os.path import join
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from qgis.PyQt.QtCore import Qt
+
+from modules.common_tools import LinkQueryModel
+from modules.paths_procedures.load_select_link_query_builder_dialog import link_directions
+from modules.paths_procedures.select_link_analysis import SelectLinkQuery, SelectLinkResults, link_direction
+
+
+class SelectLinkQueryTest(unittest.TestCase):
+    def test_query_from_builder_output(self):
+        graph = pd.DataFrame({"link_id": [7, 3, 3], "direction": [1, 1, -1]})
+        model = LinkQueryModel(link_directions(graph), ["Link ID", "Dir"])
+        rows = [[model.data(model.index(r, c), Qt.DisplayRole) for c in range(2)] for r in range(3)]
+        self.assertListEqual(rows, [["3", "AB"], ["3", "BA"], ["7", "AB"]])
+
+        query = SelectLinkQuery("query", rows)
+        self.assertListEqual(query.links, [(3, 1), (3, -1), (7, 1)])
+
+    def test_direction_parsing(self):
+        for direction, expected in [("AB", 1), ("ba", -1), (b"BA", -1), (np.int8(1), 1), (-1, -1), ("-1", -1)]:
+            self.assertEqual(link_direction(direction), expected)
+        for direction in ["b'AB'", "", 0, 2, None]:
+            with self.assertRaises(ValueError):
+                link_direction(direction)
+
+
+class SelectLinkResultsTest(unittest.TestCase):
+    """Two zones (nodes 1 and 2) and a middle node 3. Demand from 1 to 2 uses links 10 and 11, while link 12
+    (a direct link from 1 to 2) is not used"""
+
+    def setUp(self):
+        graph = SimpleNamespace(
+            graph=pd.DataFrame(
+                {
+                    "link_id": [10, 11, 12],
+                    "direction": [1, 1, 1],
+                    "__compressed_id__": [0, 1, 2],
+                    "__supernet_id__": [0, 1, 2],
+                }
+            ),
+            compact_nodes_to_indices=np.array([-1, 0, 1, 2]),
+        )
+        demand = np.zeros((2, 2, 1))
+        demand[0, 1, 0] = 100
+        matrix = SimpleNamespace(zones=2, view_names=["cars"], matrix_view=demand, index=np.array([1, 2]))
+        traffic_class = SimpleNamespace(graph=graph, matrix=matrix)
+        queries = [SelectLinkQuery("used", [(10, "AB")]), SelectLinkQuery("unused", [(12, "AB"), (10, "AB")], "and")]
+        self.results = SelectLinkResults(traffic_class, queries)
+
+        self.folder = tempfile.TemporaryDirectory()
+        # Origin 1 reaches zone 2 (compact index 1) through compact links 1 and 0. Zone 2 has no demand, so no file
+        pd.DataFrame({"paths": np.array([1, 0], np.int64)}).to_feather(join(self.folder.name, "o0.feather"))
+        ends = pd.DataFrame({"ends": np.array([0, 2, 2], np.int64)})
+        ends.to_feather(join(self.folder.name, "o0_indexdata.feather"))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_first_iteration(self):
+        self.results.load_path_files(self.folder.name)
+        self.results.first_iteration()
+        self.assertEqual(self.results.results["od"][0, 0, 1, 0], 100)
+        self.assertEqual(self.results.results["od"][1].sum(), 0)
+        self.assertListEqual(list(self.results.results["loads"][0, :, 0]), [100, 100, 0])
+
+    def test_blending_and_link_loads(self):
+        self.results.load_path_files(self.folder.name)
+        self.results.first_iteration()
+
+        # An all-or-nothing loading that no longer uses link 10 halves the selected flows
+        for arr in self.results.aon.values():
+            arr.fill(0)
+        self.results.update("fw", 0.5, 0.0, np.zeros(3))
+        self.assertEqual(self.results.results["od"][0, 0, 1, 0], 50)
+
+        loads = self.results.link_loads()
+        self.assertEqual(loads.loc[10, "used_cars_ab"], 50)
+        self.assertEqual(loads.loc[10, "used_cars_tot"], 50)
+        self.assertEqual(loads.loc[12, "used_cars_ab"], 0)
+        self.assertListEqual(list(self.results.od_matrices()), ["used_cars", "unused_cars"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.paths_procedures.skim_outputs_procedure import SkimOutputsProcedure
+
+
+class SkimConversionTest(unittest.TestCase):
+    def setUp(self):
+        # Two skims (time and distance) between three zones. Zone 3 cannot be reached from zone 1
+        time = np.array([[0.0, 12.345, np.inf], [10.0, 0.0, 75.0], [30.0, 40.0, 0.0]])
+        distance = np.array([[0.0, 1e6, np.inf], [5.0, 0.0, 50.0], [20.0, 25.0, 0.0]])
+        view = np.stack([time, distance], axis=2)
+        self.skims = SimpleNamespace(zones=3, names=["time", "distance"], matrix_view=view, index=np.arange(1, 4))
+
+    def procedure(self, data_type="float64", **kwargs) -> SkimOutputsProcedure:
+        return SkimOutputsProcedure(None, self.skims, "skims.omx", data_type, **kwargs)
+
+    def test_float_types(self):
+        proc = self.procedure("float16")
+        data = proc.convert(0, 3, 1)
+        self.assertEqual(data.dtype, np.float16)
+        # float16 cannot hold 1,000,000, so it is clipped to its largest value
+        self.assertEqual(data[0, 1], np.finfo(np.float16).max)
+        self.assertTrue(np.isinf(data[0, 2]))
+        self.assertEqual(proc.overflow_cells, 1)
+
+    def test_scaled_integers(self):
+        proc = self.procedure("scaled integer", scale=100)
+        data = proc.convert(0, 3, 0)
+        self.assertTrue(proc.scaled)
+        self.assertEqual(data.dtype, np.int32)
+        self.assertEqual(data[0, 1], 1234)
+        self.assertEqual(data[1, 2], 7500)
+        self.assertEqual(data[0, 2], SkimOutputsProcedure.missing_integer)
+
+    def test_threshold(self):
+        proc = self.procedure("float32", threshold=35, threshold_field="time")
+        distance = proc.convert(0, 3, 1)
+        self.assertTrue(np.isnan(distance[1, 2]))
+        self.assertTrue(np.isnan(distance[2, 1]))
+        self.assertEqual(distance[2, 0], 20)
+        self.assertTrue(proc.compress)
+
+        proc.kept_cells = 0
+        proc.convert(0, 3, 0)
+        self.assertEqual(proc.kept_cells, 6)
+
+    def test_threshold_with_scaled_integers(self):
+        proc = self.procedure("scaled integer", scale=10, threshold=35, threshold_field="time")
+        data = proc.convert(0, 3, 0)
+        self.assertEqual(data[2, 0], 300)
+        self.assertEqual(data[2, 1], SkimOutputsProcedure.missing_integer)
+
+
+if __name__ == "__main__":
+    unittest.main()